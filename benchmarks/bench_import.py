@@ -0,0 +1,72 @@
+# pylint: disable=missing-module-docstring,missing-function-docstring
+
+"""Import cost of the package for each command line command.
+
+For every command, runs ``python -X importtime -m wakeonlan ...`` in a fresh
+process against an empty temporary configuration and reports the total
+import time attributed to modules imported after interpreter startup, the
+process wall time, and which of the heavier optional modules got loaded.
+Results are medians over --repeat runs.
+
+    python benchmarks/bench_import.py [--repeat N]
+"""
+
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+COMMANDS = [
+    ('import wakeonlan', ['-c', 'import wakeonlan']),
+    ('--version', ['-m', 'wakeonlan', '--version']),
+    ('--help', ['-m', 'wakeonlan', '--help']),
+    ('--names', ['-m', 'wakeonlan', '--names']),
+    ('--list', ['-m', 'wakeonlan', '--list']),
+    ('--interfaces', ['-m', 'wakeonlan', '--interfaces']),
+    ('MAC -a 127.0.0.1', ['-m', 'wakeonlan', '01:02:03:04:05:06', '-a', '127.0.0.1']),
+]
+
+HEAVY = ['ctypes', 'asyncio', 'json', 'tempfile', 'pathlib', 'socketserver']
+
+_LINE = re.compile(r'import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)')
+
+
+def _run(argv, env):
+    start = time.perf_counter()
+    proc = subprocess.run([sys.executable, '-X', 'importtime', *argv], env=env,
+                          capture_output=True, text=True, check=False)
+    wall = time.perf_counter() - start
+    total = 0
+    modules = set()
+    for line in proc.stderr.splitlines():
+        m = _LINE.match(line)
+        if not m:
+            continue
+        modules.add(m.group(4))
+        if len(m.group(3)) == 1 and m.group(4) not in ('site', 'encodings'):
+            total += int(m.group(2))   # top-level entries: their cumulative time
+    return total / 1000, wall * 1000, modules
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as home:
+        env = dict(os.environ, WAKEONLAN_HOME=home)
+        print(f'{"command":20} {"imports ms":>10} {"wall ms":>8}  heavy modules loaded')
+        for name, argv in COMMANDS:
+            runs = [_run(argv, env) for _ in range(args.repeat)]
+            imports = statistics.median(r[0] for r in runs)
+            wall = statistics.median(r[1] for r in runs)
+            heavy = [mod for mod in HEAVY if mod in runs[-1][2]]
+            print(f'{name:20} {imports:10.1f} {wall:8.1f}  {", ".join(heavy) or "-"}')
+
+
+if __name__ == '__main__':
+    main()
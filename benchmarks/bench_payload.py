@@ -0,0 +1,67 @@
+# pylint: disable=missing-module-docstring,missing-function-docstring
+
+"""Magic packet construction and send rate, before and after payload caching.
+
+"before" is the original bytearray builder, "uncached" is the current
+builder with its cache bypassed and "cached" is what the send paths use.
+The send rate is measured with a single socket sending to a loopback sink.
+
+    python benchmarks/bench_payload.py [--packets N] [--macs M]
+"""
+
+import argparse
+import socket
+import time
+
+from wakeonlan.wakeonlan import _payload
+
+
+def _bytearray_payload(mac):
+    payload = bytearray(17 * 6)
+    for i in range(6):
+        payload[i] = 0xFF
+    for i in range(6, len(payload), 6):
+        payload[i:i+6] = mac
+    return payload
+
+
+def _rate(count, func):
+    start = time.perf_counter()
+    func()
+    return count / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--packets', type=int, default=200000)
+    parser.add_argument('--macs', type=int, default=1000,
+                        help='number of distinct MACs cycled through')
+    args = parser.parse_args()
+
+    macs = [(0x02, 0, 0, 0, (i >> 8) & 0xFF, i & 0xFF) for i in range(args.macs)]
+    seq = [macs[i % len(macs)] for i in range(args.packets)]
+    builders = (
+        ('before', _bytearray_payload),
+        ('uncached', _payload.__wrapped__),
+        ('cached', _payload),
+    )
+
+    print(f'{"builder":10} {"builds/s":>14} {"packets/s":>14}')
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sink, \
+         socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sender:
+        sink.bind(('127.0.0.1', 0))
+        dest = sink.getsockname()
+        for name, build in builders:
+            def build_all(build=build):
+                for mac in seq:
+                    build(mac)
+            def send_all(build=build):
+                for mac in seq:
+                    sender.sendto(build(mac), dest)
+            builds = _rate(len(seq), build_all)
+            sends = _rate(len(seq), send_all)
+            print(f'{name:10} {builds:14.0f} {sends:14.0f}')
+
+
+if __name__ == '__main__':
+    main()
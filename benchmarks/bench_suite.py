@@ -0,0 +1,192 @@
+# pylint: disable=missing-module-docstring,missing-function-docstring
+
+"""Benchmark suite with machine-readable results for catching regressions.
+
+Measures:
+
+* ``payload.*`` - magic packet construction, with and without the cache;
+* ``enum_interfaces`` - latency of one interface enumeration;
+* ``config.{json,sqlite}.*.N`` - `_load_config` (JSON only), `get_names`
+  and `save_name` against N saved names, for each N in --sizes;
+* ``wake.*`` - `wake()` in a loop and `wake_many()` to a loopback UDP sink.
+
+Every result has a unit and a direction. Times are the best of --repeat
+runs. The saved configuration lives in a temporary directory, so the
+user's own is never touched.
+
+    python benchmarks/bench_suite.py [--json] [--output FILE] [--compare BASELINE] [--tolerance T]
+
+--output writes the results as JSON, --json prints them to stdout instead
+of the table. --compare reads results written earlier and exits with 1 if
+any benchmark present in both got worse by more than the tolerance
+(0.25 = 25% by default).
+"""
+
+import argparse
+import json
+import os
+import platform
+import socket
+import sys
+import tempfile
+import time
+
+SCHEMA = 1
+
+
+class Results:
+    def __init__(self):
+        self.entries = []
+
+    def add(self, name, value, unit, higher_is_better):
+        self.entries.append({'name': name, 'value': value, 'unit': unit,
+                             'higher_is_better': higher_is_better})
+
+    def seconds(self, name, value):
+        self.add(name, value, 's', False)
+
+    def rate(self, name, count, seconds, unit):
+        self.add(name, count / seconds, unit, True)
+
+
+def _best_of(repeat, func, setup=None):
+    best = float('inf')
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def _mac(i):
+    return (0x02, 0, 0, (i >> 16) & 0xFF, (i >> 8) & 0xFF, i & 0xFF)
+
+
+def bench_payload(results, args):
+    from wakeonlan.wakeonlan import _payload
+    macs = [_mac(i) for i in range(1000)]
+    seq = macs * (args.packets // len(macs))
+    for name, build in (('uncached', _payload.__wrapped__), ('cached', _payload)):
+        def build_all(build=build):
+            for mac in seq:
+                build(mac)
+        results.rate(f'payload.{name}', len(seq), _best_of(args.repeat, build_all), 'builds/s')
+
+
+def bench_enumeration(results, args):
+    from wakeonlan.interfaces import enum_interfaces
+    enum_interfaces() # load ctypes/netlink state once, as a long-lived process would have
+    results.seconds('enum_interfaces', _best_of(args.repeat, enum_interfaces))
+
+
+def bench_config(results, args):
+    import wakeonlan
+    from wakeonlan.wakeonlan import _CONFIG_PATH, _load_config
+    from wakeonlan.inventory import STORE_ENV, _DB_PATH
+    for store in ('json', 'sqlite'):
+        os.environ[STORE_ENV] = store
+        for size in args.sizes:
+            for path in (_CONFIG_PATH, _DB_PATH):
+                if os.path.exists(path):
+                    os.unlink(path)
+            wakeonlan.save_names({f'host{i}': wakeonlan.HostRecord(_mac(i)) for i in range(size)})
+            if store == 'json':
+                results.seconds(f'config.json.load_config.{size}', _best_of(args.repeat, _load_config))
+            results.seconds(f'config.{store}.get_names.{size}', _best_of(args.repeat, wakeonlan.get_names))
+            extra = wakeonlan.HostRecord(_mac(size))
+            results.seconds(f'config.{store}.save_name.{size}',
+                            _best_of(args.repeat, lambda: wakeonlan.save_name('extra', extra),
+                                     setup=lambda: wakeonlan.delete_name('extra')
+                                     if wakeonlan.get_name_record('extra') else None))
+    del os.environ[STORE_ENV]
+
+
+def bench_wake(results, args):
+    import wakeonlan
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sink:
+        sink.bind(('127.0.0.1', 0))
+        port = sink.getsockname()[1]
+        # the sink is never read; packets the kernel drops once its buffer fills don't affect sending
+        records = [wakeonlan.HostRecord(_mac(i), None, '127.0.0.1', port) for i in range(args.hosts)]
+        def loop():
+            for rec in records:
+                wakeonlan.wake(rec)
+        results.rate('wake.wake', len(records), _best_of(args.repeat, loop), 'hosts/s')
+        results.rate('wake.wake_many', len(records),
+                     _best_of(args.repeat, lambda: wakeonlan.wake_many(records)), 'hosts/s')
+
+
+BENCHMARKS = (bench_payload, bench_enumeration, bench_config, bench_wake)
+
+
+def compare(entries, baseline, tolerance):
+    """print how entries changed relative to baseline, returning the names of regressions"""
+    before = {entry['name']: entry for entry in baseline['results']}
+    regressions = []
+    for entry in entries:
+        old = before.get(entry['name'])
+        if old is None or old['unit'] != entry['unit'] or not old['value']:
+            continue
+        # > 1 means slower, whichever way the benchmark is measured
+        slowdown = old['value'] / entry['value'] if entry['higher_is_better'] else entry['value'] / old['value']
+        worse = slowdown > 1 + tolerance
+        if worse:
+            regressions.append(entry['name'])
+        print(f'{entry["name"]:36} {slowdown:8.2f}x time{"  REGRESSION" if worse else ""}', file=sys.stderr)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--sizes', type=lambda s: [int(x) for x in s.split(',')], default=[1000, 10000, 100000],
+                        help='comma separated numbers of saved names (default 1000,10000,100000)')
+    parser.add_argument('--packets', type=int, default=100000, help='payloads built per run')
+    parser.add_argument('--hosts', type=int, default=5000, help='hosts woken per run')
+    parser.add_argument('--json', action='store_true', help='print the results as JSON instead of a table')
+    parser.add_argument('--output', metavar='FILE', help='also write the results as JSON to FILE')
+    parser.add_argument('--compare', metavar='BASELINE', help='JSON results to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='relative slowdown tolerated by --compare (default 0.25)')
+    args = parser.parse_args()
+
+    baseline = None
+    if args.compare is not None:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+
+    with tempfile.TemporaryDirectory() as home:
+        # must be set before wakeonlan is first imported
+        os.environ['WAKEONLAN_HOME'] = home
+        import wakeonlan
+        results = Results()
+        for bench in BENCHMARKS:
+            bench(results, args)
+
+    report = {
+        'schema': SCHEMA,
+        'wakeonlan': wakeonlan.__version__,
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'platform': platform.platform(),
+        'time': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        'results': results.entries,
+    }
+    if args.output is not None:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+    if args.json:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    else:
+        for entry in results.entries:
+            print(f'{entry["name"]:36} {entry["value"]:14.6g} {entry["unit"]}')
+
+    if baseline is not None and compare(results.entries, baseline, args.tolerance):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
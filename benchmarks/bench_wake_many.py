@@ -0,0 +1,61 @@
+# pylint: disable=missing-module-docstring,missing-function-docstring
+
+"""Compare `wake_many` against calling `wake` in a loop.
+
+Every host is sent to a loopback UDP sink, so the benchmark runs anywhere
+without putting packets on a real network. The sink is never read; the
+kernel dropping packets once its buffer fills doesn't affect the send side.
+
+    python benchmarks/bench_wake_many.py [--hosts N] [--repeat R]
+"""
+
+import argparse
+import socket
+import time
+
+import wakeonlan
+
+
+def _records(count, port):
+    return [wakeonlan.HostRecord((0x02, 0, 0, (i >> 16) & 0xFF, (i >> 8) & 0xFF, i & 0xFF),
+                                 None, '127.0.0.1', port)
+            for i in range(count)]
+
+
+def _best_of(repeat, func):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--hosts', type=int, default=5000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sink:
+        sink.bind(('127.0.0.1', 0))
+        records = _records(args.hosts, sink.getsockname()[1])
+
+        def loop():
+            for rec in records:
+                wakeonlan.wake(rec)
+
+        def bulk():
+            wakeonlan.wake_many(records)
+
+        looped = _best_of(args.repeat, loop)
+        batched = _best_of(args.repeat, bulk)
+
+    print(f'hosts:         {args.hosts}')
+    print(f'wake() loop:   {looped:.4f}s  {args.hosts / looped:12.0f} hosts/s')
+    print(f'wake_many():   {batched:.4f}s  {args.hosts / batched:12.0f} hosts/s')
+    print(f'speedup:       {looped / batched:.1f}x')
+
+
+if __name__ == '__main__':
+    main()
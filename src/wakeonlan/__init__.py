@@ -9,25 +9,93 @@ from .wakeonlan import \
     VERSION as __version__, \
     wake, \
     save_name, \
+    save_names, \
     get_name_record, \
     get_names, \
     delete_name, \
+    delete_names, \
+    get_groups, \
+    save_group, \
+    delete_group, \
     MacAddress, \
     IPAddress, \
     Port, \
-    HostRecord
+    HostRecord, \
+    WakeResult
 
+from .pool import SocketPool
+from .pacing import Pacer, PacingStats, Repeat
 from .util import WakeOnLanError
 
+# attributes whose modules are only imported on first access (PEP 562)
+_LAZY = {
+    'wake_many': '.bulk',
+    'wake_group': '.bulk',
+    'wake_in_waves': '.waves',
+    'WaveEvent': '.waves',
+    'Verify': '.verify',
+    'VerifyResult': '.verify',
+    'wake_and_verify': '.verify',
+    'async_wake_and_verify': '.verify',
+    'wait_up': '.verify',
+    'async_wake': '.aio',
+    'async_wake_many': '.aio',
+    'ConfigStore': '.inventory',
+    'config_transaction': '.inventory',
+    'AffinityCache': '.affinity',
+    'wake_by_ip': '.neighbors',
+    'resolve_macs': '.neighbors',
+    'MacCache': '.neighbors',
+}
+
+def __getattr__(name: str):
+    module = _LAZY.get(name)
+    if module is None:
+        raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+    import importlib
+    value = getattr(importlib.import_module(module, __name__), name)
+    globals()[name] = value
+    return value
+
+def __dir__():
+    return sorted(set(globals()) | set(_LAZY))
+
 __all__ = [
     'wake',
+    'wake_many',
+    'wake_group',
+    'wake_in_waves',
+    'wake_and_verify',
+    'async_wake_and_verify',
+    'wait_up',
+    'async_wake',
+    'async_wake_many',
+    'wake_by_ip',
+    'resolve_macs',
     'save_name',
+    'save_names',
     'get_name_record',
     'get_names',
     'delete_name',
+    'delete_names',
+    'config_transaction',
+    'get_groups',
+    'save_group',
+    'delete_group',
     'MacAddress',
     'IPAddress',
     'Port',
     'HostRecord',
+    'WakeResult',
+    'SocketPool',
+    'Pacer',
+    'PacingStats',
+    'Repeat',
+    'WaveEvent',
+    'Verify',
+    'VerifyResult',
+    'ConfigStore',
+    'AffinityCache',
+    'MacCache',
     'WakeOnLanError'
 ]
@@ -0,0 +1,60 @@
+# Copyright (c) 2018, Eugene Gershnik
+# Use of this source code is governed by a BSD-style
+# license that can be found in the LICENSE.txt file or at
+# https://opensource.org/licenses/BSD-3-Clause
+
+"""Learned host-to-interface affinity.
+
+On a machine with several interfaces, a wake without an interface goes out
+of all of them, although any given host is only reachable through one.
+An `AffinityCache` remembers, per MAC, the interface through which the host
+was last confirmed up. That can come from `wake_and_verify` or `wait_up`,
+which look up the interface the host answered through, or from an explicit
+`learn` call. Wakes given the cache send through the learned interface
+only and fall back to all interfaces if that send fails. Verified wakes
+also fall back if the host doesn't come up after the first packet.
+
+The cache is kept as JSON next to the saved configuration
+(``$HOME/.wakeonlan.affinity``), with the aging and eviction of every
+`LearnedCache`.
+"""
+
+from typing import Optional
+
+from .learned import LearnedCache
+
+
+class AffinityCache(LearnedCache):
+    """Interface that last woke each MAC, persisted next to the configuration.
+
+    Keys are MACs as XX:XX:XX:XX:XX:XX, in either case; values are interface
+    names. See `LearnedCache` for loading, saving and thread safety.
+    """
+    FILE_NAME = '.wakeonlan.affinity'
+    VALUE = 'interface'
+
+    def _key(self, key: str) -> str:
+        return key.upper()
+
+
+def route_interface(host: str) -> Optional[str]:
+    """Name of the interface the OS would reach an address through, None if not known.
+
+    Nothing is sent: a UDP socket connected to the address reveals the local
+    address the route uses, which is then looked up among the interfaces.
+    """
+    import socket
+    from .interfaces import interface_cache
+    try:
+        infos = socket.getaddrinfo(host, 9, type=socket.SOCK_DGRAM)
+        family, socktype, proto, _, sockaddr = infos[0]
+        with socket.socket(family, socktype, proto) as sock:
+            sock.connect(sockaddr)
+            local = sock.getsockname()[0]
+    except OSError:
+        return None
+    local = local.split('%', 1)[0]
+    for name, addresses in interface_cache.get().items():
+        if any(address[2] == local for address in addresses):
+            return name
+    return None
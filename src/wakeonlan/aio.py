@@ -0,0 +1,175 @@
+# Copyright (c) 2018, Eugene Gershnik
+# Use of this source code is governed by a BSD-style
+# license that can be found in the LICENSE.txt file or at
+# https://opensource.org/licenses/BSD-3-Clause
+
+"""asyncio flavor of the wake API.
+
+`async_wake` and `async_wake_many` never block the event loop: interface
+enumeration and planning where each packet goes run in the loop's default
+executor, name resolution goes through `loop.getaddrinfo` and packets are
+sent over non-blocking sockets with `loop.sock_sendto` where available
+(Python 3.11+), so send errors are raised on any event loop. Repeated packets and retries are
+timed with `asyncio.sleep`, so every target of a batch is served by the one
+event loop. Both return `WakeResult` objects and print nothing.
+"""
+
+import asyncio
+import socket
+from typing import Any, Dict, Iterable, List, Optional
+
+from .interfaces import interface_cache, InterfaceAddress
+from .pacing import Pacer, Repeat, is_transient
+from . import metrics
+from .affinity import AffinityCache
+from .wakeonlan import HostRecord, WakeResult, _payload
+from .bulk import _Batch, _Outcome, _Send, _SocketKey, _Subnet, _dest_key, _fallback, _merge_fallback, \
+    _needs_interfaces, _needs_subnets, _open_socket, _select_addresses, _subnets
+
+
+async def _sendto(sock: socket.socket, payload: bytes, dest: Any):
+    """send one packet through a non-blocking socket, raising any error"""
+    loop = asyncio.get_running_loop()
+    if hasattr(loop, 'sock_sendto'):
+        # 3.11+: waits for the socket to be writable on every event loop, proactor included
+        await loop.sock_sendto(sock, payload, dest)
+    else:
+        # a non-blocking send either goes out or fails right away, EAGAIN included
+        sock.sendto(payload, dest)
+
+
+async def _send_one(sock: socket.socket, payload: bytes, dest: Any, key: _SocketKey,
+                    pacer: Optional[Pacer], repeat: Repeat, start: float) -> _Outcome:
+    """send repeat.count packets to one target
+
+    Returns the error that stopped them, if any, when it was done relative to
+    start and how many packets went out.
+    """
+    loop = asyncio.get_running_loop()
+    first = 0.0
+    for copy in range(repeat.count):
+        if copy > 0:
+            delay = first + copy * repeat.interval - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+        if pacer is not None:
+            delay = pacer.reserve(key)
+            while delay > 0:
+                await asyncio.sleep(delay)
+                delay = pacer.paused_for()
+        attempt = 0
+        while True:
+            try:
+                await _sendto(sock, payload, dest)
+                break
+            except OSError as ex:
+                if not is_transient(ex) or attempt >= repeat.retries:
+                    return ex, loop.time() - start, copy
+            delay = repeat.retry_delay(attempt)
+            attempt += 1
+            if pacer is not None:
+                pacer.backoff(delay)
+            await asyncio.sleep(delay)
+        if pacer is not None:
+            pacer.sent()
+        if copy == 0:
+            first = loop.time()
+    return None, loop.time() - start, repeat.count
+
+
+async def _send_group(key: _SocketKey, sends: List[_Send], payloads: List[bytes],
+                      pacer: Optional[Pacer], repeat: Repeat, start: float) -> List[_Outcome]:
+    loop = asyncio.get_running_loop()
+    try:
+        sock = _open_socket(key)
+    except OSError as ex:
+        return [(ex, loop.time() - start, 0)] * len(sends)
+    try:
+        sock.setblocking(False)
+        outcomes = await asyncio.gather(*(_send_one(sock, payloads[res_idx], dest, key, pacer, repeat, start)
+                                          for res_idx, _, dest in sends))
+    except OSError as ex:
+        return [(ex, loop.time() - start, 0)] * len(sends)
+    finally:
+        sock.close()
+    return list(outcomes)
+
+
+async def _resolve(batch: _Batch, records: List[HostRecord]):
+    loop = asyncio.get_running_loop()
+    dests = list({(rec.address, rec.port) for rec in records
+                  if rec.interface is None and rec.address is not None})
+    infos: List[Any] = await asyncio.gather(
+        *(loop.getaddrinfo(host, port, type=socket.SOCK_DGRAM) for host, port in dests),
+        return_exceptions=True)
+    for dest, info in zip(dests, infos):
+        if isinstance(info, OSError):
+            batch.resolved[dest] = info
+        elif isinstance(info, BaseException):
+            raise info
+        else:
+            batch.resolved[dest] = _dest_key(info)
+
+
+async def _send_batch(batch: _Batch, results: List[WakeResult], pacer: Optional[Pacer], repeat: Repeat):
+    loop = asyncio.get_running_loop()
+    payloads = [_payload(result.record.mac) for result in results]
+    start = loop.time()
+    outcomes = await asyncio.gather(*(_send_group(key, sends, payloads, pacer, repeat, start)
+                                      for key, sends in batch.groups.items()))
+    batch.record(results, list(outcomes))
+
+
+async def async_wake_many(records: Iterable[HostRecord], pacer: Optional[Pacer] = None,
+                          repeat: Optional[Repeat] = None,
+                          affinity: Optional[AffinityCache] = None) -> List[WakeResult]:
+    """Wake all the hosts given by records without blocking the event loop.
+
+    Behaves like `wake_many`: returns a `WakeResult` for each record, in the
+    same order, with per-record problems recorded rather than raised. A
+    `Pacer` spaces the packets with `asyncio.sleep`. Transient send errors,
+    such as an unreachable network, are retried as `repeat` says. With an
+    `AffinityCache`, hosts go out on their learned interface first.
+    """
+    loop = asyncio.get_running_loop()
+    began = loop.time()
+    records = list(records)
+    results = [WakeResult(rec, [], {}, {}, {}) for rec in records]
+
+    selected: Dict[str, Optional[InterfaceAddress]] = {}
+    subnets: List[_Subnet] = []
+    if _needs_interfaces(records):
+        ifaces = interface_cache.peek()
+        if ifaces is None:
+            ifaces = await loop.run_in_executor(None, interface_cache.get)
+        selected = _select_addresses(ifaces)
+        if _needs_subnets(records):
+            subnets = _subnets(ifaces)
+
+    batch = _Batch()
+    await _resolve(batch, records)
+    # planning may still resolve directed broadcast addresses and read the affinity cache
+    await loop.run_in_executor(None, batch.plan, results, selected, subnets, affinity)
+
+    repeat = Repeat() if repeat is None else repeat
+    await _send_batch(batch, results, pacer, repeat)
+    failed, retries = _fallback(results, batch.preferred)
+    if failed:
+        batch = _Batch()
+        await loop.run_in_executor(None, batch.plan, retries, selected, subnets)
+        await _send_batch(batch, retries, pacer, repeat)
+        _merge_fallback(results, failed, retries)
+    collector = metrics.collector
+    if collector is not None:
+        collector.bulk_wake(len(records), loop.time() - began)
+    return results
+
+
+async def async_wake(record: HostRecord, pacer: Optional[Pacer] = None,
+                     repeat: Optional[Repeat] = None, affinity: Optional[AffinityCache] = None) -> WakeResult:
+    """Wake the host given by the record without blocking the event loop.
+
+    Unlike `wake`, an unknown interface is reported in the returned result
+    rather than raised.
+    """
+    return (await async_wake_many([record], pacer, repeat, affinity))[0]
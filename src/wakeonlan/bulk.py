@@ -0,0 +1,393 @@
+# Copyright (c) 2018, Eugene Gershnik
+# Use of this source code is governed by a BSD-style
+# license that can be found in the LICENSE.txt file or at
+# https://opensource.org/licenses/BSD-3-Clause
+
+"""Wake many hosts in one call.
+
+`wake_many` resolves the send path of every record up front and then sends
+the whole batch grouped by socket. Compared with calling `wake` in a loop:
+
+* interfaces are enumerated at most once per batch;
+* each destination address is resolved once, no matter how many hosts use it;
+* one socket is opened per source interface address (or per destination
+  family for records with an explicit address, or per interface for raw
+  Ethernet frames) and reused for every packet sent through it.
+
+The sockets of a batch are opened, and the first packet through each sent,
+on a small, shared pool of threads, so that setting up or sending on a slow
+interface doesn't delay the others. Everything else, including repeats and
+retries of transient failures, is sent from one thread by a
+`SendScheduler`. It interleaves the sockets, so a batch spanning several
+interfaces isn't serialized behind the slowest (or most heavily paced) one,
+and no host sleeps while others wait.
+Outcomes are recorded in plan order, whatever order the sends completed in,
+along with how long each took. `wake` fans out to all interfaces this way
+too. `wake_group` wakes all members of a saved group this way.
+
+Given an `AffinityCache`, records that would go out on all interfaces go
+out only on the interface learned for their MAC, if it is still up. Those
+whose send there fails are sent again on all interfaces.
+"""
+
+import functools
+import socket
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Set, Tuple, Union
+
+from .util import WakeOnLanError
+from .interfaces import interface_cache, InterfaceAddress
+from .pool import SocketPool, SocketKey as _SocketKey, _open_socket
+from .pacing import Pacer, Repeat, SendScheduler
+from .affinity import AffinityCache
+from . import ether, metrics
+from .wakeonlan import HostRecord, WakeResult, SocketAddress, TRANSPORT_ETHERNET_BROADCAST, \
+    _payload, _select_address, _interface_dest, _uses_ether, _parse_host_ip
+
+# (index of the result, target label, destination)
+_Send = Tuple[int, str, SocketAddress]
+# (ipaddress network, interface name, interface address on it)
+_Subnet = Tuple[Any, str, InterfaceAddress]
+# error, or None, seconds since the batch started sending and packets sent
+_Outcome = Tuple[Optional[Exception], float, int]
+
+# most sockets opened, and first packets sent, at once by all batches together
+_FANOUT_THREADS = 16
+
+_fanout_executor: Optional[Any] = None
+_fanout_lock = threading.Lock()
+
+# metrics label of each kind of socket key
+_PATH_KINDS = {'if': 'interface', 'dest': 'address', 'ether': 'ethernet'}
+
+
+def _fanout() -> Any:
+    """the executor batches open their sockets on, created on first use and kept for the next batch"""
+    global _fanout_executor # pylint: disable=global-statement
+    with _fanout_lock:
+        if _fanout_executor is None:
+            from concurrent.futures import ThreadPoolExecutor
+            _fanout_executor = ThreadPoolExecutor(_FANOUT_THREADS, thread_name_prefix='wakeonlan-fanout')
+        return _fanout_executor
+
+
+def _select_addresses(ifaces: Dict[str, List[InterfaceAddress]]) -> Dict[str, Optional[InterfaceAddress]]:
+    return {name: _select_address(src) for name, src in ifaces.items()}
+
+
+def _needs_interfaces(records: Sequence[HostRecord]) -> bool:
+    return any(rec.interface is not None or rec.address is None for rec in records)
+
+
+def _needs_subnets(records: Sequence[HostRecord]) -> bool:
+    return any(rec.host_ip is not None and rec.interface is None and rec.address is None for rec in records)
+
+
+def _subnets(ifaces: Dict[str, List[InterfaceAddress]]) -> List[_Subnet]:
+    """IPv4 subnets of the interfaces that have a broadcast address, most specific first"""
+    subnets = []
+    for name, addresses in ifaces.items():
+        for address in addresses:
+            prefixlen = getattr(address, 'prefixlen', None)
+            if address[1] == socket.AF_INET and prefixlen is not None and prefixlen < 31:
+                subnets.append((address.network(), name, address))
+    subnets.sort(key=lambda subnet: -subnet[0].prefixlen)
+    return subnets
+
+
+def _match_subnet(host: Any, subnets: Sequence[_Subnet]) -> Optional[_Subnet]:
+    for subnet in subnets:
+        if host.ip in subnet[0]:
+            return subnet
+    return None
+
+
+def _dest_key(addrinfo: List[Tuple[Any, ...]]) -> Tuple[_SocketKey, SocketAddress]:
+    family, socktype, proto, _, sockaddr = addrinfo[0]
+    return ('dest', family, socktype, proto), sockaddr
+
+
+class _Batch:
+    """Sends of a batch grouped by the socket they go out on"""
+    def __init__(self):
+        self.groups: Dict[_SocketKey, List[_Send]] = {}
+        # (host, port) -> resolved destination or the error resolving it
+        self.resolved: Dict[Tuple[str, int], Union[Tuple[_SocketKey, SocketAddress], OSError]] = {}
+        # indices of the results sent only on their learned interface
+        self.preferred: List[int] = []
+
+    def add_interface(self, res_idx: int, name: str, address: InterfaceAddress, dest: SocketAddress):
+        self.groups.setdefault(('if', address), []).append((res_idx, name, dest))
+
+    def add_ether(self, res_idx: int, name: str, mac: bytes):
+        self.groups.setdefault(('ether', name), []).append((res_idx, name, ether.dest(name, mac)))
+
+    def add_dest(self, res_idx: int, host: str, port: int) -> Optional[OSError]:
+        resolved = self.resolved.get((host, port))
+        if resolved is None:
+            try:
+                resolved = _dest_key(socket.getaddrinfo(host, port, type=socket.SOCK_DGRAM))
+            except OSError as ex:
+                resolved = ex
+            self.resolved[(host, port)] = resolved
+        if isinstance(resolved, OSError):
+            return resolved
+        key, sockaddr = resolved
+        self.groups.setdefault(key, []).append((res_idx, host, sockaddr))
+        return None
+
+    def plan(self, results: List[WakeResult], selected: Dict[str, Optional[InterfaceAddress]],
+             subnets: Sequence[_Subnet] = (), affinity: Optional[AffinityCache] = None):
+        """Work out where each record's packet goes, recording failures in results
+
+        Records with a `host_ip` but neither interface nor address go out
+        only on the interface whose subnet, among `subnets`, has the host.
+        Otherwise, records that would go out on all `selected` interfaces go
+        out only on the one `affinity` has learned for them, if selected.
+        """
+        for res_idx, result in enumerate(results):
+            mac, iface, ipaddr, port, transport, host_ip = result.record
+            host = subnet = None
+            if host_ip is not None and iface is None and ipaddr is None:
+                host = _parse_host_ip(host_ip)
+                if host is None:
+                    result.errors[host_ip] = WakeOnLanError(f'Host ip `{host_ip}` is malformed')
+                    continue
+                subnet = _match_subnet(host, subnets)
+            learned = None
+            if affinity is not None and iface is None and ipaddr is None and subnet is None and \
+                    (host is None or '/' not in host_ip):
+                learned = affinity.get(result.record.mac_str())
+                if selected.get(learned) is None:
+                    learned = None
+                else:
+                    self.preferred.append(res_idx)
+            if _uses_ether(result.record):
+                if ipaddr is not None:
+                    result.errors[ipaddr] = WakeOnLanError('Raw Ethernet frames cannot be sent to an IP address')
+                    continue
+                dest_mac = ether.BROADCAST if transport == TRANSPORT_ETHERNET_BROADCAST else bytes(mac)
+                names = [iface] if iface is not None else [subnet[1]] if subnet is not None else \
+                    [learned] if learned is not None else selected
+                for name in names:
+                    self.add_ether(res_idx, name, dest_mac)
+            elif iface is not None:
+                if iface not in selected:
+                    result.errors[iface] = WakeOnLanError(
+                        f'Interface `{iface}` not found or has no usable addresses')
+                    continue
+                address = selected[iface]
+                if address is None:
+                    result.errors[iface] = WakeOnLanError(
+                        f'Interface `{iface}` has no usable IPv4 or IPv6 address')
+                    continue
+                self.add_interface(res_idx, iface, address, _interface_dest(address, port))
+            elif ipaddr is not None:
+                error = self.add_dest(res_idx, ipaddr, port)
+                if error is not None:
+                    result.errors[ipaddr] = error
+            elif subnet is not None:
+                network, name, address = subnet
+                self.add_interface(res_idx, name, address, (str(network.broadcast_address), port))
+            elif host is not None and '/' in host_ip:
+                # not on any local subnet: a directed broadcast is the only way there
+                broadcast = str(host.network.broadcast_address)
+                error = self.add_dest(res_idx, broadcast, port)
+                if error is not None:
+                    result.errors[broadcast] = error
+            elif learned is not None:
+                address = selected[learned]
+                self.add_interface(res_idx, learned, address, _interface_dest(address, port))
+            else:
+                for name, address in selected.items():
+                    if address is not None:
+                        self.add_interface(res_idx, name, address, _interface_dest(address, port))
+        collector = metrics.collector
+        if collector is not None:
+            # nothing has been sent yet, so every error so far is from planning
+            for result in results:
+                for error in result.errors.values():
+                    collector.plan_failed(error)
+
+    def send(self, results: List[WakeResult], pool: Optional[SocketPool] = None,
+             pacer: Optional[Pacer] = None, repeat: Optional[Repeat] = None):
+        """Send all planned packets, one socket per group, on a single scheduler
+
+        With several groups, their sockets are opened and the first packet
+        through each is sent on the threads of a shared executor, up to
+        `_FANOUT_THREADS` at once, so a slow interface doesn't hold up the
+        others. Everything else goes
+        out from the scheduler's timer.
+        """
+        payloads = [_payload(result.record.mac) for result in results]
+        scheduler = SendScheduler(repeat, pacer)
+        start = time.monotonic()
+        groups = list(self.groups.items())
+        outcomes: List[List[_Outcome]] = [[(None, 0.0, 0)] * len(sends) for _, sends in groups]
+
+        def start_group(group_idx: int) -> Optional[Any]:
+            key, sends = groups[group_idx]
+            try:
+                sock = _open_socket(key) if pool is None else pool.get(key)
+            except OSError as ex:
+                outcomes[group_idx] = [(ex, time.monotonic() - start, 0)] * len(sends)
+                return None
+            for idx, (res_idx, _, dest) in enumerate(sends):
+                done = functools.partial(_finish, outcomes[group_idx], idx, start)
+                if idx == 0:
+                    scheduler.send_first(sock, payloads[res_idx], dest, key, done)
+                else:
+                    scheduler.add(sock, payloads[res_idx], dest, key, done)
+            return sock
+
+        if len(groups) > 1:
+            socks = list(_fanout().map(start_group, range(len(groups))))
+        else:
+            socks = [start_group(group_idx) for group_idx in range(len(groups))]
+        opened = [(key, sock) for (key, _), sock in zip(groups, socks) if sock is not None]
+        try:
+            scheduler.run()
+        finally:
+            for key, sock in opened:
+                if pool is None:
+                    sock.close()
+                else:
+                    pool.release(key, sock)
+        failed = self.record(results, outcomes)
+        if pool is not None:
+            # don't keep a socket that failed in the pool
+            for key, _ in opened:
+                if key in failed:
+                    pool.discard(key)
+
+    def record(self, results: List[WakeResult], outcomes: List[List[_Outcome]]) -> Set[_SocketKey]:
+        """Record the outcome of every send, given group by group, returning the keys of groups that failed
+
+        Outcomes go into the results in plan order, regardless of when each
+        send completed, so the results of a batch don't depend on timing.
+        """
+        collector = metrics.collector
+        failed = set()
+        for (key, sends), group_outcomes in zip(self.groups.items(), outcomes):
+            for (res_idx, label, _), (error, elapsed, packets) in zip(sends, group_outcomes):
+                result = results[res_idx]
+                if error is None:
+                    result.sent.append(label)
+                else:
+                    result.errors[label] = error
+                    failed.add(key)
+                result.timings[label] = elapsed
+                result.bytes_sent[label] = packets * len(_payload(result.record.mac))
+                if collector is not None:
+                    collector.sent(_PATH_KINDS[key[0]], '' if key[0] == 'dest' else label,
+                                   packets, result.bytes_sent[label], error)
+        return failed
+
+
+def _fallback(results: List[WakeResult], preferred: Sequence[int]) -> Tuple[List[int], List[WakeResult]]:
+    """indices and fresh results of the records whose send on their learned interface failed"""
+    failed = [res_idx for res_idx in preferred if not results[res_idx].succeeded()]
+    return failed, [WakeResult(results[res_idx].record, [], {}, {}, {}) for res_idx in failed]
+
+
+def _merge_fallback(results: List[WakeResult], failed: Sequence[int], retries: Sequence[WakeResult]):
+    """fold the results of sending on all interfaces into those of the learned one"""
+    for res_idx, retry in zip(failed, retries):
+        result = results[res_idx]
+        offset = result.elapsed()
+        for label in retry.sent:
+            result.errors.pop(label, None)
+        result.sent.extend(retry.sent)
+        result.errors.update(retry.errors)
+        for label, elapsed in retry.timings.items():
+            result.timings[label] = offset + elapsed
+        for label, sent in retry.bytes_sent.items():
+            result.bytes_sent[label] = result.bytes_sent.get(label, 0) + sent
+
+
+def _finish(outcomes: List[_Outcome], idx: int, start: float, error: Optional[OSError], packets: int):
+    outcomes[idx] = (error, time.monotonic() - start, packets)
+
+
+def _send_with_fallback(results: List[WakeResult], selected: Dict[str, Optional[InterfaceAddress]],
+                        subnets: Sequence[_Subnet], affinity: Optional[AffinityCache],
+                        pool: Optional[SocketPool], pacer: Optional[Pacer], repeat: Optional[Repeat]):
+    batch = _Batch()
+    batch.plan(results, selected, subnets, affinity)
+    batch.send(results, pool, pacer, repeat)
+    failed, retries = _fallback(results, batch.preferred)
+    if failed:
+        batch = _Batch()
+        batch.plan(retries, selected, subnets)
+        batch.send(retries, pool, pacer, repeat)
+        _merge_fallback(results, failed, retries)
+
+
+def wake_many(records: Iterable[HostRecord], pool: Optional[SocketPool] = None,
+              pacer: Optional[Pacer] = None, repeat: Optional[Repeat] = None,
+              affinity: Optional[AffinityCache] = None) -> List[WakeResult]:
+    """Wake all the hosts given by records.
+
+    Returns a `WakeResult` for each record, in the same order. Unlike `wake`,
+    a problem with one record (unknown interface, unresolvable address,
+    send failure) is recorded in its result rather than raised, so the rest
+    of the batch still goes out. Nothing is printed.
+
+    If a `SocketPool` is given, sockets are taken from it and left open.
+    With a `Pacer`, packets are sent no faster than it allows. `repeat` sets
+    how many packets each host gets and how transient send failures are
+    retried, as for `wake`. Packets on different sockets are interleaved.
+    With an `AffinityCache`, hosts go out on their learned interface first
+    and on all interfaces only if that fails.
+    """
+    start = time.perf_counter()
+    records = list(records)
+    results = [WakeResult(rec, [], {}, {}, {}) for rec in records]
+
+    selected: Dict[str, Optional[InterfaceAddress]] = {}
+    subnets: List[_Subnet] = []
+    if _needs_interfaces(records):
+        ifaces = interface_cache.get()
+        selected = _select_addresses(ifaces)
+        if _needs_subnets(records):
+            subnets = _subnets(ifaces)
+
+    _send_with_fallback(results, selected, subnets, affinity, pool, pacer, repeat)
+    collector = metrics.collector
+    if collector is not None:
+        collector.bulk_wake(len(records), time.perf_counter() - start)
+    return results
+
+
+def wake_group(group: str, pool: Optional[SocketPool] = None, pacer: Optional[Pacer] = None,
+               repeat: Optional[Repeat] = None, affinity: Optional[AffinityCache] = None) -> Dict[str, WakeResult]:
+    """Wake all members of a saved group.
+
+    Members are sent to as one `wake_many` batch. Returns the
+    `WakeResult` of each member keyed by its saved name. Raises
+    `WakeOnLanError` if the group, or any of its members, isn't saved.
+    """
+    members = group_members(group)
+    results = wake_many((rec for _, rec in members), pool, pacer=pacer, repeat=repeat, affinity=affinity)
+    return {name: result for (name, _), result in zip(members, results)}
+
+
+def group_members(group: str) -> List[Tuple[str, HostRecord]]:
+    """Names and records of the members of a saved group, in group order"""
+    from .inventory import get_backend
+    backend = get_backend()
+    members = backend.get_groups().get(group)
+    if members is None:
+        raise WakeOnLanError(f'Group {group} not found')
+    return _saved_records(members, f'Group {group} refers to names that are not saved')
+
+
+def _saved_records(names: Iterable[str], missing_message: str) -> List[Tuple[str, HostRecord]]:
+    from .inventory import get_backend
+    saved = get_backend().get_all()
+    names = list(dict.fromkeys(names)) # a name listed twice is still one host
+    missing = [name for name in names if name not in saved]
+    if missing:
+        raise WakeOnLanError(f'{missing_message}: {", ".join(missing)}')
+    return [(name, saved[name]) for name in names]
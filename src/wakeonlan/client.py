@@ -0,0 +1,60 @@
+# Copyright (c) 2018, Eugene Gershnik
+# Use of this source code is governed by a BSD-style
+# license that can be found in the LICENSE.txt file or at
+# https://opensource.org/licenses/BSD-3-Clause
+
+"""Client side of the resident daemon protocol (see `daemon`).
+
+Kept separate from the daemon itself so that every command line invocation
+can check for a running daemon without importing the server machinery.
+"""
+
+import os
+import json
+import socket
+from typing import Any, Dict, Optional
+
+from .util import WakeOnLanError
+from .wakeonlan import _config_home
+
+_TIMEOUT = 10.0
+
+
+def socket_path() -> str:
+    """The daemon's socket: ``$WAKEONLAN_SOCKET``, or ``.wakeonlan.sock`` in `CONFIG_HOME`"""
+    return os.environ.get('WAKEONLAN_SOCKET', os.path.join(_config_home(), '.wakeonlan.sock'))
+
+
+def request(req: Dict[str, Any], path: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    """Send a request to a running daemon and return its response.
+
+    Returns None if no daemon is listening at path (`socket_path()` by default).
+    """
+    if not hasattr(socket, 'AF_UNIX'):
+        return None
+    path = socket_path() if path is None else path
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) # pylint: disable=no-member
+    try:
+        sock.settimeout(_TIMEOUT)
+        try:
+            sock.connect(path)
+        except OSError:
+            return None
+        sock.sendall(json.dumps(req).encode('utf-8') + b'\n')
+        with sock.makefile('rb') as reader:
+            line = reader.readline()
+    except OSError as ex:
+        raise WakeOnLanError(f'Communication with daemon failed: {ex}') from ex
+    finally:
+        sock.close()
+    if not line:
+        raise WakeOnLanError('Daemon closed connection unexpectedly')
+    try:
+        response = json.loads(line)
+    except ValueError as ex:
+        raise WakeOnLanError('Daemon sent malformed response') from ex
+    if not isinstance(response, dict):
+        raise WakeOnLanError('Daemon sent malformed response')
+    if not response.get('ok'):
+        raise WakeOnLanError(str(response.get('error', 'Daemon request failed')))
+    return response
@@ -0,0 +1,172 @@
+# Copyright (c) 2018, Eugene Gershnik
+# Use of this source code is governed by a BSD-style
+# license that can be found in the LICENSE.txt file or at
+# https://opensource.org/licenses/BSD-3-Clause
+
+"""Resident wake daemon.
+
+`wakeonlan --serve` runs a `WakeDaemon` that keeps the saved names, the
+interface snapshot and open sockets in memory and answers requests on a
+Unix-domain socket. The command line forwards wake and list commands to it
+via `client.request` when it is running, so a scripted wake costs one IPC
+round trip instead of a full startup.
+
+The protocol is one JSON object per line in each direction. Requests:
+
+* ``{"cmd": "wake", "names": [NAME, ...], "records": [RECORD, ...]}`` -
+  wake saved names and/or explicit records (in saved-configuration format)
+  in one batch. The response carries ``"results"``: one entry per name
+  followed by one per record, each with ``"record"``, ``"sent"`` and
+  ``"errors"`` (label -> ``{"message", "fatal"}``), or just ``"name"`` and
+  ``"error"`` for unknown names.
+* ``{"cmd": "list"}`` - the response carries ``"names"``: name -> record.
+
+Every response has ``"ok"``; failed requests carry ``"error"`` instead.
+"""
+
+import os
+import sys
+import json
+import socketserver
+from typing import Any, Dict, List, Optional
+
+from .util import WakeOnLanError
+from .client import request, socket_path
+from .pool import SocketPool
+from .bulk import wake_many
+from .wakeonlan import HostRecord, WakeResult, \
+    _make_name_record, _parse_name_record
+from .inventory import ConfigStore
+from . import metrics
+
+def _encode_result(result: WakeResult) -> Dict[str, Any]:
+    return {
+        'record': _make_name_record(result.record),
+        'sent': result.sent,
+        'errors': {label: {'message': str(error), 'fatal': isinstance(error, WakeOnLanError)}
+                   for label, error in result.errors.items()}
+    }
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    server: '_Server'
+
+    def handle(self):
+        for line in self.rfile:
+            try:
+                req = json.loads(line)
+                if not isinstance(req, dict):
+                    raise WakeOnLanError('Request must be a JSON object')
+                response = self.server.daemon.dispatch(req)
+                response['ok'] = True
+            except (ValueError, WakeOnLanError) as ex:
+                response = {'ok': False, 'error': str(ex)}
+            self.wfile.write(json.dumps(response).encode('utf-8') + b'\n')
+
+
+if hasattr(socketserver, 'ThreadingUnixStreamServer'):
+    class _Server(socketserver.ThreadingUnixStreamServer): # pylint: disable=no-member
+        daemon_threads = True
+        daemon: 'WakeDaemon'
+
+
+class WakeDaemon:
+    """Serves wake and list requests on a Unix-domain socket"""
+    def __init__(self, path: Optional[str] = None):
+        if not hasattr(socketserver, 'ThreadingUnixStreamServer'):
+            raise WakeOnLanError('--serve is not supported on this platform')
+        self.path = socket_path() if path is None else path
+        self.pool = SocketPool()
+        self.store = ConfigStore()
+        self._server: Optional[_Server] = None
+
+    def names(self) -> Dict[str, HostRecord]:
+        """Saved names, reloaded only when the backing store changes"""
+        return self.store.get_all()
+
+    def dispatch(self, req: Dict[str, Any]) -> Dict[str, Any]:
+        """Handle a decoded request and return the response"""
+        cmd = req.get('cmd')
+        if cmd == 'wake':
+            return self._wake(req.get('names', []), req.get('records', []))
+        if cmd == 'list':
+            return {'names': {name: _make_name_record(record) for name, record in self.names().items()}}
+        raise WakeOnLanError(f'Unknown command {cmd!r}')
+
+    def _wake(self, names: List[Any], records: List[Any]) -> Dict[str, Any]:
+        if not isinstance(names, list) or not isinstance(records, list):
+            raise WakeOnLanError('`names` and `records` must be lists')
+        to_wake: List[HostRecord] = []
+        slots: List[Any] = []
+        for name in names:
+            record = self.store.get(name) if isinstance(name, str) else None
+            if record is None:
+                slots.append({'name': name, 'error': f'Name {name} not found'})
+            else:
+                slots.append(len(to_wake))
+                to_wake.append(record)
+        for idx, record in enumerate(records):
+            slots.append(len(to_wake))
+            to_wake.append(_parse_name_record(f'records[{idx}]', record))
+        results = wake_many(to_wake, self.pool)
+        return {'results': [_encode_result(results[slot]) if isinstance(slot, int) else slot
+                            for slot in slots]}
+
+    def bind(self) -> None:
+        """Start listening on the socket"""
+        if request({'cmd': 'list'}, self.path) is not None:
+            raise WakeOnLanError(f'Daemon already running on {self.path}')
+        try:
+            os.unlink(self.path)
+        except OSError:
+            pass
+        old_umask = os.umask(0o177)
+        try:
+            self._server = _Server(self.path, _Handler)
+        except OSError as err:
+            raise WakeOnLanError(f'Unable to listen on {self.path}: {err.strerror}') from err
+        finally:
+            os.umask(old_umask)
+        self._server.daemon = self
+
+    def serve_forever(self) -> None:
+        """Serve requests until interrupted, binding first if needed"""
+        if self._server is None:
+            self.bind()
+        assert self._server is not None
+        try:
+            self._server.serve_forever()
+        finally:
+            self._server.server_close()
+            self.pool.close()
+            self.store.close()
+            try:
+                os.unlink(self.path)
+            except OSError:
+                pass
+
+    def shutdown(self) -> None:
+        """Stop `serve_forever` running on another thread"""
+        if self._server is not None:
+            self._server.shutdown()
+
+
+def serve(metrics_port: Optional[int] = None) -> None:
+    """Run the daemon until interrupted or terminated, serving metrics on metrics_port if given"""
+    import signal
+    daemon = WakeDaemon()
+    if hasattr(signal, 'SIGTERM'):
+        signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    if metrics_port is not None:
+        try:
+            metrics.enable().serve(metrics_port)
+        except OSError as err:
+            raise WakeOnLanError(f'Unable to serve metrics on port {metrics_port}: {err.strerror}') from err
+    daemon.bind()
+    print(f'Listening on {daemon.path}', flush=True)
+    if metrics_port is not None:
+        print(f'Serving metrics on http://127.0.0.1:{metrics_port}/', flush=True)
+    try:
+        daemon.serve_forever()
+    except KeyboardInterrupt:
+        pass
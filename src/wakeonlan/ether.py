@@ -0,0 +1,53 @@
+# Copyright (c) 2018, Eugene Gershnik
+# Use of this source code is governed by a BSD-style
+# license that can be found in the LICENSE.txt file or at
+# https://opensource.org/licenses/BSD-3-Clause
+
+"""Raw Ethernet transport for wake packets.
+
+On Linux a magic packet can be sent as the payload of an Ethernet frame of
+EtherType 0x0842 instead of a UDP datagram. That skips routing and the IP
+stack entirely, so hosts can be woken on segments where neither end has an
+IP configuration. Frames go out through ``AF_PACKET`` sockets, one per
+interface; the kernel fills in the frame header with the interface's own
+MAC as the source and the target's MAC (or broadcast) as the destination.
+
+Opening such sockets needs ``CAP_NET_RAW``. `available` checks once per
+process whether they can be opened; the wake functions send UDP packets
+instead when they can't.
+"""
+
+import socket
+from typing import Any, Optional, Tuple
+
+ETH_P_WOL = 0x0842
+"""EtherType of Wake-On-Lan frames"""
+
+BROADCAST = b'\xff' * 6
+
+# None until the first check
+_usable: Optional[bool] = None
+
+
+def available() -> bool:
+    """Whether raw Ethernet frames can be sent by this process"""
+    global _usable # pylint: disable=global-statement
+    if _usable is None:
+        _usable = False
+        if hasattr(socket, 'AF_PACKET'):
+            try:
+                open_socket().close()
+                _usable = True
+            except OSError: # typically EPERM for lack of CAP_NET_RAW
+                pass
+    return _usable
+
+
+def open_socket() -> socket.socket:
+    """create a socket for sending frames; protocol 0 means it never receives any"""
+    return socket.socket(socket.AF_PACKET, socket.SOCK_DGRAM, 0) # pylint: disable=no-member
+
+
+def dest(interface: str, mac: bytes) -> Tuple[Any, ...]:
+    """``AF_PACKET`` address of a frame to mac sent out of interface"""
+    return (interface, ETH_P_WOL, 0, 0, mac)
@@ -5,9 +5,12 @@
 
 """Enumerate network interfaces usable for Wake-On-Lan.
 
-The single public function `enum_interfaces` returns a mapping of interface
-name to a list of ``(index, family, address)`` tuples, where `address` is the
-interface's own IPv4 or IPv6 address as text.
+`enum_interfaces` returns a mapping of interface name to a list of
+``(index, family, address)`` tuples, where `address` is the interface's own
+IPv4 or IPv6 address as text. The tuples also carry the length of the
+address's network prefix as `InterfaceAddress.prefixlen`.
+`interface_cache` holds a snapshot of that mapping for long-running
+processes that don't want to enumerate on every wake.
 
 Filtering rules:
 
@@ -21,13 +24,38 @@ Filtering rules:
 
 import sys
 import os
-import ctypes
-import ctypes.util
 import socket
-from typing import Dict, List, Tuple
+import struct
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Optional, Tuple
 
-# (interface index, address family, textual address)
-InterfaceAddress = Tuple[int, int, str]
+from . import metrics
+
+
+class InterfaceAddress(Tuple[int, int, str]):
+    """``(index, family, address)`` of an interface's own IPv4 or IPv6 address.
+
+    Compares, hashes and unpacks as that plain 3-tuple. The length of the
+    address's network prefix is kept alongside as `prefixlen`, None if the
+    OS didn't report it.
+    """
+    prefixlen: Optional[int]
+
+    def __new__(cls, index: int, family: int, address: str, prefixlen: Optional[int] = None):
+        self = super().__new__(cls, (index, family, address)) # type: ignore
+        self.prefixlen = prefixlen
+        return self
+
+    def __getnewargs__(self):
+        return (*self, self.prefixlen)
+
+    def network(self) -> Any:
+        """The address's network as an `ipaddress` network, None if the prefix length isn't known"""
+        if self.prefixlen is None:
+            return None
+        import ipaddress
+        return ipaddress.ip_network(f'{self[2]}/{self.prefixlen}', strict=False)
 
 
 # --------------------------------------------------------------------------- #
@@ -39,6 +67,14 @@ def _is_v6_link_local(addr_bytes: bytes) -> bool:
     return addr_bytes[0] == 0xFE and (addr_bytes[1] & 0xC0) == 0x80
 
 
+def _prefix_length(mask: bytes) -> int:
+    """number of leading one bits of a netmask"""
+    value = int.from_bytes(mask, 'big')
+    bits = len(mask) * 8
+    inverted = ~value & ((1 << bits) - 1)
+    return bits - inverted.bit_length()
+
+
 def _clean_v6_link_local(addr_bytes: bytes) -> bytes:
     """Strip the embedded scope id Linux stuffs into bytes 2-3 of link-local
     addresses returned by getifaddrs. On other platforms those bytes are
@@ -50,10 +86,9 @@ def _clean_v6_link_local(addr_bytes: bytes) -> bytes:
 
 
 # --------------------------------------------------------------------------- #
-# Unix: getifaddrs(3)
+# Interface flags
 # --------------------------------------------------------------------------- #
 
-
 # IFF_* values that can differ across kernels.
 _IFF_UP = 0x1
 _IFF_LOOPBACK = 0x8
@@ -67,243 +102,157 @@ elif sys.platform.startswith('aix'):
 else:                                      # Linux and other glibc-likes
     _IFF_MULTICAST = 0x1000
 
-if sys.platform == 'darwin' \
-    or 'bsd' in sys.platform \
-    or sys.platform.startswith('aix') \
-    or sys.platform.startswith('haiku'):
-    
-    class _sockaddr(ctypes.Structure):
-        _fields_ = [("sa_len", ctypes.c_uint8), ("sa_family", ctypes.c_uint8),
-                    ("sa_data", ctypes.c_uint8 * 14)]
-
-    class _sockaddr_in(ctypes.Structure):
-        _fields_ = [("sin_len", ctypes.c_uint8), ("sin_family", ctypes.c_uint8),
-                    ("sin_port", ctypes.c_uint16), ("sin_addr", ctypes.c_uint8 * 4),
-                    ("sin_zero", ctypes.c_uint8 * 8)]
-
-    class _sockaddr_in6(ctypes.Structure):
-        _fields_ = [("sin6_len", ctypes.c_uint8), ("sin6_family", ctypes.c_uint8),
-                    ("sin6_port", ctypes.c_uint16), ("sin6_flowinfo", ctypes.c_uint32),
-                    ("sin6_addr", ctypes.c_uint8 * 16), ("sin6_scope_id", ctypes.c_uint32)]
-else:
-    
-    class _sockaddr(ctypes.Structure):
-        _fields_ = [("sa_family", ctypes.c_uint16), ("sa_data", ctypes.c_uint8 * 14)]
-
-    class _sockaddr_in(ctypes.Structure):
-        _fields_ = [("sin_family", ctypes.c_uint16), ("sin_port", ctypes.c_uint16),
-                    ("sin_addr", ctypes.c_uint8 * 4), ("sin_zero", ctypes.c_uint8 * 8)]
-
-    class _sockaddr_in6(ctypes.Structure):
-        _fields_ = [("sin6_family", ctypes.c_uint16), ("sin6_port", ctypes.c_uint16),
-                    ("sin6_flowinfo", ctypes.c_uint32), ("sin6_addr", ctypes.c_uint8 * 16),
-                    ("sin6_scope_id", ctypes.c_uint32)]
-
-
-# Solaris/illumos has uint64_t ifa_flags; everywhere else it's unsigned int.
-if sys.platform.startswith('sunos'):
-    _ifa_flags_t = ctypes.c_uint64
-else:
-    _ifa_flags_t = ctypes.c_uint
-
-class _ifaddrs(ctypes.Structure):
-    pass
-
-
-_ifaddrs._fields_ = [
-    ("ifa_next",      ctypes.POINTER(_ifaddrs)),
-    ("ifa_name",      ctypes.c_char_p),
-    ("ifa_flags",     _ifa_flags_t),
-    ("ifa_addr",      ctypes.POINTER(_sockaddr)),
-    ("ifa_netmask",   ctypes.POINTER(_sockaddr)),
-    ("ifa_broadaddr", ctypes.POINTER(_sockaddr)),
-    ("ifa_data",      ctypes.c_void_p),
-]
-
-
-def _enum_unix() -> Dict[str, List[InterfaceAddress]]:
-    if sys.platform.startswith('sunos'):
-        # getifaddrs lives in libsocket on illumos/Solaris, not libc
-        lib_name = ctypes.util.find_library('socket') or 'libsocket.so.1'
-    elif sys.platform.startswith('haiku'):
-        # getifaddrs lives in libnetwork on Haiku
-        lib_name = ctypes.util.find_library('network') or 'libnetwork.so'
-    elif sys.platform.startswith('aix'):
-        # getifaddrs lives in /usr/lib/libifaddrs.a on AIX 7.3 TL2+,
-        # not in libc; shipped by bos.net.tcp.server_core.
-        lib_name = ctypes.util.find_library('ifaddrs') or 'libifaddrs.a'
-    elif sys.platform.startswith('hp-ux'):
-        raise RuntimeError('HP-UX is not supported')
-    else:
-        lib_name = ctypes.util.find_library('c')
-    libc = ctypes.CDLL(lib_name, use_errno=True)
-    libc.getifaddrs.restype = ctypes.c_int
-    libc.getifaddrs.argtypes = [ctypes.POINTER(ctypes.POINTER(_ifaddrs))]
-    libc.freeifaddrs.argtypes = [ctypes.POINTER(_ifaddrs)]
-
-    head = ctypes.POINTER(_ifaddrs)()
-    if libc.getifaddrs(ctypes.byref(head)) != 0:
-        err = ctypes.get_errno()
-        raise OSError(err, os.strerror(err))
-
-    result: Dict[str, List[InterfaceAddress]] = {}
-    try:
-        cur = head
-        while cur:
-            ifa = cur.contents
-            cur = ifa.ifa_next  # advance now so 'continue' is safe
-
-            if not ifa.ifa_name or not ifa.ifa_addr:
-                continue
-
-            flags = ifa.ifa_flags
-            if not flags & _IFF_UP:
-                continue
-            if flags & _IFF_LOOPBACK:
-                continue
-            if not flags & _IFF_MULTICAST:
-                continue
-
-            fam = ifa.ifa_addr.contents.sa_family
-            if fam == socket.AF_INET:
-                sa = ctypes.cast(ifa.ifa_addr, ctypes.POINTER(_sockaddr_in)).contents
-                addr = socket.inet_ntop(fam, bytes(sa.sin_addr))
-            elif fam == socket.AF_INET6:
-                sa = ctypes.cast(ifa.ifa_addr, ctypes.POINTER(_sockaddr_in6)).contents
-                raw = bytes(sa.sin6_addr)
-                if not _is_v6_link_local(raw):
-                    continue
-                addr = socket.inet_ntop(fam, _clean_v6_link_local(raw))
-            else:
-                continue
-
-            name = ifa.ifa_name.decode()
-            try:
-                idx = socket.if_nametoindex(name)
-            except OSError:
-                continue
-
-            result.setdefault(name, []).append((idx, fam, addr))
-    finally:
-        libc.freeifaddrs(head)
-    return result
-
 
 # --------------------------------------------------------------------------- #
-# Windows: GetAdaptersAddresses
+# Linux: rtnetlink
+#
+# Dumps links and addresses straight from the kernel over an AF_NETLINK
+# socket, avoiding the ctypes round trip of getifaddrs. The result mirrors
+# what glibc's getifaddrs reports: address entries carry their link's flags,
+# IPv4 entries are named by their label (so aliases like ``eth0:1`` show up
+# the same way) and the local address wins over the peer address on
+# point-to-point links.
 # --------------------------------------------------------------------------- #
 
-if sys.platform == 'win32':
-    from ctypes import wintypes
-
-    _AF_UNSPEC = 0
-    _ERROR_SUCCESS = 0
-    _MAX_ADAPTER_ADDRESS_LENGTH = 8
-
-    _IF_TYPE_SOFTWARE_LOOPBACK = 24
-    _IF_OPER_STATUS_UP = 1
-    _IP_ADAPTER_FLAG_NO_MULTICAST = 0x10  # bit 4 of the Flags bitfield
-
-    class _SOCKET_ADDRESS(ctypes.Structure):
-        _fields_ = [("lpSockaddr", ctypes.POINTER(_sockaddr)),
-                    ("iSockaddrLength", ctypes.c_int)]
-
-    class _IP_ADAPTER_UNICAST_ADDRESS(ctypes.Structure):
-        pass
-
-    _IP_ADAPTER_UNICAST_ADDRESS._fields_ = [
-        ("Length",             wintypes.ULONG),
-        ("Flags",              wintypes.DWORD),
-        ("Next",               ctypes.POINTER(_IP_ADAPTER_UNICAST_ADDRESS)),
-        ("Address",            _SOCKET_ADDRESS),
-        ("PrefixOrigin",       ctypes.c_int),
-        ("SuffixOrigin",       ctypes.c_int),
-        ("DadState",           ctypes.c_int),
-        ("ValidLifetime",      wintypes.ULONG),
-        ("PreferredLifetime",  wintypes.ULONG),
-        ("LeaseLifetime",      wintypes.ULONG),
-        ("OnLinkPrefixLength", ctypes.c_uint8),
-    ]
-
-    class _IP_ADAPTER_ADDRESSES(ctypes.Structure):
-        pass
-
-    _IP_ADAPTER_ADDRESSES._fields_ = [
-        ("Length",                wintypes.ULONG),
-        ("IfIndex",               wintypes.DWORD),
-        ("Next",                  ctypes.POINTER(_IP_ADAPTER_ADDRESSES)),
-        ("AdapterName",           ctypes.c_char_p),
-        ("FirstUnicastAddress",   ctypes.POINTER(_IP_ADAPTER_UNICAST_ADDRESS)),
-        ("FirstAnycastAddress",   ctypes.c_void_p),
-        ("FirstMulticastAddress", ctypes.c_void_p),
-        ("FirstDnsServerAddress", ctypes.c_void_p),
-        ("DnsSuffix",             ctypes.c_wchar_p),
-        ("Description",           ctypes.c_wchar_p),
-        ("FriendlyName",          ctypes.c_wchar_p),
-        ("PhysicalAddress",       ctypes.c_ubyte * _MAX_ADAPTER_ADDRESS_LENGTH),
-        ("PhysicalAddressLength", wintypes.ULONG),
-        ("Flags",                 wintypes.ULONG),
-        ("Mtu",                   wintypes.ULONG),
-        ("IfType",                wintypes.DWORD),
-        ("OperStatus",            ctypes.c_uint),
-        ("Ipv6IfIndex",           wintypes.DWORD),
-    ]
-
-    def _enum_windows() -> Dict[str, List[InterfaceAddress]]:
-        fn = ctypes.windll.iphlpapi.GetAdaptersAddresses
-        fn.restype = wintypes.ULONG
-        fn.argtypes = [wintypes.ULONG, wintypes.ULONG, ctypes.c_void_p,
-                       ctypes.POINTER(_IP_ADAPTER_ADDRESSES),
-                       ctypes.POINTER(wintypes.ULONG)]
-
-        size = wintypes.ULONG(0)
-        fn(_AF_UNSPEC, 0, None, None, ctypes.byref(size))
-        buf = ctypes.create_string_buffer(size.value)
-        head = ctypes.cast(buf, ctypes.POINTER(_IP_ADAPTER_ADDRESSES))
-        ret = fn(_AF_UNSPEC, 0, None, head, ctypes.byref(size))
-        if ret != _ERROR_SUCCESS:
-            raise ctypes.WinError(ret)
+_NETLINK_ROUTE = 0
+_NLMSG_ERROR = 2
+_NLMSG_DONE = 3
+_NLM_F_REQUEST = 0x1
+_NLM_F_DUMP = 0x300
+_RTM_NEWLINK = 16
+_RTM_GETLINK = 18
+_RTM_NEWADDR = 20
+_RTM_GETADDR = 22
+_IFLA_IFNAME = 3
+_IFA_ADDRESS = 1
+_IFA_LOCAL = 2
+_IFA_LABEL = 3
+_NLA_TYPE_MASK = 0x3FFF
+
+_nlmsghdr = struct.Struct('=IHHII')     # len, type, flags, seq, pid
+_nlmsgerr = struct.Struct('=i')         # error, followed by the offending header
+_ifinfomsg = struct.Struct('=BxHiII')   # family, type, index, flags, change
+_ifaddrmsg = struct.Struct('=BBBBI')    # family, prefixlen, flags, scope, index
+_rtattr = struct.Struct('=HH')          # len, type
+
+# netlink can be unavailable (e.g. sandboxed); set to False after first failure
+_netlink_usable = sys.platform.startswith('linux') and hasattr(socket, 'AF_NETLINK')
+
+
+def _nl_align(length: int) -> int:
+    return (length + 3) & ~3
+
+
+def _nl_dump(sock: socket.socket, msg_type: int, body: bytes, seq: int) -> Iterator[Tuple[int, memoryview]]:
+    """Send a dump request and yield ``(type, payload)`` of every reply message"""
+    request = _nlmsghdr.pack(_nlmsghdr.size + len(body), msg_type,
+                             _NLM_F_REQUEST | _NLM_F_DUMP, seq, 0) + body
+    sock.sendto(request, (0, 0))
+    while True:
+        data = memoryview(sock.recv(65536))
+        offset = 0
+        while offset + _nlmsghdr.size <= len(data):
+            length, reply_type, _, reply_seq, _ = _nlmsghdr.unpack_from(data, offset)
+            if length < _nlmsghdr.size or offset + length > len(data):
+                raise OSError(f'malformed netlink reply to message type {msg_type}')
+            payload = data[offset + _nlmsghdr.size:offset + length]
+            offset += _nl_align(length)
+            if reply_seq != seq:
+                continue
+            if reply_type == _NLMSG_DONE:
+                return
+            if reply_type == _NLMSG_ERROR:
+                err = -_nlmsgerr.unpack_from(payload)[0]
+                if err == 0:
+                    continue
+                raise OSError(err, os.strerror(err))
+            yield reply_type, payload
+
+
+def _nl_attrs(payload: memoryview, offset: int) -> Iterator[Tuple[int, memoryview]]:
+    """Yield ``(type, value)`` of rtattrs starting at offset"""
+    while offset + _rtattr.size <= len(payload):
+        length, attr_type = _rtattr.unpack_from(payload, offset)
+        if length < _rtattr.size:
+            break
+        yield attr_type & _NLA_TYPE_MASK, payload[offset + _rtattr.size:offset + length]
+        offset += _nl_align(length)
+
+
+def _nl_string(value: memoryview) -> str:
+    return bytes(value).split(b'\x00', 1)[0].decode()
+
+
+def _parse_netlink_link(payload: memoryview) -> Optional[Tuple[int, str]]:
+    """Return ``(index, name)`` of a usable link from an RTM_NEWLINK message or None"""
+    _, _, idx, flags, _ = _ifinfomsg.unpack_from(payload)
+    if not flags & _IFF_UP:
+        return None
+    if flags & _IFF_LOOPBACK:
+        return None
+    if not flags & _IFF_MULTICAST:
+        return None
+    # The kernel puts IFLA_IFNAME first; stop there rather than walk the
+    # dozens of statistics attributes that follow it.
+    for attr_type, value in _nl_attrs(payload, _ifinfomsg.size):
+        if attr_type == _IFLA_IFNAME:
+            return idx, _nl_string(value)
+    return None
 
-        result: Dict[str, List[InterfaceAddress]] = {}
-        cur = head
-        while cur:
-            adapter = cur.contents
-            cur = adapter.Next
 
-            if adapter.OperStatus != _IF_OPER_STATUS_UP:
-                continue
-            if adapter.IfType == _IF_TYPE_SOFTWARE_LOOPBACK:
-                continue
-            if adapter.Flags & _IP_ADAPTER_FLAG_NO_MULTICAST:
+def _parse_netlink_addr(payload: memoryview, links: Dict[int, str]) -> Optional[Tuple[str, InterfaceAddress]]:
+    """Return ``(name, address)`` of a usable address from an RTM_NEWADDR message or None.
+    
+    `links` maps indices of usable links to their names.
+    """
+    fam, prefixlen, _, _, idx = _ifaddrmsg.unpack_from(payload)
+    if fam not in (socket.AF_INET, socket.AF_INET6):
+        return None
+    name = links.get(idx)
+    if name is None:
+        return None
+
+    local = address = None
+    for attr_type, value in _nl_attrs(payload, _ifaddrmsg.size):
+        if attr_type == _IFA_LOCAL:
+            local = bytes(value)
+        elif attr_type == _IFA_ADDRESS:
+            address = bytes(value)
+        elif attr_type == _IFA_LABEL and fam == socket.AF_INET:
+            name = _nl_string(value)
+    raw = local if local is not None else address
+    if raw is None:
+        return None
+    if fam == socket.AF_INET6:
+        if not _is_v6_link_local(raw):
+            return None
+        raw = _clean_v6_link_local(raw)
+    return name, InterfaceAddress(idx, fam, socket.inet_ntop(fam, raw), prefixlen)
+
+
+def _enum_netlink() -> Dict[str, List[InterfaceAddress]]:
+    with socket.socket(socket.AF_NETLINK, socket.SOCK_RAW, _NETLINK_ROUTE) as sock:  # pylint: disable=no-member
+        sock.bind((0, 0))
+
+        links: Dict[int, str] = {}
+        request = _ifinfomsg.pack(socket.AF_UNSPEC, 0, 0, 0, 0)
+        for msg_type, payload in _nl_dump(sock, _RTM_GETLINK, request, 1):
+            if msg_type != _RTM_NEWLINK:
                 continue
+            link = _parse_netlink_link(payload)
+            if link is not None:
+                links[link[0]] = link[1]
 
-            name = adapter.FriendlyName
-            if not name:
+        result: Dict[str, List[InterfaceAddress]] = {}
+        request = _ifaddrmsg.pack(socket.AF_UNSPEC, 0, 0, 0, 0)
+        for msg_type, payload in _nl_dump(sock, _RTM_GETADDR, request, 2):
+            if msg_type != _RTM_NEWADDR:
                 continue
-
-            ua = adapter.FirstUnicastAddress
-            while ua:
-                sa_ptr = ua.contents.Address.lpSockaddr
-                ua = ua.contents.Next
-                if not sa_ptr:
-                    continue
-                fam = sa_ptr.contents.sa_family
-                if fam == socket.AF_INET:
-                    sa = ctypes.cast(sa_ptr, ctypes.POINTER(_sockaddr_in)).contents
-                    addr = socket.inet_ntop(fam, bytes(sa.sin_addr))
-                    idx = adapter.IfIndex
-                elif fam == socket.AF_INET6:
-                    sa = ctypes.cast(sa_ptr, ctypes.POINTER(_sockaddr_in6)).contents
-                    raw = bytes(sa.sin6_addr)
-                    if not _is_v6_link_local(raw):
-                        continue
-                    addr = socket.inet_ntop(fam, _clean_v6_link_local(raw))
-                    idx = adapter.Ipv6IfIndex
-                else:
-                    continue
-
-                result.setdefault(name, []).append((idx, fam, addr))
-        return result
+            entry = _parse_netlink_addr(payload, links)
+            if entry is not None:
+                name, address = entry
+                result.setdefault(name, []).append(address)
+    return result
 
 
 # --------------------------------------------------------------------------- #
@@ -317,10 +266,83 @@ def enum_interfaces() -> Dict[str, List[InterfaceAddress]]:
     interfaces that aren't currently up. For IPv6, only link-local addresses
     (``fe80::/10``) are returned. The list for each interface preserves the
     order in which the OS reports addresses.
+
+    On Linux the addresses are read over rtnetlink, falling back to
+    getifaddrs(3) if netlink isn't available.
     """
+    collector = metrics.collector
+    if collector is None:
+        return _enum_interfaces()
+    start = time.perf_counter()
+    try:
+        return _enum_interfaces()
+    finally:
+        collector.enumeration_seconds.observe(time.perf_counter() - start)
+
+def _enum_interfaces() -> Dict[str, List[InterfaceAddress]]:
+    global _netlink_usable # pylint: disable=global-statement
+    if _netlink_usable:
+        try:
+            return _enum_netlink()
+        except OSError:
+            _netlink_usable = False
+    from . import ifaddrs
     if sys.platform == 'win32':
-        return _enum_windows()
-    return _enum_unix()
+        return ifaddrs._enum_windows()
+    return ifaddrs._enum_unix()
+
+class InterfaceCache:
+    """Snapshot of `enum_interfaces` output refreshed at most every `ttl` seconds.
+
+    Each refresh increments `generation`, which lets holders of derived state
+    (open sockets, selected addresses) notice that the snapshot changed.
+    Call `invalidate` when you know the interfaces changed, e.g. on a network
+    change notification. A `ttl` of 0 disables caching.
+
+    The returned mapping is shared between callers and must not be modified.
+    """
+    def __init__(self, ttl: float = 10.0):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._interfaces: Optional[Dict[str, List[InterfaceAddress]]] = None
+        self._taken = 0.0
+        self._generation = 0
+
+    @property
+    def generation(self) -> int:
+        """Number of times the snapshot has been (re)loaded"""
+        return self._generation
+
+    def peek(self) -> Optional[Dict[str, List[InterfaceAddress]]]:
+        """Return the snapshot if it is still fresh, without enumerating"""
+        interfaces = self._interfaces
+        if interfaces is None or time.monotonic() - self._taken >= self.ttl:
+            return None
+        return interfaces
+
+    def get(self) -> Dict[str, List[InterfaceAddress]]:
+        """Return the snapshot, enumerating interfaces if it is stale"""
+        interfaces = self.peek()
+        if interfaces is not None:
+            return interfaces
+        with self._lock:
+            interfaces = self.peek()
+            if interfaces is None:
+                interfaces = enum_interfaces()
+                self._interfaces = interfaces
+                self._taken = time.monotonic()
+                self._generation += 1
+            return interfaces
+
+    def invalidate(self) -> None:
+        """Discard the snapshot so the next `get` enumerates again"""
+        with self._lock:
+            self._interfaces = None
+
+
+interface_cache = InterfaceCache()
+"""Process-wide snapshot used by the wake functions"""
+
 
 def default_interface_address():
     """Return family and address of the default network interface. Prefers IPv4"""
@@ -0,0 +1,626 @@
+# Copyright (c) 2018, Eugene Gershnik
+# Use of this source code is governed by a BSD-style
+# license that can be found in the LICENSE.txt file or at
+# https://opensource.org/licenses/BSD-3-Clause
+
+"""Storage backends for saved names.
+
+Two backends implement the same small interface (`get`, `get_all`,
+`iter_all`, `save`, `save_all`, `delete`, `apply`, `get_groups`,
+`save_group`, `delete_group`, `signature`):
+
+* `JsonBackend` - the ``.wakeonlan`` JSON file. The default, and the
+  format other versions of wakeonlan understand;
+* `SqliteBackend` - a ``.wakeonlan.db`` SQLite database keyed by name, for
+  inventories large enough that rewriting a JSON file on every edit, or
+  parsing it for every lookup, hurts.
+
+`get_backend` picks one: the ``WAKEONLAN_STORE`` environment variable
+(``json`` or ``sqlite``) if set, otherwise SQLite if the database exists and
+JSON if it doesn't. `migrate` moves the saved names between the two.
+
+`ConfigStore` keeps the saved names in memory on top of whichever backend is
+active, for processes that look names up repeatedly. `config_transaction`
+batches any number of edits into a single write.
+"""
+
+import contextlib
+import os
+import sys
+import threading
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Mapping, Optional, Tuple, Union
+
+from .util import WakeOnLanError
+from .wakeonlan import HostRecord, _config_path, \
+    _load_config, _save_config, _get_names_dict, _get_groups_dict, _parse_name_record, _make_name_record
+
+STORE_ENV = 'WAKEONLAN_STORE'
+STORES = ('json', 'sqlite')
+
+_DB_NAME = '.wakeonlan.db'
+
+# (inode, mtime, size) of a backing file
+Signature = Tuple[int, int, int]
+
+
+def _db_path() -> str:
+    """the SQLite database, kept next to the configuration file"""
+    return os.path.join(os.path.dirname(os.path.abspath(_config_path())), _DB_NAME)
+
+
+def _file_signature(path: str) -> Optional[Signature]:
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+
+class JsonBackend:
+    """Saved names in the JSON configuration file"""
+    @property
+    def path(self) -> str:
+        """The configuration file, `CONFIG_PATH`"""
+        return _config_path()
+
+    def get(self, name: str) -> Optional[HostRecord]:
+        """Get stored record"""
+        names = _get_names_dict(_load_config())
+        name_record = names.get(name)
+        if name_record is None:
+            return None
+        return _parse_name_record(name, name_record)
+
+    def get_all(self) -> Dict[str, HostRecord]:
+        """Retrieve all stored records"""
+        names = _get_names_dict(_load_config())
+        return {name: _parse_name_record(name, name_record) for name, name_record in names.items()}
+
+    def iter_all(self) -> Iterator[Tuple[str, HostRecord]]:
+        """Iterate over all stored records"""
+        return iter(self.get_all().items())
+
+    def save(self, name: str, host_record: HostRecord) -> None:
+        """Save record"""
+        self.apply({name: host_record})
+
+    def delete(self, name: str) -> None:
+        """Delete saved record"""
+        self.apply({name: None})
+
+    def apply(self, changes: Mapping[str, Optional[HostRecord]]) -> None:
+        """Save (or, for None, delete) many records with a single rewrite of the file.
+
+        Deleted names are also dropped from every group, and groups left
+        with no members are removed.
+        """
+        config = _load_config()
+        names = _get_names_dict(config)
+        for name, host_record in changes.items():
+            if host_record is None:
+                names.pop(name, None)
+            else:
+                names[name] = _make_name_record(host_record)
+        deleted = {name for name, host_record in changes.items() if host_record is None}
+        if deleted and 'groups' in config:
+            groups = {group: [name for name in members if name not in deleted]
+                      for group, members in _get_groups_dict(config).items()}
+            config['groups'] = {group: members for group, members in groups.items() if members}
+        _save_config(config)
+
+    def save_all(self, records: Iterable[Tuple[str, HostRecord]]) -> int:
+        """Save records from an iterable with a single rewrite of the file.
+
+        Nothing is written if the iterable raises. Returns the number of
+        records consumed.
+        """
+        config = _load_config()
+        names = _get_names_dict(config)
+        count = 0
+        for name, host_record in records:
+            names[name] = _make_name_record(host_record)
+            count += 1
+        _save_config(config)
+        return count
+
+    def get_groups(self) -> Dict[str, List[str]]:
+        """Retrieve all stored groups"""
+        return _get_groups_dict(_load_config())
+
+    def save_group(self, group: str, names: List[str]) -> None:
+        """Save group"""
+        config = _load_config()
+        groups = _get_groups_dict(config)
+        groups[group] = names
+        config['groups'] = groups
+        _save_config(config)
+
+    def delete_group(self, group: str) -> None:
+        """Delete saved group"""
+        config = _load_config()
+        groups = _get_groups_dict(config)
+        if group in groups:
+            del groups[group]
+            _save_config(config)
+
+    def signature(self) -> Optional[Signature]:
+        """Changes whenever the stored data may have changed"""
+        return _file_signature(self.path)
+
+
+class SqliteBackend:
+    """Saved names in an SQLite database with the name as primary key
+
+    The connection is kept open between calls and reopened if the database
+    file is replaced or removed. Without a path, the database is the one
+    next to the configuration file, wherever that is at the time.
+    """
+    _SCHEMA = (
+        '''CREATE TABLE IF NOT EXISTS names (
+            name TEXT PRIMARY KEY NOT NULL,
+            mac TEXT NOT NULL,
+            interface TEXT,
+            ip TEXT,
+            port INTEGER,
+            transport TEXT,
+            host_ip TEXT
+        ) WITHOUT ROWID''',
+        '''CREATE TABLE IF NOT EXISTS groups (
+            grp TEXT NOT NULL,
+            position INTEGER NOT NULL,
+            name TEXT NOT NULL,
+            PRIMARY KEY (grp, position)
+        ) WITHOUT ROWID''',
+    )
+
+    # columns added after the first release, with their types, added to older databases on open
+    _ADDED_COLUMNS = (('transport', 'TEXT'), ('host_ip', 'TEXT'))
+    _COLUMNS = 'name, mac, interface, ip, port, transport, host_ip'
+    _INSERT = 'INSERT OR REPLACE INTO names VALUES (?, ?, ?, ?, ?, ?, ?)'
+
+    def __init__(self, path: Optional[str] = None):
+        self._path = path
+        self._lock = threading.Lock()
+        self._conn: Any = None
+        self._conn_path: Optional[str] = None
+        self._inode: Optional[int] = None
+
+    @property
+    def path(self) -> str:
+        """The database file"""
+        return _db_path() if self._path is None else self._path
+
+    def _connection(self) -> Any:
+        import sqlite3
+        path = self.path
+        signature = _file_signature(path)
+        inode = None if signature is None else signature[0]
+        if self._conn is not None and (inode != self._inode or path != self._conn_path):
+            self._conn.close()
+            self._conn = None
+        if self._conn is None:
+            self._conn = sqlite3.connect(path, check_same_thread=False)
+            self._conn_path = path
+            with self._conn:
+                for statement in self._SCHEMA:
+                    self._conn.execute(statement)
+                existing = {row[1] for row in self._conn.execute('PRAGMA table_info(names)')}
+                for column, column_type in self._ADDED_COLUMNS:
+                    if column not in existing:
+                        self._conn.execute(f'ALTER TABLE names ADD COLUMN {column} {column_type}')
+            self._inode = os.stat(path).st_ino
+        return self._conn
+
+    def _transaction(self, body: Callable[[Any], Any]) -> Any:
+        """run body(connection) in a single transaction"""
+        import sqlite3
+        with self._lock:
+            try:
+                conn = self._connection()
+                with conn:
+                    return body(conn)
+            except sqlite3.Error as ex:
+                raise WakeOnLanError(f'{self.path}: {ex}') from ex
+
+    def _execute(self, sql: str, params: Any = ()) -> Any:
+        return self._transaction(lambda conn: conn.execute(sql, params).fetchall())
+
+    def _parse_row(self, row: Tuple[Any, ...]) -> Tuple[str, HostRecord]:
+        name, mac, interface, ip, port, transport, host_ip = row
+        name_record: Dict[str, Any] = {'mac': mac}
+        if interface is not None:
+            name_record['interface'] = interface
+        if ip is not None:
+            name_record['ip'] = ip
+        if port is not None:
+            name_record['port'] = port
+        if transport is not None:
+            name_record['transport'] = transport
+        if host_ip is not None:
+            name_record['host_ip'] = host_ip
+        return name, _parse_name_record(name, name_record, self.path)
+
+    @staticmethod
+    def _make_row(name: str, host_record: HostRecord) -> Tuple[Any, ...]:
+        name_record = _make_name_record(host_record)
+        return (name, name_record['mac'], name_record.get('interface'),
+                name_record.get('ip'), name_record.get('port'), name_record.get('transport'),
+                name_record.get('host_ip'))
+
+    def get(self, name: str) -> Optional[HostRecord]:
+        """Get stored record"""
+        rows = self._execute(f'SELECT {self._COLUMNS} FROM names WHERE name = ?', (name,))
+        if not rows:
+            return None
+        return self._parse_row(rows[0])[1]
+
+    def get_all(self) -> Dict[str, HostRecord]:
+        """Retrieve all stored records"""
+        rows = self._execute(f'SELECT {self._COLUMNS} FROM names')
+        return dict(self._parse_row(row) for row in rows)
+
+    def iter_all(self, page_size: int = 1000) -> Iterator[Tuple[str, HostRecord]]:
+        """Iterate over all stored records in name order, a page at a time"""
+        rows = self._execute(f'SELECT {self._COLUMNS} FROM names ORDER BY name LIMIT ?', (page_size,))
+        while rows:
+            for row in rows:
+                yield self._parse_row(row)
+            if len(rows) < page_size:
+                break
+            rows = self._execute(f'SELECT {self._COLUMNS} FROM names WHERE name > ? ORDER BY name LIMIT ?',
+                                 (rows[-1][0], page_size))
+
+    def save(self, name: str, host_record: HostRecord) -> None:
+        """Save record"""
+        self._execute(self._INSERT, self._make_row(name, host_record))
+
+    def delete(self, name: str) -> None:
+        """Delete saved record"""
+        self.apply({name: None})
+
+    def apply(self, changes: Mapping[str, Optional[HostRecord]]) -> None:
+        """Save (or, for None, delete) many records in a single transaction.
+
+        Deleted names are also dropped from every group.
+        """
+        deletes = [(name,) for name, host_record in changes.items() if host_record is None]
+        saves = [self._make_row(name, host_record)
+                 for name, host_record in changes.items() if host_record is not None]
+        def body(conn):
+            conn.executemany('DELETE FROM names WHERE name = ?', deletes)
+            conn.executemany('DELETE FROM groups WHERE name = ?', deletes)
+            conn.executemany(self._INSERT, saves)
+        self._transaction(body)
+
+    def save_all(self, records: Iterable[Tuple[str, HostRecord]]) -> int:
+        """Save records from an iterable in a single transaction.
+
+        The iterable is consumed as the rows are inserted, so it needn't fit
+        in memory. Nothing is written if it raises. Returns the number of
+        records consumed.
+        """
+        count = 0
+        def rows():
+            nonlocal count
+            for name, host_record in records:
+                count += 1
+                yield self._make_row(name, host_record)
+        self._transaction(lambda conn: conn.executemany(self._INSERT, rows()))
+        return count
+
+    def get_groups(self) -> Dict[str, List[str]]:
+        """Retrieve all stored groups"""
+        groups: Dict[str, List[str]] = {}
+        for group, name in self._execute('SELECT grp, name FROM groups ORDER BY grp, position'):
+            groups.setdefault(group, []).append(name)
+        return groups
+
+    def save_group(self, group: str, names: List[str]) -> None:
+        """Save group"""
+        def body(conn):
+            conn.execute('DELETE FROM groups WHERE grp = ?', (group,))
+            conn.executemany('INSERT INTO groups VALUES (?, ?, ?)',
+                             [(group, position, name) for position, name in enumerate(names)])
+        self._transaction(body)
+
+    def delete_group(self, group: str) -> None:
+        """Delete saved group"""
+        self._execute('DELETE FROM groups WHERE grp = ?', (group,))
+
+    def signature(self) -> Optional[Signature]:
+        """Changes whenever the stored data may have changed"""
+        return _file_signature(self.path)
+
+    def close(self) -> None:
+        """Close the connection; it is reopened on next use"""
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+Backend = Union[JsonBackend, SqliteBackend]
+
+_json_backend = JsonBackend()
+_sqlite_backend = SqliteBackend()
+
+
+def selected_store() -> str:
+    """Name of the store `get_backend` would use"""
+    store = os.environ.get(STORE_ENV)
+    if store is None:
+        return 'sqlite' if os.path.exists(_db_path()) else 'json'
+    if store not in STORES:
+        raise WakeOnLanError(f'{STORE_ENV} must be one of {", ".join(STORES)}, not `{store}`')
+    return store
+
+
+def get_backend() -> Backend:
+    """The backend saved names are currently read from and written to"""
+    return _sqlite_backend if selected_store() == 'sqlite' else _json_backend
+
+
+class ConfigTransaction:
+    """Edits to saved names held in memory until `commit`
+
+    Reads through the transaction see its own uncommitted edits.
+    """
+    def __init__(self, backend: Backend):
+        self._backend = backend
+        self._changes: Dict[str, Optional[HostRecord]] = {}
+
+    def get(self, name: str) -> Optional[HostRecord]:
+        """Get stored record, as modified by this transaction"""
+        if name in self._changes:
+            return self._changes[name]
+        return self._backend.get(name)
+
+    def get_all(self) -> Dict[str, HostRecord]:
+        """Retrieve all stored records, as modified by this transaction"""
+        records = self._backend.get_all()
+        for name, host_record in self._changes.items():
+            if host_record is None:
+                records.pop(name, None)
+            else:
+                records[name] = host_record
+        return records
+
+    def save(self, name: str, host_record: HostRecord) -> None:
+        """Save record when the transaction commits"""
+        self._changes[name] = host_record
+
+    def delete(self, name: str) -> None:
+        """Delete saved record when the transaction commits"""
+        self._changes[name] = None
+
+    def __len__(self) -> int:
+        return len(self._changes)
+
+    def commit(self) -> None:
+        """Write all pending edits at once"""
+        if self._changes:
+            self._backend.apply(self._changes)
+            self._changes = {}
+
+    def rollback(self) -> None:
+        """Drop all pending edits"""
+        self._changes = {}
+
+
+@contextlib.contextmanager
+def config_transaction() -> Iterator[ConfigTransaction]:
+    """Batch edits to saved names into a single write.
+
+    All saves and deletes made through the yielded `ConfigTransaction` are
+    committed together when the block exits normally: one atomic replace of
+    the JSON file, or one SQLite transaction. If the block raises, nothing is
+    written.
+    """
+    txn = ConfigTransaction(get_backend())
+    yield txn
+    txn.commit()
+
+
+def migrate(to: str) -> int:
+    """Move all saved names into the `to` store and return how many were moved.
+
+    Migrating to SQLite leaves the JSON file in place, but it is no longer
+    read as long as the database exists. Migrating to JSON replaces the
+    names in the JSON file and removes the database.
+    """
+    db_path = _db_path()
+    if to == 'sqlite':
+        records = _json_backend.get_all()
+        groups = _json_backend.get_groups()
+        tmp_path = db_path + '.tmp'
+        tmp = SqliteBackend(tmp_path)
+        try:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            tmp.save_all(records.items())
+            for group, names in groups.items():
+                tmp.save_group(group, names)
+            tmp.close()
+            _sqlite_backend.close()
+            os.replace(tmp_path, db_path)
+        except OSError as err:
+            raise WakeOnLanError(f'Unable to migrate: {err.strerror}') from err
+        finally:
+            tmp.close()
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+        return len(records)
+    if to == 'json':
+        if not os.path.exists(db_path):
+            raise WakeOnLanError(f'{db_path} does not exist')
+        records = _sqlite_backend.get_all()
+        groups = _sqlite_backend.get_groups()
+        config = _load_config()
+        config['names'] = {name: _make_name_record(rec) for name, rec in records.items()}
+        if groups or 'groups' in config:
+            config['groups'] = groups
+        _save_config(config)
+        _sqlite_backend.close()
+        try:
+            os.unlink(db_path)
+        except OSError as err:
+            raise WakeOnLanError(f'Unable to remove {db_path}: {err.strerror}') from err
+        return len(records)
+    raise WakeOnLanError(f'Unknown store `{to}`, must be one of {", ".join(STORES)}')
+
+
+# --------------------------------------------------------------------------- #
+# In-process cache
+# --------------------------------------------------------------------------- #
+
+_IN_MODIFY      = 0x00000002
+_IN_ATTRIB      = 0x00000004
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_FROM  = 0x00000040
+_IN_MOVED_TO    = 0x00000080
+_IN_CREATE      = 0x00000100
+_IN_DELETE      = 0x00000200
+_IN_DELETE_SELF = 0x00000400
+_IN_MOVE_SELF   = 0x00000800
+_IN_Q_OVERFLOW  = 0x00004000
+_IN_IGNORED     = 0x00008000
+
+class _DirectoryWatch:
+    """inotify watch on a directory reporting changes to some of its entries"""
+    _MASK = (_IN_MODIFY | _IN_ATTRIB | _IN_CLOSE_WRITE | _IN_MOVED_FROM | _IN_MOVED_TO |
+             _IN_CREATE | _IN_DELETE | _IN_DELETE_SELF | _IN_MOVE_SELF)
+
+    def __init__(self, directory: str, names: Tuple[str, ...]):
+        import ctypes
+        libc = ctypes.CDLL(None, use_errno=True)
+        fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if fd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err))
+        if libc.inotify_add_watch(fd, os.fsencode(directory), self._MASK) < 0:
+            err = ctypes.get_errno()
+            os.close(fd)
+            raise OSError(err, os.strerror(err))
+        self._fd: Optional[int] = fd
+        self._names = {os.fsencode(name) for name in names}
+
+    @property
+    def alive(self) -> bool:
+        """Whether the watch still reports changes"""
+        return self._fd is not None
+
+    def changed(self) -> bool:
+        """Drain pending events and return whether any of them may affect the entries"""
+        import struct
+        changed = False
+        while self._fd is not None:
+            try:
+                data = os.read(self._fd, 65536)
+            except BlockingIOError:
+                break
+            offset = 0
+            while offset < len(data):
+                _, mask, _, length = struct.unpack_from('iIII', data, offset)
+                name = data[offset + 16:offset + 16 + length].rstrip(b'\0')
+                offset += 16 + length
+                if mask & (_IN_DELETE_SELF | _IN_MOVE_SELF | _IN_IGNORED):
+                    # the directory itself is gone: nothing more will be reported
+                    self.close()
+                    return True
+                if mask & _IN_Q_OVERFLOW or name in self._names:
+                    changed = True
+        return changed
+
+    def close(self) -> None:
+        """Remove the watch"""
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+
+class ConfigStore:
+    """Saved names kept in memory and reloaded only when their store changes.
+
+    Each read first checks whether the backing file may have changed: on
+    Linux via an inotify watch on the configuration directory, so a warm read
+    does no file I/O at all, and elsewhere (or with `watch=False`) by
+    comparing the file's stat signature. Writes made through the store go to
+    the active backend and update the cached records in place.
+
+    The store is safe to use from multiple threads. Call `close` when done
+    with it to release the inotify watch.
+    """
+    def __init__(self, watch: bool = True):
+        self._lock = threading.Lock()
+        self._records: Optional[Dict[str, HostRecord]] = None
+        self._signature: Any = None
+        self._watch: Optional[_DirectoryWatch] = None
+        # the database lives next to the configuration file, so one watch covers both
+        self._watched = _config_path()
+        if watch and sys.platform.startswith('linux'):
+            try:
+                self._watch = _DirectoryWatch(os.path.dirname(os.path.abspath(self._watched)),
+                                              (os.path.basename(self._watched), _DB_NAME))
+            except (OSError, AttributeError):
+                # no inotify here (or no config directory yet): fall back to stat checks
+                pass
+
+    def __enter__(self) -> 'ConfigStore':
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def _store_signature(self) -> Tuple[Optional[str], str, Optional[Signature]]:
+        backend = get_backend()
+        return (os.environ.get(STORE_ENV), backend.path, backend.signature())
+
+    def _current(self) -> Dict[str, HostRecord]:
+        """cached records, reloaded if needed; must be called with the lock held"""
+        if self._records is not None and self._watch is not None and self._watch.alive \
+                and self._signature[0] == os.environ.get(STORE_ENV) and self._watched == _config_path() \
+                and not self._watch.changed():
+            return self._records
+        signature = self._store_signature()
+        if self._records is None or signature != self._signature:
+            self._records = get_backend().get_all()
+            self._signature = signature
+        return self._records
+
+    def get(self, name: str) -> Optional[HostRecord]:
+        """Get stored record"""
+        with self._lock:
+            return self._current().get(name)
+
+    def get_all(self) -> Dict[str, HostRecord]:
+        """Retrieve all stored records"""
+        with self._lock:
+            return dict(self._current())
+
+    def save(self, name: str, host_record: HostRecord) -> None:
+        """Save record"""
+        with self._lock:
+            records = self._current()
+            get_backend().save(name, host_record)
+            records[name] = host_record
+            self._signature = self._store_signature()
+
+    def delete(self, name: str) -> None:
+        """Delete saved record"""
+        with self._lock:
+            records = self._current()
+            get_backend().delete(name)
+            records.pop(name, None)
+            self._signature = self._store_signature()
+
+    def invalidate(self) -> None:
+        """Force the next read to reload from the backing store"""
+        with self._lock:
+            self._records = None
+
+    def close(self) -> None:
+        """Release the inotify watch, if any; the store keeps working with stat checks"""
+        with self._lock:
+            if self._watch is not None:
+                self._watch.close()
+                self._watch = None
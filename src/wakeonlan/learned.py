@@ -0,0 +1,162 @@
+# Copyright (c) 2018, Eugene Gershnik
+# Use of this source code is governed by a BSD-style
+# license that can be found in the LICENSE.txt file or at
+# https://opensource.org/licenses/BSD-3-Clause
+
+"""Facts learned about hosts, persisted next to the saved configuration.
+
+`LearnedCache` maps a key (a MAC, an IP address) to a value learned for it,
+along with when it was learned. It is kept as JSON in `$HOME`, entries older
+than `max_age` are ignored and dropped, and only the `max_entries` most
+recently learned are kept. Subclasses say what the keys and values are.
+"""
+
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from .util import WakeOnLanError
+
+# key -> (value, time learned)
+_Entries = Dict[str, Tuple[str, float]]
+
+
+class LearnedCache:
+    """Values learned per key, loaded on first use.
+
+    `learn` and `forget` change the cache in memory; `save` writes it,
+    merging in anything another process learned meanwhile. Safe to use from
+    multiple threads.
+    """
+    FILE_NAME = ''
+    """Name of the file in the configuration directory"""
+    VALUE = 'value'
+    """Name of the value in each JSON entry"""
+    DEFAULT_MAX_AGE = 30 * 24 * 3600.0
+    DEFAULT_MAX_ENTRIES = 4096
+    REFRESH_AFTER = 24 * 3600.0
+    """Seconds before learning an unchanged value again updates its time learned"""
+
+    def __init__(self, path: Optional[str] = None, max_age: Optional[float] = None,
+                 max_entries: Optional[int] = None, clock=time.time):
+        if path is None:
+            from .wakeonlan import _config_home
+            path = os.path.join(_config_home(), self.FILE_NAME)
+        self.path = path
+        self.max_age = self.DEFAULT_MAX_AGE if max_age is None else max_age
+        self.max_entries = self.DEFAULT_MAX_ENTRIES if max_entries is None else max_entries
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._entries: Optional[_Entries] = None
+        self._forgotten: Dict[str, float] = {}
+        self._dirty = False
+
+    def _key(self, key: str) -> str:
+        """canonical form of a key"""
+        return key
+
+    def _read(self) -> _Entries:
+        import json
+        try:
+            with open(self.path, 'rt', encoding='utf-8') as f:
+                document = json.load(f)
+        except OSError:
+            return {}
+        except ValueError as ex:
+            raise WakeOnLanError(f'{self.path} is malformed') from ex
+        hosts = document.get('hosts') if isinstance(document, dict) else None
+        if not isinstance(hosts, dict):
+            raise WakeOnLanError(f'{self.path} is malformed')
+        entries: _Entries = {}
+        for key, entry in hosts.items():
+            if isinstance(entry, dict) and isinstance(entry.get(self.VALUE), str) and \
+                    isinstance(entry.get('learned'), (int, float)):
+                entries[key] = (entry[self.VALUE], float(entry['learned']))
+        return entries
+
+    def _loaded(self) -> _Entries:
+        if self._entries is None:
+            self._entries = self._read()
+        return self._entries
+
+    def get(self, key: str) -> Optional[str]:
+        """Value learned for key, None if unknown or expired"""
+        key = self._key(key)
+        with self._lock:
+            entry = self._loaded().get(key)
+        if entry is None or self._clock() - entry[1] >= self.max_age:
+            return None
+        return entry[0]
+
+    def learn(self, key: str, value: str) -> None:
+        """Remember value for key as of now
+
+        Relearning the value already known leaves the cache unchanged, so that
+        `save` doesn't rewrite it, unless it was learned `REFRESH_AFTER` ago.
+        """
+        key = self._key(key)
+        now = self._clock()
+        with self._lock:
+            entries = self._loaded()
+            current = entries.get(key)
+            if current is not None and current[0] == value and now - current[1] < self.REFRESH_AFTER:
+                return
+            entries[key] = (value, now)
+            self._forgotten.pop(key, None)
+            self._dirty = True
+
+    def forget(self, key: str) -> None:
+        """Drop what was learned about key"""
+        key = self._key(key)
+        with self._lock:
+            if self._loaded().pop(key, None) is not None:
+                self._forgotten[key] = self._clock()
+                self._dirty = True
+
+    def items(self) -> List[Tuple[str, str, float]]:
+        """(key, value, time learned) of every unexpired entry, most recent first"""
+        now = self._clock()
+        with self._lock:
+            entries = list(self._loaded().items())
+        return sorted(((key, value, learned) for key, (value, learned) in entries if now - learned < self.max_age),
+                      key=lambda item: -item[2])
+
+    def save(self) -> None:
+        """Write the cache if it changed, dropping expired and excess entries"""
+        import json
+        import tempfile
+        with self._lock:
+            if not self._dirty:
+                return
+            now = self._clock()
+            merged = self._read()
+            for key, forgotten in self._forgotten.items():
+                if key in merged and merged[key][1] <= forgotten:
+                    del merged[key]
+            for key, entry in self._loaded().items():
+                if key not in merged or merged[key][1] < entry[1]:
+                    merged[key] = entry
+            live = sorted(((key, entry) for key, entry in merged.items() if now - entry[1] < self.max_age),
+                          key=lambda item: -item[1][1])[:self.max_entries]
+            self._entries = dict(live)
+            document: Dict[str, Any] = {'hosts': {key: {self.VALUE: value, 'learned': learned}
+                                                  for key, (value, learned) in live}}
+            tmp_path = None
+            try:
+                with tempfile.NamedTemporaryFile(dir=os.path.dirname(os.path.abspath(self.path)), mode='wt',
+                                                 encoding='utf-8', delete=False) as f:
+                    tmp_path = f.name
+                    json.dump(document, f, indent=2)
+                os.replace(tmp_path, self.path)
+                tmp_path = None
+            except OSError as err:
+                raise WakeOnLanError(f'Unable to save {self.path}: {err.strerror}') from err
+            finally:
+                if tmp_path is not None:
+                    try:
+                        os.unlink(tmp_path)
+                    except OSError:
+                        pass
+            self._forgotten.clear()
+            self._dirty = False
@@ -0,0 +1,264 @@
+# Copyright (c) 2018, Eugene Gershnik
+# Use of this source code is governed by a BSD-style
+# license that can be found in the LICENSE.txt file or at
+# https://opensource.org/licenses/BSD-3-Clause
+
+"""Optional metrics of wake activity in OpenMetrics text format.
+
+Nothing is collected until `enable` is called; until then the instrumented
+code only checks that `collector` is None. Once enabled, a `WakeMetrics`
+registry counts:
+
+* ``wakeonlan_packets_sent_total`` / ``wakeonlan_bytes_sent_total`` by
+  ``kind`` of path (``interface``, ``address`` or ``ethernet``) and
+  ``interface`` name, empty for sends to a destination address, so the
+  number of label values stays bounded however many hosts are woken;
+* ``wakeonlan_send_failures_total`` by ``errno`` (e.g. ``ENETUNREACH``);
+* ``wakeonlan_bulk_wake_hosts_total`` and the ``wakeonlan_bulk_wake_seconds``
+  histogram, whose ratio is the bulk-wake throughput;
+
+and keeps ``wakeonlan_interface_enumeration_seconds`` and
+``wakeonlan_config_load_seconds`` histograms. The registry renders itself
+as text, writes it to a file atomically (e.g. for a node_exporter textfile
+collector) or serves it over HTTP. No third-party packages are needed.
+"""
+
+import bisect
+import errno
+import os
+import threading
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+CONTENT_TYPE = 'application/openmetrics-text; version=1.0.0; charset=utf-8'
+
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                   0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+Labels = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names: Sequence[str], values: Labels, extra: Optional[str] = None) -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra is not None:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    if value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+
+class Counter:
+    """Monotonically increasing value, optionally split by labels"""
+    kind = 'counter'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values: Dict[Labels, float] = {}
+
+    def inc(self, amount: float = 1.0, labels: Labels = ()) -> None:
+        """Add amount to the value for the given label values"""
+        if amount < 0:
+            raise ValueError('counters can only increase')
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def value(self, labels: Labels = ()) -> float:
+        """Current value for the given label values"""
+        with self._lock:
+            return self._values.get(labels, 0.0)
+
+    def samples(self) -> Iterator[str]:
+        """Sample lines in OpenMetrics text format"""
+        with self._lock:
+            items = sorted(self._values.items())
+        for labels, value in items:
+            yield f'{self.name}_total{_format_labels(self.labelnames, labels)} {_format_value(value)}'
+
+
+class Histogram:
+    """Distribution of observed values over fixed buckets, optionally split by labels"""
+    kind = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._lock = threading.Lock()
+        # label values -> count in each bucket (not cumulative), the +Inf bucket, then the sum
+        self._values: Dict[Labels, List[float]] = {}
+
+    def observe(self, value: float, labels: Labels = ()) -> None:
+        """Record a value for the given label values"""
+        idx = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts = self._values.get(labels)
+            if counts is None:
+                counts = [0.0] * (len(self.buckets) + 2)
+                self._values[labels] = counts
+            counts[idx] += 1
+            counts[-1] += value
+
+    def count(self, labels: Labels = ()) -> int:
+        """Number of values observed for the given label values"""
+        with self._lock:
+            counts = self._values.get(labels)
+            return 0 if counts is None else int(sum(counts[:-1]))
+
+    def samples(self) -> Iterator[str]:
+        """Sample lines in OpenMetrics text format"""
+        with self._lock:
+            items = sorted((labels, list(counts)) for labels, counts in self._values.items())
+        for labels, counts in items:
+            cumulative = 0.0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                le = 'le="+Inf"' if bound == float('inf') else f'le="{float(bound)!r}"'
+                yield f'{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {_format_value(cumulative)}'
+            yield f'{self.name}_count{_format_labels(self.labelnames, labels)} {_format_value(cumulative)}'
+            yield f'{self.name}_sum{_format_labels(self.labelnames, labels)} {_format_value(counts[-1])}'
+
+
+class MetricsRegistry:
+    """A set of metrics rendered together"""
+    def __init__(self):
+        self._metrics: List[Any] = []
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        """Create and register a counter; `name` is given without the ``_total`` suffix"""
+        metric = Counter(name, documentation, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        """Create and register a histogram"""
+        metric = Histogram(name, documentation, labelnames, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        """All metrics in OpenMetrics text format"""
+        lines = []
+        for metric in self._metrics:
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            lines.append(f'# HELP {metric.name} {_escape(metric.documentation)}')
+            lines.extend(metric.samples())
+        lines.append('# EOF\n')
+        return '\n'.join(lines)
+
+    def write(self, path: str) -> None:
+        """Write the rendered metrics to path, replacing it atomically"""
+        import tempfile
+        tmp_path = None
+        try:
+            with tempfile.NamedTemporaryFile(dir=os.path.dirname(os.path.abspath(path)), mode='wt',
+                                             encoding='utf-8', delete=False) as f:
+                tmp_path = f.name
+                f.write(self.render())
+            os.replace(tmp_path, path)
+            tmp_path = None
+        finally:
+            if tmp_path is not None:
+                try:
+                    os.unlink(tmp_path)
+                except OSError:
+                    pass
+
+    def serve(self, port: int, host: str = '127.0.0.1') -> Any:
+        """Serve the metrics over HTTP on a background thread.
+
+        Returns the server; call its ``shutdown()`` to stop it.
+        """
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+        registry = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self): # pylint: disable=invalid-name
+                body = registry.render().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', CONTENT_TYPE)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args): # pylint: disable=redefined-builtin
+                pass
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server
+
+
+def _errno_label(error: BaseException) -> str:
+    code = getattr(error, 'errno', None)
+    if code is None or code < 0: # resolver errors have negative codes of their own
+        return type(error).__name__
+    return errno.errorcode.get(code, str(code))
+
+
+class WakeMetrics(MetricsRegistry):
+    """The metrics the wake functions update while collection is enabled"""
+    def __init__(self):
+        super().__init__()
+        self.packets_sent = self.counter('wakeonlan_packets_sent', 'Wake packets sent', ('kind', 'interface'))
+        self.bytes_sent = self.counter('wakeonlan_bytes_sent', 'Bytes of wake packets sent', ('kind', 'interface'))
+        self.send_failures = self.counter('wakeonlan_send_failures', 'Sends that failed for good', ('errno',))
+        self.bulk_wake_hosts = self.counter('wakeonlan_bulk_wake_hosts', 'Hosts woken by bulk wakes')
+        self.bulk_wake_seconds = self.histogram('wakeonlan_bulk_wake_seconds', 'Duration of bulk wakes')
+        self.enumeration_seconds = self.histogram('wakeonlan_interface_enumeration_seconds',
+                                                  'Duration of network interface enumeration')
+        self.config_load_seconds = self.histogram('wakeonlan_config_load_seconds',
+                                                  'Duration of loading the saved configuration')
+
+    def sent(self, kind: str, interface: str, packets: int, size: int, error: Optional[BaseException]) -> None:
+        """Record the outcome of sending along one path of the given kind, through the named interface"""
+        if packets:
+            self.packets_sent.inc(packets, (kind, interface))
+            self.bytes_sent.inc(size, (kind, interface))
+        if error is not None:
+            self.send_failures.inc(1, (_errno_label(error),))
+
+    def plan_failed(self, error: BaseException) -> None:
+        """Record a path given up on before sending, such as an unknown interface or an unresolvable address
+
+        Errors other than `OSError` have no errno and are counted as `EPLAN`.
+        """
+        self.send_failures.inc(1, (_errno_label(error) if isinstance(error, OSError) else 'EPLAN',))
+
+    def bulk_wake(self, hosts: int, seconds: float) -> None:
+        """Record a bulk wake of a number of hosts"""
+        self.bulk_wake_hosts.inc(hosts)
+        self.bulk_wake_seconds.observe(seconds)
+
+
+collector: Optional[WakeMetrics] = None
+"""The active registry, None while collection is disabled"""
+
+
+def enable() -> WakeMetrics:
+    """Start collecting metrics, returning the registry (the existing one if already enabled)"""
+    global collector # pylint: disable=global-statement
+    if collector is None:
+        collector = WakeMetrics()
+    return collector
+
+
+def disable() -> None:
+    """Stop collecting and drop the collected metrics"""
+    global collector # pylint: disable=global-statement
+    collector = None
@@ -0,0 +1,226 @@
+# Copyright (c) 2018, Eugene Gershnik
+# Use of this source code is governed by a BSD-style
+# license that can be found in the LICENSE.txt file or at
+# https://opensource.org/licenses/BSD-3-Clause
+
+"""Find the MAC of a host from its IP address or name.
+
+The kernel's neighbor table maps the addresses of hosts recently talked to
+onto their MACs: ``/proc/net/arp`` for IPv4 and an rtnetlink
+``RTM_GETNEIGH`` dump for IPv6, on Linux. A sleeping host drops out of it
+after a few minutes, though, which is exactly when it needs waking, so
+every MAC found there is also remembered in a `MacCache`
+(``$HOME/.wakeonlan.macs``) and looked up there when the table has nothing.
+
+`resolve_macs` reads each table at most once per call into a dict keyed by
+address, so resolving thousands of addresses costs one read plus a lookup
+per address. `resolve_mac` and `wake_by_ip` do the same for a single host.
+"""
+
+import socket
+import struct
+import sys
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from .affinity import AffinityCache
+from .learned import LearnedCache
+from .interfaces import _NETLINK_ROUTE, _nl_attrs, _nl_dump
+from .pacing import Pacer, Repeat
+from .pool import SocketPool
+from .util import WakeOnLanError
+from .wakeonlan import HostRecord, MacAddress, WakeResult, DEFAULT_PORT, TRANSPORT_UDP, _split_mac, wake
+
+ARP_PATH = '/proc/net/arp'
+
+_ATF_COM = 0x2                  # entry is complete
+_RTM_NEWNEIGH = 28
+_RTM_GETNEIGH = 30
+_NDA_DST = 1
+_NDA_LLADDR = 2
+_NUD_INCOMPLETE = 0x01
+_NUD_FAILED = 0x20
+_NUD_NOARP = 0x40               # multicast and the like: not a host
+_ndmsg = struct.Struct('=BxxxiHBB')     # family, ifindex, state, flags, type
+
+_NO_MAC = '00:00:00:00:00:00'
+
+
+class MacCache(LearnedCache):
+    """MACs seen in the neighbor table, persisted next to the configuration.
+
+    Keys are IPv4 or IPv6 addresses, values MACs as XX:XX:XX:XX:XX:XX. See
+    `LearnedCache` for loading, saving and thread safety. Entries expire
+    after 90 days by default, since DHCP may hand an address to another host.
+    """
+    FILE_NAME = '.wakeonlan.macs'
+    VALUE = 'mac'
+    DEFAULT_MAX_AGE = 90 * 24 * 3600.0
+    DEFAULT_MAX_ENTRIES = 65536
+
+    def _key(self, key: str) -> str:
+        return _canonical_ip(key) or key
+
+
+def _canonical_ip(address: str) -> Optional[str]:
+    """address in the form the tables are keyed by, None if it isn't an IP address"""
+    import ipaddress
+    try:
+        return ipaddress.ip_address(address.split('%', 1)[0]).compressed
+    except ValueError:
+        return None
+
+
+def read_arp(path: str = ARP_PATH) -> Dict[str, str]:
+    """``{IPv4 address: MAC}`` of the complete entries of the kernel's ARP table, empty if not readable"""
+    table: Dict[str, str] = {}
+    try:
+        with open(path, 'rt', encoding='ascii') as f:
+            next(f, None)  # header
+            for line in f:
+                fields = line.split()
+                if len(fields) < 4:
+                    continue
+                try:
+                    flags = int(fields[2], 16)
+                except ValueError:
+                    continue
+                mac = fields[3].upper()
+                if flags & _ATF_COM and mac != _NO_MAC and len(mac) == 17:
+                    table[fields[0]] = mac
+    except OSError:
+        pass
+    return table
+
+
+def read_neighbors6() -> Dict[str, str]:
+    """``{IPv6 address: MAC}`` of the reachable entries of the kernel's IPv6 neighbor table
+
+    Empty where rtnetlink isn't available.
+    """
+    if not sys.platform.startswith('linux') or not hasattr(socket, 'AF_NETLINK'):
+        return {}
+    table: Dict[str, str] = {}
+    try:
+        with socket.socket(socket.AF_NETLINK, socket.SOCK_RAW, _NETLINK_ROUTE) as sock:  # pylint: disable=no-member
+            sock.bind((0, 0))
+            request = _ndmsg.pack(socket.AF_INET6, 0, 0, 0, 0)
+            for msg_type, payload in _nl_dump(sock, _RTM_GETNEIGH, request, 1):
+                if msg_type != _RTM_NEWNEIGH:
+                    continue
+                family, _, state, _, _ = _ndmsg.unpack_from(payload)
+                if family != socket.AF_INET6 or state & (_NUD_INCOMPLETE | _NUD_FAILED | _NUD_NOARP):
+                    continue
+                dst = lladdr = None
+                for attr_type, value in _nl_attrs(payload, _ndmsg.size):
+                    if attr_type == _NDA_DST:
+                        dst = bytes(value)
+                    elif attr_type == _NDA_LLADDR:
+                        lladdr = bytes(value)
+                if dst is None or lladdr is None or len(lladdr) != 6 or not any(lladdr):
+                    continue
+                table[socket.inet_ntop(socket.AF_INET6, dst)] = ':'.join(f'{b:02X}' for b in lladdr)
+    except OSError:
+        return {}
+    return table
+
+
+def resolve_macs(addresses: Iterable[str], cache: Optional[MacCache] = None) -> Dict[str, Optional[MacAddress]]:
+    """MAC of each IP address or host name, None for those not found.
+
+    Host names are resolved to their addresses first. The neighbor tables
+    are each read once, and only if some address of their family is asked
+    for. MACs found there are learned into `cache`, which is saved if that
+    changed it, and the addresses not found there are looked up in it. Returns a dict keyed by
+    the addresses and names as given.
+    """
+    return {address: None if found is None else found[0]
+            for address, found in _resolve_macs(addresses, cache).items()}
+
+
+def _resolve_macs(addresses: Iterable[str],
+                  cache: Optional[MacCache]) -> Dict[str, Optional[Tuple[MacAddress, str]]]:
+    """`resolve_macs`, also giving the IP address each MAC was found under"""
+    addresses = list(addresses)
+    ips: Dict[str, List[str]] = {}
+    for address in dict.fromkeys(addresses):
+        canonical = _canonical_ip(address)
+        if canonical is not None:
+            ips[address] = [canonical]
+            continue
+        try:
+            infos = socket.getaddrinfo(address, None, type=socket.SOCK_DGRAM)
+        except OSError:
+            ips[address] = []
+            continue
+        ips[address] = list(dict.fromkeys(_canonical_ip(info[4][0]) or info[4][0] for info in infos))
+
+    wanted = {ip for candidates in ips.values() for ip in candidates}
+    table: Dict[str, str] = {}
+    if any(':' not in ip for ip in wanted):
+        table.update(read_arp())
+    if any(':' in ip for ip in wanted):
+        table.update(read_neighbors6())
+
+    macs: Dict[str, Optional[Tuple[MacAddress, str]]] = {}
+    for address, candidates in ips.items():
+        found = None
+        for ip in candidates:
+            mac = table.get(ip)
+            if mac is not None:
+                if cache is not None:
+                    cache.learn(ip, mac)
+                found = (mac, ip)
+                break
+        if found is None and cache is not None:
+            for ip in candidates:
+                mac = cache.get(ip)
+                if mac is not None:
+                    found = (mac, ip)
+                    break
+        macs[address] = None if found is None else (_split_mac(found[0]), found[1])
+    if cache is not None:
+        cache.save()
+    return macs
+
+
+def resolve_mac(address: str, cache: Optional[MacCache] = None) -> MacAddress:
+    """MAC of an IP address or host name, as `resolve_macs` finds it
+
+    `cache` defaults to the `MacCache` next to the configuration. Raises
+    `WakeOnLanError` if the MAC isn't known.
+    """
+    return _resolve_mac(address, cache)[0]
+
+
+def _resolve_mac(address: str, cache: Optional[MacCache]) -> Tuple[MacAddress, str]:
+    """`resolve_mac`, also giving the IP address the MAC was found under"""
+    found = _resolve_macs([address], MacCache() if cache is None else cache)[address]
+    if found is None:
+        raise WakeOnLanError(f'MAC address of {address} not found in the neighbor table or the learned MACs')
+    return found
+
+
+def wake_by_ip(address: str, interface: Optional[str] = None, port: int = DEFAULT_PORT,
+               transport: str = TRANSPORT_UDP, cache: Optional[MacCache] = None,
+               pool: Optional[SocketPool] = None, pacer: Optional[Pacer] = None,
+               repeat: Optional[Repeat] = None, affinity: Optional[AffinityCache] = None) -> WakeResult:
+    """Wake the host with the given IP address or name, finding its MAC with `resolve_macs`.
+
+    Unless an interface is given, the IPv4 address the MAC was found under,
+    whether given or resolved from the name, also becomes the record's
+    `host_ip`, so the packet goes out only on the interface on its subnet.
+    `cache` defaults to the `MacCache` next to the configuration; the
+    remaining arguments are passed on to `wake`. Raises `WakeOnLanError` if
+    the MAC isn't known.
+    """
+    mac, ip = _resolve_mac(address, cache)
+    return wake(HostRecord(mac, interface, None, port, transport, _host_ip(ip, interface)),
+                pool, pacer, repeat, affinity)
+
+
+def _host_ip(ip: str, interface: Optional[str], broadcast: Optional[str] = None) -> Optional[str]:
+    """the `host_ip` to wake the host at ip with, if it is IPv4 and neither interface nor broadcast is given"""
+    if interface is not None or broadcast is not None:
+        return None
+    canonical = _canonical_ip(ip)
+    return canonical if canonical is not None and ':' not in canonical else None
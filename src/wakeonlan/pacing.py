@@ -0,0 +1,276 @@
+# Copyright (c) 2018, Eugene Gershnik
+# Use of this source code is governed by a BSD-style
+# license that can be found in the LICENSE.txt file or at
+# https://opensource.org/licenses/BSD-3-Clause
+
+"""Pacing of wake packets.
+
+A `Pacer` passed to any of the wake functions spaces the packets they send
+so that neither the total rate nor the rate through any single socket (i.e.
+interface, or destination family for explicit addresses) exceeds the
+configured packets per second, after an initial burst. When the kernel
+pushes back with ``ENOBUFS`` or ``EAGAIN`` the send is retried with
+exponential backoff, and all senders sharing the pacer pause meanwhile.
+
+`Repeat` asks for several packets per target, evenly spaced, and for sends
+failing with a transient error (see `is_transient`) to be retried with
+backoff. The wake functions carry these out with a `SendScheduler`, which
+drives all the sends of a call from a single timer.
+"""
+
+import errno
+import heapq
+import threading
+import time
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+_BACKPRESSURE_ERRNOS = frozenset((errno.ENOBUFS, errno.EAGAIN, errno.EWOULDBLOCK))
+# errors of a link that is flapping or of an address that is being reconfigured
+_TRANSIENT_ERRNOS = _BACKPRESSURE_ERRNOS | frozenset((errno.ENETUNREACH, errno.EHOSTUNREACH,
+                                                      errno.ENETDOWN, errno.EADDRNOTAVAIL))
+
+
+def is_transient(error: OSError) -> bool:
+    """Whether a failed send is worth retrying"""
+    return error.errno in _TRANSIENT_ERRNOS
+
+
+class TokenBucket:
+    """Rate limiter allowing `rate` events per second with bursts of up to `burst`
+
+    Implemented in its virtual-scheduling form: rather than counting tokens
+    it tracks when the next event would be due at exactly `rate`.
+    """
+    def __init__(self, rate: float, burst: int = 1):
+        if rate <= 0:
+            raise ValueError('rate must be positive')
+        if burst < 1:
+            raise ValueError('burst must be at least 1')
+        self.rate = rate
+        self.burst = burst
+        self._interval = 1.0 / rate
+        self._tolerance = (burst - 1) * self._interval
+        self._due = float('-inf')
+
+    def reserve(self, now: float) -> float:
+        """Take a token and return how long to wait, from `now`, before using it"""
+        due = max(self._due, now)
+        self._due = due + self._interval
+        return max(0.0, due - self._tolerance - now)
+
+
+class PacingStats(NamedTuple):
+    """What a `Pacer` actually achieved"""
+    packets: int
+    """Packets sent"""
+    elapsed: float
+    """Seconds from the first packet to the last"""
+    retries: int
+    """Sends retried because of kernel backpressure"""
+
+    def rate(self) -> float:
+        """Achieved packets per second"""
+        if self.packets < 2 or self.elapsed <= 0:
+            return 0.0
+        return (self.packets - 1) / self.elapsed
+
+
+class Pacer:
+    """Paces wake packets globally and per socket.
+
+    `rate`/`burst` limit all packets sent through the pacer and
+    `interface_rate`/`interface_burst` those sent through any one socket.
+    Either rate may be None for no limit. The pacer is safe to share between
+    threads and between calls; `stats` covers everything sent through it.
+    """
+    def __init__(self, rate: Optional[float] = None, burst: int = 1,
+                 interface_rate: Optional[float] = None, interface_burst: int = 1,
+                 clock: Callable[[], float] = time.monotonic):
+        self._global = None if rate is None else TokenBucket(rate, burst)
+        self._interface_rate = interface_rate
+        self._interface_burst = interface_burst
+        if interface_rate is not None:
+            TokenBucket(interface_rate, interface_burst) # validate now rather than on first send
+        self._buckets: Dict[Any, TokenBucket] = {}
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._paused_until = float('-inf')
+        self._packets = 0
+        self._retries = 0
+        self._first: Optional[float] = None
+        self._last = 0.0
+
+    def reserve(self, key: Any) -> float:
+        """Reserve a slot for a packet through socket `key` and return how long to wait for it"""
+        with self._lock:
+            now = self._clock()
+            delay = max(0.0, self._paused_until - now)
+            if self._interface_rate is not None:
+                bucket = self._buckets.get(key)
+                if bucket is None:
+                    bucket = TokenBucket(self._interface_rate, self._interface_burst)
+                    self._buckets[key] = bucket
+                delay += bucket.reserve(now + delay)
+            if self._global is not None:
+                delay += self._global.reserve(now + delay)
+            return delay
+
+    def backoff(self, delay: float) -> None:
+        """Pause all sends through the pacer for `delay` seconds"""
+        with self._lock:
+            self._retries += 1
+            self._paused_until = max(self._paused_until, self._clock() + delay)
+
+    def paused_for(self) -> float:
+        """Seconds left of the pause started by `backoff`, 0 if there is none"""
+        with self._lock:
+            return max(0.0, self._paused_until - self._clock())
+
+    def sent(self) -> None:
+        """Record that a packet went out"""
+        with self._lock:
+            now = self._clock()
+            if self._first is None:
+                self._first = now
+            self._last = now
+            self._packets += 1
+
+    def stats(self) -> PacingStats:
+        """Packets sent so far and the rate achieved"""
+        with self._lock:
+            elapsed = 0.0 if self._first is None else self._last - self._first
+            return PacingStats(self._packets, elapsed, self._retries)
+
+
+class Repeat(NamedTuple):
+    """How many packets to send to each target and how to retry failed sends"""
+    count: int = 1
+    """Packets sent to each target"""
+    interval: float = 0.1
+    """Seconds between the packets sent to a target, measured from the first one"""
+    retries: int = 3
+    """How many times a send failing with a transient error is retried"""
+    backoff: float = 0.05
+    """Seconds before the first retry, doubled for each further one"""
+    max_backoff: float = 1.0
+    """Upper bound of the retry delay"""
+
+    def retry_delay(self, attempt: int) -> float:
+        """Seconds to wait before retry number `attempt`, counting from 0"""
+        return min(self.backoff * 2 ** attempt, self.max_backoff)
+
+
+class _Job:
+    """packets to one target and how far along they are"""
+    __slots__ = ('sock', 'payload', 'dest', 'key', 'done', 'sent', 'first', 'attempt', 'reserved')
+
+    def __init__(self, sock: Any, payload: bytes, dest: Any, key: Any,
+                 done: Callable[[Optional[OSError], int], Any]):
+        self.sock = sock
+        self.payload = payload
+        self.dest = dest
+        self.key = key
+        self.done = done
+        self.sent = 0
+        self.first = 0.0
+        self.attempt = 0
+        self.reserved = False
+
+
+class SendScheduler:
+    """Sends packets to many targets from one thread, driven by a single timer.
+
+    Every pending packet is an entry in one heap ordered by when it is due:
+    repeats fall due `Repeat.interval` apart from a target's first packet,
+    packets held back by a `Pacer` when it allows them, and sends that failed
+    with a transient error after a backoff. `run` sleeps only until the
+    earliest entry, so delays for one target never hold up another.
+
+    `send_first` may be called from several threads at once, before `run`,
+    so that first packets through different sockets overlap instead of
+    waiting on each other.
+    """
+    def __init__(self, repeat: Optional[Repeat] = None, pacer: Optional[Pacer] = None,
+                 clock: Callable[[], float] = time.monotonic,
+                 sleep: Callable[[float], Any] = time.sleep):
+        repeat = Repeat() if repeat is None else repeat
+        if repeat.count < 1:
+            raise ValueError('count must be at least 1')
+        if repeat.retries < 0:
+            raise ValueError('retries must not be negative')
+        self.repeat = repeat
+        self._pacer = pacer
+        self._clock = clock
+        self._sleep = sleep
+        self._heap: List[Tuple[float, int, _Job]] = []
+        self._seq = 0
+        self._lock = threading.Lock()
+
+    def _push(self, due: float, job: _Job):
+        with self._lock:
+            heapq.heappush(self._heap, (due, self._seq, job))
+            self._seq += 1
+
+    def add(self, sock: Any, payload: bytes, dest: Any, key: Any,
+            done: Callable[[Optional[OSError], int], Any]) -> None:
+        """Schedule `Repeat.count` packets to dest through sock, the socket for `key`.
+
+        Once they are all sent, or a send fails for good, `done` is called
+        with None or the error and the number of packets that went out.
+        """
+        self._push(self._clock(), _Job(sock, payload, dest, key, done))
+
+    def send_first(self, sock: Any, payload: bytes, dest: Any, key: Any,
+                   done: Callable[[Optional[OSError], int], Any]) -> None:
+        """Like `add`, but try the first packet right away on the calling thread.
+
+        Unless the pacer holds it back, the packet is sent before returning;
+        repeats and retries are left to `run`.
+        """
+        self._step(_Job(sock, payload, dest, key, done), self._clock())
+
+    def run(self) -> None:
+        """Send everything scheduled, returning when every target is done"""
+        while self._heap:
+            now = self._clock()
+            due = self._heap[0][0]
+            if due > now:
+                self._sleep(due - now)
+                continue
+            self._step(heapq.heappop(self._heap)[2], now)
+
+    def _step(self, job: _Job, now: float):
+        pacer = self._pacer
+        if pacer is not None:
+            if not job.reserved:
+                job.reserved = True
+                delay = pacer.reserve(job.key)
+            else:
+                # a backoff since the slot was reserved holds this packet back too
+                delay = pacer.paused_for()
+            if delay > 0:
+                self._push(now + delay, job)
+                return
+        try:
+            job.sock.sendto(job.payload, job.dest)
+        except OSError as ex:
+            if not is_transient(ex) or job.attempt >= self.repeat.retries:
+                job.done(ex, job.sent)
+                return
+            delay = self.repeat.retry_delay(job.attempt)
+            job.attempt += 1
+            if pacer is not None:
+                pacer.backoff(delay)
+            self._push(now + delay, job)
+            return
+        if pacer is not None:
+            pacer.sent()
+        if job.sent == 0:
+            job.first = now
+        job.sent += 1
+        job.attempt = 0
+        job.reserved = False
+        if job.sent == self.repeat.count:
+            job.done(None, job.sent)
+        else:
+            self._push(job.first + job.sent * self.repeat.interval, job)
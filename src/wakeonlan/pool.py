@@ -0,0 +1,189 @@
+# Copyright (c) 2018, Eugene Gershnik
+# Use of this source code is governed by a BSD-style
+# license that can be found in the LICENSE.txt file or at
+# https://opensource.org/licenses/BSD-3-Clause
+
+"""Sockets used to send wake packets and a pool to keep them open.
+
+Sockets are identified by a key:
+
+* ``('if', (index, family, address))`` - bound to an interface address and
+  set up to broadcast (IPv4) or multicast (IPv6) out of that interface;
+* ``('dest', family, socktype, proto)`` - for sending to explicit
+  destinations of a given family;
+* ``('ether', interface_name)`` - ``AF_PACKET`` socket for raw Ethernet
+  frames out of an interface (see `wakeonlan.ether`).
+
+`SocketPool` keeps sockets open by key so that processes sending
+continuously skip socket creation and setup on every packet.
+"""
+
+import socket
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from .interfaces import interface_cache, InterfaceAddress
+from . import ether
+
+SocketKey = Tuple[Any, ...]
+
+
+def _interface_socket(address: InterfaceAddress) -> socket.socket:
+    """create a UDP socket set up to broadcast/multicast from a given interface address"""
+    idx, family, addr = address
+    sock = socket.socket(family, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+    try:
+        if family == socket.AF_INET:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
+            sock.bind((addr, 0))
+        else:
+            sock.setsockopt(socket.IPPROTO_IPV6, socket.IPV6_MULTICAST_IF, idx)
+    except OSError:
+        sock.close()
+        raise
+    return sock
+
+def _dest_socket(family: int, socktype: int, proto: int) -> socket.socket:
+    """create a socket suitable for sending to an explicit destination"""
+    sock = socket.socket(family, socktype, proto)
+    try:
+        if family == socket.AF_INET:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
+    except OSError:
+        sock.close()
+        raise
+    return sock
+
+def _open_socket(key: SocketKey) -> socket.socket:
+    """create a socket for a given key"""
+    if key[0] == 'if':
+        return _interface_socket(key[1])
+    if key[0] == 'ether':
+        return ether.open_socket()
+    _, family, socktype, proto = key
+    return _dest_socket(family, socktype, proto)
+
+
+class SocketPool:
+    """Keeps wake sockets open between sends.
+
+    Sockets are created on first use and closed once unused for
+    `idle_timeout` seconds. Interface sockets whose address disappears from
+    `interface_cache` are closed when the cache reloads, and any socket that
+    fails to send is dropped by the caller via `discard` so that the next send
+    rebuilds it. The pool is safe to use from multiple threads.
+
+    Every socket taken with `get` must be handed back with `release` once
+    the caller is done sending on it. Until then it is never closed: if it
+    goes idle, stale or discarded meanwhile, it is only taken out of the
+    pool and closed on its last release.
+
+    Use as a context manager or call `close` when done.
+    """
+    def __init__(self, idle_timeout: float = 60.0):
+        self.idle_timeout = idle_timeout
+        self._lock = threading.Lock()
+        # key -> [socket, last use time, callers using it]
+        self._sockets: Dict[SocketKey, List[Any]] = {}
+        # entries taken out of the pool while still in use, by socket
+        self._retired: Dict[Any, List[Any]] = {}
+        self._generation: Optional[int] = None
+        self._next_sweep = 0.0
+
+    def __enter__(self) -> 'SocketPool':
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def __len__(self) -> int:
+        return len(self._sockets)
+
+    def get(self, key: SocketKey) -> socket.socket:
+        """Return an open socket for a key, creating it if needed; `release` it when done"""
+        now = time.monotonic()
+        with self._lock:
+            if now >= self._next_sweep or self._generation != interface_cache.generation:
+                closing = self._sweep(now)
+            else:
+                closing = []
+            entry = self._sockets.get(key)
+            if entry is None:
+                entry = [_open_socket(key), now, 0]
+                self._sockets[key] = entry
+            else:
+                entry[1] = now
+            entry[2] += 1
+            sock = entry[0]
+        _close_all(closing)
+        return sock
+
+    def release(self, key: SocketKey, sock: socket.socket) -> None:
+        """Hand back a socket returned by `get` for key"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._sockets.get(key)
+            if entry is not None and entry[0] is sock:
+                entry[1] = now
+                entry[2] -= 1
+                return
+            entry = self._retired.get(sock)
+            if entry is None:
+                return
+            entry[2] -= 1
+            if entry[2] > 0:
+                return
+            del self._retired[sock]
+        sock.close()
+
+    def discard(self, key: SocketKey) -> None:
+        """Close and forget the socket for a key, e.g. after it failed to send"""
+        with self._lock:
+            entry = self._sockets.pop(key, None)
+            closing = [] if entry is None else self._retire(entry)
+        _close_all(closing)
+
+    def close_idle(self) -> None:
+        """Close sockets unused for longer than `idle_timeout`"""
+        with self._lock:
+            closing = self._sweep(time.monotonic())
+        _close_all(closing)
+
+    def close(self) -> None:
+        """Close all pooled sockets, including those still in use"""
+        with self._lock:
+            socks = [entry[0] for entry in self._sockets.values()] + list(self._retired)
+            self._sockets.clear()
+            self._retired.clear()
+        _close_all(socks)
+
+    def _retire(self, entry: List[Any]) -> List[Any]:
+        """the sockets to close now that entry is out of the pool; called with the lock held"""
+        if entry[2] > 0:
+            self._retired[entry[0]] = entry
+            return []
+        return [entry[0]]
+
+    def _sweep(self, now: float) -> List[Any]:
+        """take idle and stale sockets out of the pool, returning those to close; called with the lock held"""
+        stale = [key for key, (_, used, users) in self._sockets.items()
+                 if users == 0 and now - used >= self.idle_timeout]
+        generation = interface_cache.generation
+        if generation != self._generation:
+            interfaces = interface_cache.peek()
+            if interfaces is not None:
+                self._generation = generation
+                current = {address for addresses in interfaces.values() for address in addresses}
+                stale.extend(key for key in self._sockets
+                             if key[0] == 'if' and key[1] not in current and key not in stale)
+        closing = []
+        for key in stale:
+            closing.extend(self._retire(self._sockets.pop(key)))
+        self._next_sweep = now + min(self.idle_timeout, 1.0)
+        return closing
+
+
+def _close_all(socks: List[Any]) -> None:
+    for sock in socks:
+        sock.close()
@@ -0,0 +1,201 @@
+# Copyright (c) 2018, Eugene Gershnik
+# Use of this source code is governed by a BSD-style
+# license that can be found in the LICENSE.txt file or at
+# https://opensource.org/licenses/BSD-3-Clause
+
+"""Bulk import and export of saved names.
+
+Three formats are supported, chosen by file extension:
+
+* ``.csv`` - a header row with ``name`` and ``mac`` columns and optional
+  ``interface``, ``ip`` and ``port`` columns; empty cells are omitted;
+* ``.ndjson`` / ``.jsonl`` - one JSON object per line with a ``name`` key
+  plus the keys of a saved-configuration record;
+* ``.json`` - the same ``{"names": {...}}`` document as the configuration
+  file itself.
+
+``-`` means stdin/stdout in NDJSON. CSV and NDJSON are read and written a row
+at a time, so inventories needn't fit in memory (JSON documents are parsed
+whole). Every imported row is validated like a saved configuration entry and
+the whole import is committed in one write; a bad row aborts it with nothing
+written.
+"""
+
+import os
+import sys
+from typing import Any, Dict, IO, Iterator, Optional, Tuple
+
+from .util import WakeOnLanError
+from .wakeonlan import HostRecord, _check_name, _parse_name_record, _make_name_record
+
+FORMATS = ('csv', 'ndjson', 'json')
+
+_CSV_FIELDS = ('name', 'mac', 'interface', 'ip', 'port', 'transport', 'host_ip')
+
+_EXTENSIONS = {
+    '.csv': 'csv',
+    '.ndjson': 'ndjson',
+    '.jsonl': 'ndjson',
+    '.json': 'json',
+}
+
+
+def _format_for(path: str) -> str:
+    if path == '-':
+        return 'ndjson'
+    fmt = _EXTENSIONS.get(os.path.splitext(path)[1].lower())
+    if fmt is None:
+        raise WakeOnLanError(f'Cannot tell the format of {path}: use a .csv, .ndjson, .jsonl or .json file')
+    return fmt
+
+
+def _read_csv(stream: IO[str], path: str) -> Iterator[Tuple[str, HostRecord]]:
+    import csv
+    reader = csv.DictReader(stream)
+    if reader.fieldnames is None or 'name' not in reader.fieldnames or 'mac' not in reader.fieldnames:
+        raise WakeOnLanError(f'{path} must have a header row with `name` and `mac` columns')
+    for row in reader:
+        source = f'{path}, line {reader.line_num}'
+        name = row.get('name')
+        if not name:
+            raise WakeOnLanError(f'name is missing in {source}')
+        _check_name(name, source)
+        name_record: Dict[str, Any] = {key: value for key, value in row.items()
+                                       if key in _CSV_FIELDS and key != 'name' and value}
+        if 'port' in name_record:
+            try:
+                name_record['port'] = int(name_record['port'])
+            except ValueError:
+                pass # reported by _parse_name_record
+        yield name, _parse_name_record(name, name_record, source)
+
+
+def _read_ndjson(stream: IO[str], path: str) -> Iterator[Tuple[str, HostRecord]]:
+    import json
+    for line_num, line in enumerate(stream, 1):
+        if not line.strip():
+            continue
+        source = f'{path}, line {line_num}'
+        try:
+            name_record = json.loads(line)
+        except ValueError as ex:
+            raise WakeOnLanError(f'{source} is malformed') from ex
+        if not isinstance(name_record, dict):
+            raise WakeOnLanError(f'{source} is malformed')
+        name = name_record.pop('name', None)
+        if not isinstance(name, str) or not name:
+            raise WakeOnLanError(f'name is missing or malformed in {source}')
+        _check_name(name, source)
+        yield name, _parse_name_record(name, name_record, source)
+
+
+def _read_json(stream: IO[str], path: str) -> Iterator[Tuple[str, HostRecord]]:
+    import json
+    try:
+        document = json.load(stream)
+    except ValueError as ex:
+        raise WakeOnLanError(f'{path} is malformed') from ex
+    names = document.get('names') if isinstance(document, dict) else None
+    if not isinstance(names, dict):
+        raise WakeOnLanError(f'`names` not found in {path}')
+    for name, name_record in names.items():
+        _check_name(name, path)
+        yield name, _parse_name_record(name, name_record, path)
+
+
+def _write_csv(stream: IO[str], records: Iterator[Tuple[str, HostRecord]]) -> int:
+    import csv
+    writer = csv.DictWriter(stream, _CSV_FIELDS)
+    writer.writeheader()
+    count = 0
+    for name, host_record in records:
+        writer.writerow(dict(_make_name_record(host_record), name=name))
+        count += 1
+    return count
+
+
+def _write_ndjson(stream: IO[str], records: Iterator[Tuple[str, HostRecord]]) -> int:
+    import json
+    count = 0
+    for name, host_record in records:
+        stream.write(json.dumps(dict(name=name, **_make_name_record(host_record))))
+        stream.write('\n')
+        count += 1
+    return count
+
+
+def _write_json(stream: IO[str], records: Iterator[Tuple[str, HostRecord]]) -> int:
+    import json
+    count = 0
+    stream.write('{\n  "names": {')
+    for name, host_record in records:
+        stream.write(',\n    ' if count else '\n    ')
+        stream.write(f'{json.dumps(name)}: {json.dumps(_make_name_record(host_record))}')
+        count += 1
+    stream.write('\n  }\n}\n' if count else '}\n}\n')
+    return count
+
+
+_READERS = {'csv': _read_csv, 'ndjson': _read_ndjson, 'json': _read_json}
+_WRITERS = {'csv': _write_csv, 'ndjson': _write_ndjson, 'json': _write_json}
+
+
+def _reading(records: Iterator[Tuple[str, HostRecord]], path: str) -> Iterator[Tuple[str, HostRecord]]:
+    """pass records through, reporting errors reading the file they come from as such"""
+    try:
+        yield from records
+    except OSError as err:
+        raise WakeOnLanError(f'Unable to read {path}: {err.strerror}') from err
+
+
+def import_names(path: str, fmt: Optional[str] = None) -> int:
+    """Save all records from an inventory file (or ``-`` for stdin) in one write.
+
+    Returns the number of records imported.
+    """
+    from .inventory import get_backend
+    fmt = _format_for(path) if fmt is None else fmt
+    reader = _READERS[fmt]
+    if path == '-':
+        return get_backend().save_all(_reading(reader(sys.stdin, '<stdin>'), '<stdin>'))
+    try:
+        stream = open(path, 'rt', encoding='utf-8', newline='')
+    except OSError as err:
+        raise WakeOnLanError(f'Unable to read {path}: {err.strerror}') from err
+    with stream:
+        try:
+            return get_backend().save_all(_reading(reader(stream, path), path))
+        except OSError as err:
+            raise WakeOnLanError(f'Unable to save: {err.strerror}') from err
+
+
+def export_names(path: str, fmt: Optional[str] = None) -> int:
+    """Write all saved records to an inventory file (or ``-`` for stdout).
+
+    The file is written under a temporary name and renamed into place, so
+    an existing file is never left half written. Returns the number of
+    records exported.
+    """
+    import tempfile
+    from .inventory import get_backend
+    fmt = _format_for(path) if fmt is None else fmt
+    writer = _WRITERS[fmt]
+    if path == '-':
+        return writer(sys.stdout, get_backend().iter_all())
+    tmp_path = None
+    try:
+        with tempfile.NamedTemporaryFile(dir=os.path.dirname(os.path.abspath(path)), mode='wt',
+                                         encoding='utf-8', newline='', delete=False) as stream:
+            tmp_path = stream.name
+            count = writer(stream, get_backend().iter_all())
+        os.replace(tmp_path, path)
+        tmp_path = None
+        return count
+    except OSError as err:
+        raise WakeOnLanError(f'Unable to write {path}: {err.strerror}') from err
+    finally:
+        if tmp_path is not None:
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
@@ -0,0 +1,211 @@
+# Copyright (c) 2018, Eugene Gershnik
+# Use of this source code is governed by a BSD-style
+# license that can be found in the LICENSE.txt file or at
+# https://opensource.org/licenses/BSD-3-Clause
+
+"""Wake hosts and verify they came up.
+
+After the magic packet goes out, each host is probed with a TCP connect to
+`Verify.port` on `Verify.host` (its own address or name, not the broadcast
+address the packet was sent to). Any answer counts as up, including a
+refused connection, since that means the host's network stack is running.
+Hosts still down get the packet again with exponential backoff until
+`Verify.timeout` runs out; the resends due at the same time go out as one
+batch.
+
+All probes of a batch run as coroutines on one event loop, with at most
+`MAX_CONCURRENT_PROBES` connects in flight, so thousands of hosts can be
+verified at once without a thread per host.
+
+Given an `AffinityCache`, the first packet goes out on the interface learned
+for the host and resends go out on all interfaces. Once a host is up, the
+interface its address is routed through is learned, and the cache saved.
+"""
+
+import asyncio
+from typing import Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+from .pacing import Pacer, Repeat
+from .affinity import AffinityCache, route_interface
+from .wakeonlan import HostRecord, WakeResult
+from .aio import async_wake_many
+
+MAX_CONCURRENT_PROBES = 256
+
+
+class Verify(NamedTuple):
+    """How to check that a woken host is up"""
+    host: str
+    """Address or name of the host itself to probe"""
+    port: int = 22
+    """TCP port to connect to"""
+    timeout: float = 120.0
+    """Seconds after the first wake to give up"""
+    probe_timeout: float = 1.0
+    """Seconds to wait for each connect"""
+    probe_interval: float = 1.0
+    """Seconds between probes"""
+    resend_after: float = 5.0
+    """Seconds after a wake to send the packet again if still down; doubled after each resend"""
+    max_resend_after: float = 60.0
+    """Upper bound of the resend backoff"""
+
+
+class VerifyResult(NamedTuple):
+    """Outcome of waking and verifying a single host"""
+    result: WakeResult
+    """Result of the first wake"""
+    up_after: Optional[float]
+    """Seconds from the first wake until the host answered, None if it never did"""
+    wakes: int
+    """How many times the packet was sent"""
+
+    def is_up(self) -> bool:
+        """Whether the host answered within the timeout"""
+        return self.up_after is not None
+
+
+async def probe(host: str, port: int, timeout: float) -> bool:
+    """Whether anything answers a TCP connect to host:port within timeout"""
+    try:
+        _, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout)
+    except ConnectionRefusedError:
+        return True
+    except (OSError, asyncio.TimeoutError):
+        return False
+    writer.close()
+    try:
+        await writer.wait_closed()
+    except OSError:
+        pass
+    return True
+
+
+async def _bounded_probe(limit: asyncio.Semaphore, host: str, port: int, timeout: float) -> bool:
+    async with limit:
+        return await probe(host, port, timeout)
+
+
+async def async_probe_many(targets: Sequence[Tuple[str, int]], timeout: float = 1.0) -> List[bool]:
+    """Probe (host, port) pairs concurrently, returning whether each answered"""
+    limit = asyncio.Semaphore(MAX_CONCURRENT_PROBES)
+    return list(await asyncio.gather(*(_bounded_probe(limit, host, port, timeout)
+                                       for host, port in targets)))
+
+
+async def _learn_route(affinity: AffinityCache, record: HostRecord, host: str):
+    interface = await asyncio.get_running_loop().run_in_executor(None, route_interface, host)
+    if interface is not None:
+        affinity.learn(record.mac_str(), interface)
+
+
+async def _verify_all(targets: Sequence[Tuple[HostRecord, Verify]], firsts: Sequence[WakeResult],
+                      start: float, pacer: Optional[Pacer], repeat: Optional[Repeat],
+                      affinity: Optional[AffinityCache]) -> List[VerifyResult]:
+    """probe every host until it's up or out of time, in rounds
+
+    Each round probes the hosts whose probe is due concurrently, then resends
+    to all those of them whose resend is due as one batch.
+    """
+    loop = asyncio.get_running_loop()
+    limit = asyncio.Semaphore(MAX_CONCURRENT_PROBES)
+    count = len(targets)
+    deadlines = [start + verify.timeout for _, verify in targets]
+    resend_after = [verify.resend_after for _, verify in targets]
+    next_resend = [start + after for after in resend_after]
+    next_probe = [start] * count
+    wakes = [1] * count
+    up_after: List[Optional[float]] = [None] * count
+    pending = set(range(count))
+    while pending:
+        now = loop.time()
+        due = [idx for idx in sorted(pending) if next_probe[idx] <= now]
+        answers = await asyncio.gather(*(
+            _bounded_probe(limit, targets[idx][1].host, targets[idx][1].port,
+                           min(targets[idx][1].probe_timeout, max(deadlines[idx] - now, 0.0)))
+            for idx in due))
+        now = loop.time()
+        resend = []
+        for idx, answered in zip(due, answers):
+            verify = targets[idx][1]
+            if answered:
+                up_after[idx] = now - start
+                pending.discard(idx)
+            elif now >= deadlines[idx]:
+                pending.discard(idx)
+            else:
+                if now >= next_resend[idx]:
+                    resend.append(idx)
+                next_probe[idx] = now + min(verify.probe_interval, max(deadlines[idx] - now, 0.0))
+        if affinity is not None:
+            await asyncio.gather(*(_learn_route(affinity, targets[idx][0], targets[idx][1].host)
+                                   for idx, answered in zip(due, answers) if answered))
+        if resend:
+            # on all interfaces: if the first went out on a learned one, it may be stale
+            await async_wake_many([targets[idx][0] for idx in resend], pacer, repeat)
+            for idx in resend:
+                wakes[idx] += 1
+                resend_after[idx] = min(resend_after[idx] * 2, targets[idx][1].max_resend_after)
+                next_resend[idx] = now + resend_after[idx]
+        if pending:
+            await asyncio.sleep(max(min(next_probe[idx] for idx in pending) - loop.time(), 0.0))
+    return [VerifyResult(first, up, sent) for first, up, sent in zip(firsts, up_after, wakes)]
+
+
+async def async_wake_and_verify(targets: Iterable[Tuple[HostRecord, Verify]],
+                                pacer: Optional[Pacer] = None,
+                                repeat: Optional[Repeat] = None,
+                                affinity: Optional[AffinityCache] = None) -> List[VerifyResult]:
+    """Wake hosts, then probe each until it's up, resending while it's down.
+
+    `pacer` and `repeat` apply to every wake, first or resent. With an
+    `AffinityCache`, the interfaces hosts came up through are learned and
+    saved. Returns a `VerifyResult` for each (record, verify) pair, in the
+    same order.
+    """
+    loop = asyncio.get_running_loop()
+    targets = list(targets)
+    start = loop.time()
+    firsts = await async_wake_many((record for record, _ in targets), pacer, repeat, affinity)
+    verified = await _verify_all(targets, firsts, start, pacer, repeat, affinity)
+    if affinity is not None:
+        await loop.run_in_executor(None, affinity.save)
+    return verified
+
+
+def wake_and_verify(targets: Iterable[Tuple[HostRecord, Verify]],
+                    pacer: Optional[Pacer] = None, repeat: Optional[Repeat] = None,
+                    affinity: Optional[AffinityCache] = None) -> List[VerifyResult]:
+    """Blocking flavor of `async_wake_and_verify`"""
+    return asyncio.run(async_wake_and_verify(targets, pacer, repeat, affinity))
+
+
+def probe_many(targets: Sequence[Tuple[str, int]], timeout: float = 1.0) -> List[bool]:
+    """Blocking flavor of `async_probe_many`"""
+    return asyncio.run(async_probe_many(targets, timeout))
+
+
+async def _wait_up(record: HostRecord, verify: Verify, first: WakeResult,
+                   pacer: Optional[Pacer], repeat: Optional[Repeat],
+                   affinity: Optional[AffinityCache]) -> VerifyResult:
+    [verified] = await _verify_all([(record, verify)], [first], asyncio.get_running_loop().time(),
+                                   pacer, repeat, affinity)
+    return verified
+
+
+def wait_up(record: HostRecord, verify: Verify, first: Optional[WakeResult] = None,
+            pacer: Optional[Pacer] = None, repeat: Optional[Repeat] = None,
+            affinity: Optional[AffinityCache] = None) -> VerifyResult:
+    """Probe a host just woken with record until it's up, resending while it's down.
+
+    `first` is the `WakeResult` of that wake, e.g. as returned by `wake`.
+    With an `AffinityCache`, the interface the host came up through is
+    learned and saved.
+    """
+    if first is None:
+        first = WakeResult(record, [], {}, {}, {})
+    verified = asyncio.run(_wait_up(record, verify, first, pacer, repeat, affinity))
+    if affinity is not None:
+        affinity.save()
+    return verified
+
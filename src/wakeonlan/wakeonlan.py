@@ -3,19 +3,25 @@
 # license that can be found in the LICENSE.txt file or at
 # https://opensource.org/licenses/BSD-3-Clause
 
-"""Yet another wake-on-lan library"""
+"""Yet another wake-on-lan library
+
+Heavier modules (json, tempfile, re, pathlib) are imported on first use so
+that short commands like ``--version`` and library users that never touch
+the saved configuration don't pay for them.
+"""
 
 import sys
 import os
+import functools
 import socket
-import re
-import json
-import tempfile
-from pathlib import Path
-from typing import Any, Dict, Sequence, Tuple, Union, Optional, NamedTuple
+from typing import Any, Dict, Iterable, List, Mapping, Sequence, Tuple, Union, Optional, NamedTuple
 
 from .util import WakeOnLanError, print_error, print_warning
-from .interfaces import enum_interfaces, InterfaceAddress
+from .interfaces import enum_interfaces, interface_cache, InterfaceAddress
+from .pool import SocketPool
+from .pacing import Pacer, Repeat
+from .affinity import AffinityCache
+from . import ether, metrics
 
 VERSION = '2.0'
 
@@ -24,26 +30,81 @@ PROG = 'wakeonlan'
 DESCRIPTION = 'Send Wake-On-Lan packet to a given machine'
 
 USAGE = r'''
-%(prog)s MAC [-i INTERFACE_NAME] [-p PORT]
-%(prog)s NAME
-%(prog)s --save NAME MAC [-i INTERFACE_NAME] [-p PORT]
+%(prog)s MAC [-i INTERFACE_NAME] [-p PORT] [--host-ip IP[/PREFIX]] [--transport TRANSPORT] [PACING] [REPEAT] [--wait PORT --probe-host HOST [--wait-timeout SECONDS]]
+%(prog)s --ip IP_OR_HOST [-i INTERFACE_NAME] [-p PORT] [--transport TRANSPORT] [PACING] [REPEAT] [WAIT]
+%(prog)s NAME [PACING] [REPEAT] [WAIT]
+%(prog)s @GROUP [PACING] [REPEAT] [WAVES] [WAIT]
+%(prog)s --names-from FILE [PACING] [REPEAT] [WAVES] [WAIT]
+%(prog)s --save NAME MAC|--ip IP_OR_HOST [-i INTERFACE_NAME] [-p PORT] [--host-ip IP[/PREFIX]] [--transport TRANSPORT]
+%(prog)s --learn INTERFACE_NAME MAC|NAME
 %(prog)s --delete NAME
+%(prog)s --group GROUP NAME [NAME ...]
+%(prog)s --delete-group GROUP
+%(prog)s --groups
 %(prog)s --list
 %(prog)s --names
 %(prog)s --interfaces
+%(prog)s --serve [--metrics-port PORT]
+%(prog)s --migrate {json,sqlite}
+%(prog)s --import FILE
+%(prog)s --export FILE
 %(prog)s --autocomplete-source
 %(prog)s --version
 %(prog)s --help
+
+PACING: [--rate PPS] [--interface-rate PPS] [--burst N]
+REPEAT: --repeat N [--repeat-interval SECONDS]
+WAVES: --wave-size N [--wave-interval SECONDS] [--max-booting N]
+WAIT: --wait PORT [--probe-host HOST] [--wait-timeout SECONDS]
+
+Any wake also accepts --metrics-file FILE and --affinity.
 '''
 
 
 DEFAULT_IP = '255.255.255.255'
 DEFAULT_IP6 = 'ff02::1'
 DEFAULT_PORT = 9
-CONFIG_HOME = Path(os.environ.get('WAKEONLAN_HOME', Path.home()))
-CONFIG_PATH = CONFIG_HOME / '.wakeonlan'
-MAC_PATTERN = re.compile(r'[0-9A-Fa-f]{2}:[0-9A-Fa-f]{2}:[0-9A-Fa-f]{2}:[0-9A-Fa-f]{2}:[0-9A-Fa-f]{2}:[0-9A-Fa-f]{2}')
-IP_PATTERN = re.compile(r'(?:(?:25[0-5]|2[0-4][0-9]|[01]?[0-9][0-9]?)\.){3}(?:25[0-5]|2[0-4][0-9]|[01]?[0-9][0-9]?)')
+TRANSPORT_UDP = 'udp'
+TRANSPORT_ETHERNET = 'ethernet'
+TRANSPORT_ETHERNET_BROADCAST = 'ethernet-broadcast'
+TRANSPORTS = (TRANSPORT_UDP, TRANSPORT_ETHERNET, TRANSPORT_ETHERNET_BROADCAST)
+PAYLOAD_CACHE_SIZE = 4096
+_CONFIG_HOME = os.environ.get('WAKEONLAN_HOME', os.path.expanduser('~'))
+_CONFIG_PATH = os.path.join(_CONFIG_HOME, '.wakeonlan')
+
+@functools.lru_cache(maxsize=None)
+def _mac_pattern():
+    import re
+    return re.compile(r'[0-9A-Fa-f]{2}:[0-9A-Fa-f]{2}:[0-9A-Fa-f]{2}:[0-9A-Fa-f]{2}:[0-9A-Fa-f]{2}:[0-9A-Fa-f]{2}')
+
+@functools.lru_cache(maxsize=None)
+def _ip_pattern():
+    import re
+    return re.compile(r'(?:(?:25[0-5]|2[0-4][0-9]|[01]?[0-9][0-9]?)\.){3}(?:25[0-5]|2[0-4][0-9]|[01]?[0-9][0-9]?)')
+
+def _config_home() -> str:
+    """CONFIG_HOME, as assigned to this module if it was, as a string"""
+    return os.fspath(globals().get('CONFIG_HOME', _CONFIG_HOME))
+
+def _config_path() -> str:
+    """CONFIG_PATH, as assigned to this module if it was, as a string
+
+    Unless assigned itself, it follows CONFIG_HOME.
+    """
+    path = globals().get('CONFIG_PATH')
+    return os.path.join(_config_home(), '.wakeonlan') if path is None else os.fspath(path)
+
+def __getattr__(name: str) -> Any:
+    # CONFIG_HOME, CONFIG_PATH, MAC_PATTERN and IP_PATTERN are created on first access, unless
+    # assigned to; code reading the configuration goes through _config_home() and _config_path()
+    if name in ('CONFIG_HOME', 'CONFIG_PATH'):
+        from pathlib import Path
+        return Path(_config_home() if name == 'CONFIG_HOME' else _config_path())
+    if name == 'MAC_PATTERN':
+        return _mac_pattern()
+    if name == 'IP_PATTERN':
+        return _ip_pattern()
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
      
 
 WAKE_CMD            = 1
@@ -54,18 +115,36 @@ LIST_CMD            = 5
 NAMES_CMD           = 6
 IFACES_CMD          = 7
 AUTOC_SOURCE        = 8
+SERVE_CMD           = 9
+MIGRATE_CMD         = 10
+IMPORT_CMD          = 11
+EXPORT_CMD          = 12
+WAKE_GROUP_CMD      = 13
+SAVE_GROUP_CMD      = 14
+DELETE_GROUP_CMD    = 15
+GROUPS_CMD          = 16
+WAKE_NAMES_CMD      = 17
+LEARN_CMD           = 18
 
 MacAddress = Tuple[int,int,int,int,int,int]
 IPAddress = str
 Port = int
 SocketAddress = Union[Tuple[Any, ...], str, Any] #see socket._Address
 
+_PAYLOAD_PREFIX = b'\xff' * 6
+
 class HostRecord(NamedTuple):
     """Information about how to wake up a given host"""
     mac: MacAddress
     interface: Optional[str] = None
     address: Optional[IPAddress] = None
     port: Port = DEFAULT_PORT
+    transport: str = TRANSPORT_UDP
+    """`TRANSPORT_UDP`, or `TRANSPORT_ETHERNET` / `TRANSPORT_ETHERNET_BROADCAST` for raw
+    Ethernet frames to the host's MAC / to broadcast, sent over UDP where raw frames can't be"""
+    host_ip: Optional[str] = None
+    """The host's own IPv4 address, optionally with its prefix length (``192.168.1.20/24``).
+    Without an interface or address, it selects the interface on the host's subnet"""
 
     def mac_str(self):
         """MAC address in a string form"""
@@ -76,6 +155,39 @@ class HostRecord(NamedTuple):
         return self.interface if self.interface is not None else self.address if self.address is not None else '*'
 
 
+class WakeResult(NamedTuple):
+    """Outcome of a wake request for a single host"""
+    record: HostRecord
+    sent: List[str]
+    """Interface names or destination addresses the packet was sent to"""
+    errors: Dict[str, Exception]
+    """Failures keyed by interface name or destination address"""
+    timings: Dict[str, float]
+    """Seconds from the start of the send until each path attempted was done, sent or failed"""
+    bytes_sent: Dict[str, int]
+    """Bytes sent on each path attempted, repeated packets included"""
+
+    def succeeded(self) -> bool:
+        """Whether the packet went out on at least one path"""
+        return len(self.sent) != 0
+
+    def errnos(self) -> Dict[str, Optional[int]]:
+        """errno of each failure, None for failures other than OS errors such as an unknown interface"""
+        return {label: getattr(error, 'errno', None) for label, error in self.errors.items()}
+
+    def elapsed(self) -> float:
+        """Seconds from the start of the send until the last path was done"""
+        return max(self.timings.values(), default=0.0)
+
+
+def _parse_host_ip(host_ip: str) -> Any:
+    """`ipaddress.IPv4Interface` of an address with an optional prefix length, None if malformed"""
+    import ipaddress
+    try:
+        return ipaddress.IPv4Interface(host_ip)
+    except ValueError:
+        return None
+
 def _split_mac(mac: str) -> MacAddress:
     ret = tuple(int(x, 16) for x in mac.split(':'))
     assert len(ret) == 6
@@ -85,15 +197,20 @@ def _parse_args():
     import argparse
 
     def mac_address_or_name(string: str):
-        if MAC_PATTERN.fullmatch(string):
+        if _mac_pattern().fullmatch(string):
             return _split_mac(string)
         return string
     
     def ip_address(string: str):
-        if not IP_PATTERN.fullmatch(string):
+        if not _ip_pattern().fullmatch(string):
             raise argparse.ArgumentTypeError('invalid IPv4 address ' + string)
         return string
 
+    def host_ip(string: str):
+        if _parse_host_ip(string) is None:
+            raise argparse.ArgumentTypeError('invalid IPv4 address or subnet ' + string)
+        return string
+
     def port(string: str):
         try:
             val = int(string)
@@ -103,6 +220,42 @@ def _parse_args():
         except ValueError as ex:
             raise argparse.ArgumentTypeError('invalid port ' + string) from ex
 
+    def rate(string: str):
+        try:
+            val = float(string)
+            if not val > 0:
+                raise argparse.ArgumentTypeError('invalid rate ' + string)
+            return val
+        except ValueError as ex:
+            raise argparse.ArgumentTypeError('invalid rate ' + string) from ex
+
+    def burst(string: str):
+        try:
+            val = int(string)
+            if val < 1:
+                raise argparse.ArgumentTypeError('invalid burst ' + string)
+            return val
+        except ValueError as ex:
+            raise argparse.ArgumentTypeError('invalid burst ' + string) from ex
+
+    def positive_int(string: str):
+        try:
+            val = int(string)
+            if val < 1:
+                raise argparse.ArgumentTypeError('invalid count ' + string)
+            return val
+        except ValueError as ex:
+            raise argparse.ArgumentTypeError('invalid count ' + string) from ex
+
+    def seconds(string: str):
+        try:
+            val = float(string)
+            if not val >= 0:
+                raise argparse.ArgumentTypeError('invalid duration ' + string)
+            return val
+        except ValueError as ex:
+            raise argparse.ArgumentTypeError('invalid duration ' + string) from ex
+
     def exit_with_message(parser: argparse.ArgumentParser, message: str):
         print_error(message)
         parser.print_usage()
@@ -121,17 +274,74 @@ def _parse_args():
                              help='Deprecated, prefer the -i switch. Broadcast IPv4 address of the interface to use. (This is NOT the IP address of the machine you want to wake!)')
     flags_group.add_argument('-p', dest='port', type=port, 
                              help='Wake-On-Lan port')
+    flags_group.add_argument('--host-ip', dest='host_ip', type=host_ip, metavar='IP[/PREFIX]',
+                             help='IPv4 address of the machine to wake, optionally with its prefix length. Without -i, '
+                                  'the packet is broadcast only on the interface on that subnet')
+    flags_group.add_argument('--ip', dest='wake_ip', type=str, metavar='IP_OR_HOST',
+                             help='IP address or host name of the machine to wake instead of its MAC. The MAC is looked up '
+                                  'in the neighbor (ARP) table and in the MACs previously found there')
+    flags_group.add_argument('--transport', dest='transport', choices=TRANSPORTS,
+                             help='Send UDP packets (the default) or, on Linux with CAP_NET_RAW, raw Ethernet frames '
+                                  'addressed to the MAC or to broadcast. Falls back to UDP when raw frames cannot be sent')
+    flags_group.add_argument('--rate', dest='rate', type=rate, metavar='PPS',
+                             help='Send at most PPS packets per second in total')
+    flags_group.add_argument('--interface-rate', dest='interface_rate', type=rate, metavar='PPS',
+                             help='Send at most PPS packets per second through any one interface')
+    flags_group.add_argument('--burst', dest='burst', type=burst, metavar='N',
+                             help='Allow bursts of up to N packets above --rate/--interface-rate (default 1)')
+    flags_group.add_argument('--repeat', dest='repeat', type=positive_int, metavar='N',
+                             help='Send N packets to each host instead of one')
+    flags_group.add_argument('--repeat-interval', dest='repeat_interval', type=seconds, metavar='SECONDS',
+                             help='Space repeated packets SECONDS apart (default 0.1)')
+    flags_group.add_argument('--wait', dest='wait_port', type=port, metavar='PORT',
+                             help='After waking, wait until the host accepts (or refuses) TCP connections on PORT, '
+                                  'resending the wake packet while it is down. Saved names are probed as host names')
+    flags_group.add_argument('--probe-host', dest='probe_host', type=str, metavar='HOST',
+                             help='Address or name of the machine to probe with --wait')
+    flags_group.add_argument('--wait-timeout', dest='wait_timeout', type=seconds, metavar='SECONDS',
+                             help='Give up waiting after SECONDS (default 120)')
+    flags_group.add_argument('--affinity', action='store_true', dest='affinity',
+                             help='Send only through the interface learned for each host, falling back to all interfaces '
+                                  'if that fails. With --wait, learn the interface hosts come up through')
+    flags_group.add_argument('--metrics-file', dest='metrics_file', type=str, metavar='FILE',
+                             help='After waking, write OpenMetrics text describing the wake to FILE')
+    flags_group.add_argument('--metrics-port', dest='metrics_port', type=port, metavar='PORT',
+                             help='With --serve, serve OpenMetrics text on http://127.0.0.1:PORT/')
+    flags_group.add_argument('--wave-size', dest='wave_size', type=positive_int, metavar='N',
+                             help='When waking a group or names file, wake N hosts at a time')
+    flags_group.add_argument('--wave-interval', dest='wave_interval', type=seconds, metavar='SECONDS',
+                             help='Wait SECONDS between waves (default 30)')
+    flags_group.add_argument('--max-booting', dest='max_booting', type=positive_int, metavar='N',
+                             help='Never have more than N woken hosts booting at once')
     manage_group = flags_group.add_mutually_exclusive_group()
     manage_group.add_argument('--save', '-s', type=str, dest='save_name', metavar='NAME', 
                               help='Save wake arguments as NAME')
+    manage_group.add_argument('--learn', type=str, dest='learn_interface', metavar='INTERFACE_NAME',
+                              help='Remember that the given MAC or NAME is woken through INTERFACE_NAME, for --affinity')
     manage_group.add_argument('--delete', '-d', type=str, dest='delete_name', metavar='NAME', 
                               help='Delete saved NAME')
     manage_group.add_argument('--list', '-l', action='store_true', dest='list_definitions', 
                               help='List saved definitions')
     manage_group.add_argument('--names', '-n', action='store_true', dest='list_names', 
                               help='List saved names')
+    manage_group.add_argument('--names-from', type=str, dest='names_from', metavar='FILE',
+                              help='Wake the saved names listed in FILE, one per line (- for stdin)')
+    manage_group.add_argument('--group', type=str, nargs='+', dest='group_args', metavar='GROUP NAME',
+                              help='Save the given saved names as GROUP, woken together with @GROUP')
+    manage_group.add_argument('--delete-group', type=str, dest='delete_group', metavar='GROUP',
+                              help='Delete saved GROUP (its members are kept)')
+    manage_group.add_argument('--groups', action='store_true', dest='list_groups',
+                              help='List saved groups')
     manage_group.add_argument('--interfaces', action='store_true', dest='list_interfaces', 
                               help='List valid interfaces')
+    manage_group.add_argument('--serve', action='store_true', dest='serve',
+                              help='Run a resident daemon that subsequent invocations hand wake and list requests to')
+    manage_group.add_argument('--migrate', type=str, dest='migrate_to', choices=('json', 'sqlite'),
+                              help='Move saved names to the given storage backend')
+    manage_group.add_argument('--import', type=str, dest='import_path', metavar='FILE',
+                              help='Save all names from a .csv, .ndjson or .json inventory FILE (- for NDJSON on stdin)')
+    manage_group.add_argument('--export', type=str, dest='export_path', metavar='FILE',
+                              help='Write all saved names to a .csv, .ndjson or .json inventory FILE (- for NDJSON on stdout)')
     manage_group.add_argument('--autocomplete-source', action='store_true', dest='autocomplete_source', 
                               help='Print out path to a script suitable for sourcing into a shell to set up auto-complete')
     flags_group.add_argument('--version', action='version', version=f'%(prog)s {VERSION}')
@@ -141,16 +351,35 @@ def _parse_args():
 
     args = parser.parse_args()
 
+    if args.wake_ip is not None and args.mac_or_name is not None:
+        exit_with_message(parser, 'Cannot specify both MAC or NAME and --ip')
+
     if args.save_name is not None:
-        if not isinstance(args.mac_or_name, tuple):
+        if not isinstance(args.mac_or_name, tuple) and args.wake_ip is None:
             exit_with_message(parser, 'Must specify MAC address to save')
         args.cmd = SAVE_CMD
+    elif args.learn_interface is not None:
+        if args.mac_or_name is None or (isinstance(args.mac_or_name, str) and args.mac_or_name.startswith('@')):
+            exit_with_message(parser, 'Must specify MAC address or saved name to learn')
+        for value, desc in ((args.interface, '-i'), (args.ipaddr, '-a'), (args.port, '-p'),
+                            (args.transport, '--transport'), (args.host_ip, '--host-ip'), (args.wake_ip, '--ip')):
+            if value is not None:
+                exit_with_message(parser, f'argument {desc}: not allowed with --learn')
+        args.cmd = LEARN_CMD
     else:
         noopt_args = (
             (args.delete_name is not None, '--delete/-d', DELETE_CMD),
             (args.list_definitions, '--list/-l', LIST_CMD),
             (args.list_names, '--names/-n', NAMES_CMD),
+            (args.names_from is not None, '--names-from', WAKE_NAMES_CMD),
+            (args.group_args is not None, '--group', SAVE_GROUP_CMD),
+            (args.delete_group is not None, '--delete-group', DELETE_GROUP_CMD),
+            (args.list_groups, '--groups', GROUPS_CMD),
             (args.list_interfaces, '--interfaces', IFACES_CMD),
+            (args.serve, '--serve', SERVE_CMD),
+            (args.migrate_to is not None, '--migrate', MIGRATE_CMD),
+            (args.import_path is not None, '--import', IMPORT_CMD),
+            (args.export_path is not None, '--export', EXPORT_CMD),
             (args.autocomplete_source, '--autocomplete-source', AUTOC_SOURCE)
         )
         for test, desc, cmd in noopt_args:
@@ -163,14 +392,22 @@ def _parse_args():
                     exit_with_message(parser, f'argument -a: not allowed with argument with {desc}')
                 if args.port is not None:
                     exit_with_message(parser, f'argument -p: not allowed with argument with {desc}')
+                if args.transport is not None:
+                    exit_with_message(parser, f'argument --transport: not allowed with {desc}')
+                if args.host_ip is not None:
+                    exit_with_message(parser, f'argument --host-ip: not allowed with {desc}')
+                if args.wake_ip is not None:
+                    exit_with_message(parser, f'argument --ip: not allowed with {desc}')
                 args.cmd = cmd
                 break
+        if args.cmd == SAVE_GROUP_CMD and len(args.group_args) < 2:
+            exit_with_message(parser, 'Must specify group name and at least one saved name')
 
 
     if args.cmd == 0:
-        if args.mac_or_name is None: 
+        if args.mac_or_name is None and args.wake_ip is None:
             exit_with_message(parser, 'MAC or name is required')
-        if isinstance(args.mac_or_name, tuple): 
+        if isinstance(args.mac_or_name, tuple) or args.wake_ip is not None:
             args.cmd = WAKE_CMD
         else:
             if args.interface is not None:
@@ -179,92 +416,132 @@ def _parse_args():
                 exit_with_message(parser, 'Cannot specify broadcast address with name')
             if args.port is not None:
                 exit_with_message(parser, 'Cannot specify port with name')
-            args.cmd = WAKE_BY_NAME_CMD
+            if args.transport is not None:
+                exit_with_message(parser, 'Cannot specify transport with name')
+            if args.host_ip is not None:
+                exit_with_message(parser, 'Cannot specify host ip with name')
+            args.cmd = WAKE_GROUP_CMD if args.mac_or_name.startswith('@') else WAKE_BY_NAME_CMD
 
     if args.ipaddr is not None:
         if args.interface is not None:
             exit_with_message(parser, 'Cannot specify both interface and broadcast address')
+        if args.transport not in (None, TRANSPORT_UDP):
+            exit_with_message(parser, 'Cannot specify broadcast address with an Ethernet transport')
         print_warning('-a option is deprecated')
 
+    if args.wait_port is None:
+        for value, desc in ((args.probe_host, '--probe-host'), (args.wait_timeout, '--wait-timeout')):
+            if value is not None:
+                exit_with_message(parser, f'argument {desc}: requires --wait')
+    elif args.cmd not in (WAKE_CMD, WAKE_BY_NAME_CMD, WAKE_GROUP_CMD, WAKE_NAMES_CMD):
+        exit_with_message(parser, 'argument --wait: only allowed when waking')
+    elif args.cmd == WAKE_CMD and args.probe_host is None:
+        if args.wake_ip is not None:
+            args.probe_host = args.wake_ip
+        elif args.host_ip is not None:
+            args.probe_host = args.host_ip.split('/')[0]
+        else:
+            exit_with_message(parser, 'argument --wait: requires --probe-host or --host-ip when waking a MAC address')
+    elif args.cmd in (WAKE_GROUP_CMD, WAKE_NAMES_CMD) and args.probe_host is not None:
+        exit_with_message(parser, 'argument --probe-host: not allowed when waking many hosts')
+
+    if args.cmd not in (WAKE_GROUP_CMD, WAKE_NAMES_CMD):
+        for value, desc in ((args.wave_size, '--wave-size'), (args.wave_interval, '--wave-interval'),
+                            (args.max_booting, '--max-booting')):
+            if value is not None:
+                exit_with_message(parser, f'argument {desc}: only allowed when waking a group or names file')
+    elif args.wave_size is None and (args.wave_interval is not None or args.max_booting is not None):
+        exit_with_message(parser, '--wave-interval and --max-booting require --wave-size')
+
+    if args.cmd not in (WAKE_CMD, WAKE_BY_NAME_CMD, WAKE_GROUP_CMD, WAKE_NAMES_CMD):
+        for value, desc in ((args.rate, '--rate'), (args.interface_rate, '--interface-rate'),
+                            (args.burst, '--burst')):
+            if value is not None:
+                exit_with_message(parser, f'argument {desc}: only allowed when waking')
+    elif args.burst is not None and args.rate is None and args.interface_rate is None:
+        exit_with_message(parser, 'argument --burst: requires --rate or --interface-rate')
+
+    if args.metrics_port is not None and args.cmd != SERVE_CMD:
+        exit_with_message(parser, 'argument --metrics-port: only allowed with --serve')
+
+    if args.cmd not in (WAKE_CMD, WAKE_BY_NAME_CMD, WAKE_GROUP_CMD, WAKE_NAMES_CMD):
+        for value, desc in ((args.repeat, '--repeat'), (args.repeat_interval, '--repeat-interval'),
+                            (args.metrics_file, '--metrics-file'), (args.affinity or None, '--affinity')):
+            if value is not None:
+                exit_with_message(parser, f'argument {desc}: only allowed when waking')
+    elif args.repeat_interval is not None and args.repeat is None:
+        exit_with_message(parser, 'argument --repeat-interval: requires --repeat')
+
     if args.cmd == SAVE_CMD or args.cmd == WAKE_CMD:
         args.port = DEFAULT_PORT if args.port is None else args.port
+        args.transport = TRANSPORT_UDP if args.transport is None else args.transport
 
     return args
 
 
 def _select_address(addresses: Sequence[InterfaceAddress]) ->Optional[InterfaceAddress]:
     selected: Optional[InterfaceAddress] = None
-    for idx, family, addr in addresses:
-        if family == socket.AF_INET:
-            selected = (idx, family, addr)
+    for address in addresses:
+        if address[1] == socket.AF_INET:
+            selected = address
             break
 
     if selected is None:
-        for idx, family, addr in addresses:
-            if family == socket.AF_INET6:
-                selected = (idx, family, addr)
+        for address in addresses:
+            if address[1] == socket.AF_INET6:
+                selected = address
                 break
     
     return selected
 
-def _payload(mac: MacAddress):
-    payload = bytearray(17 * 6)
-    for i in range(6):
-        payload[i] = 0xFF
-    for i in range(6, len(payload), 6):
-        payload[i:i+6] = mac
-    return payload
-
-def _wake_with_dest(mac: MacAddress, addr: SocketAddress) -> None :
-    """wake a machine at a given MAC and IP(v6) address"""
-    
-    payload = _payload(mac)
-
-    host, port = addr
-    family, socktype, proto, _, sockaddr = socket.getaddrinfo(
-        host, port, type=socket.SOCK_DGRAM)[0]
-    with socket.socket(family, socktype, proto) as sock:
-        if family == socket.AF_INET:
-            sock.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
-        sock.sendto(payload, sockaddr)
-
-def _wake_on_interface(mac: MacAddress, address: InterfaceAddress, port: int):
-    """wake a machine at a given MAC using a given interface"""
-
-    payload = _payload(mac)
+@functools.lru_cache(maxsize=PAYLOAD_CACHE_SIZE)
+def _payload(mac: MacAddress) -> bytes:
+    """magic packet for a given MAC, built once and shared by all send paths"""
+    return _PAYLOAD_PREFIX + bytes(mac) * 16
 
-    idx, family, addr = address
-
-    with socket.socket(family, socket.SOCK_DGRAM, socket.IPPROTO_UDP) as sock:
-        if family == socket.AF_INET:
-            sock.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
-            sock.bind((addr, 0))
-            sock.sendto(payload, (DEFAULT_IP, port))
-        else:
-            sock.setsockopt(socket.IPPROTO_IPV6, socket.IPV6_MULTICAST_IF, idx)
-            sock.sendto(payload, (DEFAULT_IP6, port))
+def _interface_dest(address: InterfaceAddress, port: int) -> SocketAddress:
+    """broadcast/multicast destination for sending from a given interface address"""
+    _, family, _ = address
+    return (DEFAULT_IP, port) if family == socket.AF_INET else (DEFAULT_IP6, port)
 
 
 def _load_config() -> Dict[Any, Any]:
+    collector = metrics.collector
+    if collector is None:
+        return _read_config()
+    import time
+    start = time.perf_counter()
     try:
-        with open(CONFIG_PATH, 'rt', encoding='utf-8') as config:
+        return _read_config()
+    finally:
+        collector.config_load_seconds.observe(time.perf_counter() - start)
+
+def _read_config() -> Dict[Any, Any]:
+    import json
+    path = _config_path()
+    try:
+        with open(path, 'rt', encoding='utf-8') as config:
             config = json.load(config)
             if not isinstance(config, dict):
-                raise WakeOnLanError(f'{CONFIG_PATH} is malformed')
+                raise WakeOnLanError(f'{path} is malformed')
             return config # type: ignore
     except json.JSONDecodeError as ex:
-        raise WakeOnLanError(f'{CONFIG_PATH} is malformed') from ex
+        raise WakeOnLanError(f'{path} is malformed') from ex
     except OSError:
         pass
     return {'names':{}}
 
 def _save_config(config: Dict[Any, Any]):
+    import json
+    import tempfile
+    path = _config_path()
     tmp_path = None
     try:
-        with tempfile.NamedTemporaryFile(dir=CONFIG_HOME, mode='wt', encoding='utf-8', delete=False) as f:
+        with tempfile.NamedTemporaryFile(dir=os.path.dirname(os.path.abspath(path)), mode='wt',
+                                         encoding='utf-8', delete=False) as f:
             tmp_path = f.name
             json.dump(config, f, indent=2)
-        os.replace(tmp_path, CONFIG_PATH)
+        os.replace(tmp_path, path)
         tmp_path = None
     except OSError as err:
         raise WakeOnLanError(f'Unable to save: {err.strerror}') from err
@@ -278,55 +555,66 @@ def _save_config(config: Dict[Any, Any]):
 def _get_names_dict(config: Dict[Any, Any]) -> Dict[Any, Any]:
     names = config.get('names')
     if not isinstance(names, dict):
-        raise WakeOnLanError(f'`names` not found in {CONFIG_PATH}')
+        raise WakeOnLanError(f'`names` not found in {_config_path()}')
     return names # type: ignore
 
-def _parse_name_record(name: str, name_record: Dict[Any, Any]) -> HostRecord:
+def _get_groups_dict(config: Dict[Any, Any], source: Optional[str] = None) -> Dict[str, List[str]]:
+    groups = config.get('groups', {})
+    if not isinstance(groups, dict) or not all(
+            isinstance(members, list) and all(isinstance(name, str) for name in members)
+            for members in groups.values()):
+        raise WakeOnLanError(f'`groups` in {_config_path() if source is None else source} is malformed')
+    return groups # type: ignore
+
+def _parse_name_record(name: str, name_record: Dict[Any, Any], source: Optional[str] = None) -> HostRecord:
+    if source is None:
+        source = _config_path()
     if not isinstance(name_record, dict): 
-        raise WakeOnLanError(f'`{name}` entry in {CONFIG_PATH} is malformed')
+        raise WakeOnLanError(f'`{name}` entry in {source} is malformed')
     mac = name_record.get('mac')
-    if not isinstance(mac, str) or not MAC_PATTERN.fullmatch(mac):
-        raise WakeOnLanError(f'mac address in `{name}` entry in {CONFIG_PATH} is missing or malformed')
+    if not isinstance(mac, str) or not _mac_pattern().fullmatch(mac):
+        raise WakeOnLanError(f'mac address in `{name}` entry in {source} is missing or malformed')
     mac = _split_mac(mac)
     ip = name_record.get('ip', DEFAULT_IP)
-    if not isinstance(ip, str) or not IP_PATTERN.fullmatch(ip):
-        raise WakeOnLanError(f'ip address in `{name}` entry in {CONFIG_PATH} is malformed')
+    if not isinstance(ip, str) or not _ip_pattern().fullmatch(ip):
+        raise WakeOnLanError(f'ip address in `{name}` entry in {source} is malformed')
     if ip == DEFAULT_IP:
         ip = None
     iface = name_record.get('interface')
     if iface is not None:
         if not isinstance(iface, str) or not iface:
-            raise WakeOnLanError(f'interface in `{name}` entry in {CONFIG_PATH} is malformed')
+            raise WakeOnLanError(f'interface in `{name}` entry in {source} is malformed')
         ip = None
     port = name_record.get('port', DEFAULT_PORT)
     if not isinstance(port, int) or port < 0 or port > 65535:
-        raise WakeOnLanError(f'port address in `{name}` entry in {CONFIG_PATH} is malformed')
+        raise WakeOnLanError(f'port address in `{name}` entry in {source} is malformed')
+    transport = name_record.get('transport', TRANSPORT_UDP)
+    if transport not in TRANSPORTS:
+        raise WakeOnLanError(f'transport in `{name}` entry in {source} is malformed')
+    if transport != TRANSPORT_UDP:
+        ip = None
+    host_ip = name_record.get('host_ip')
+    if host_ip is not None and (not isinstance(host_ip, str) or _parse_host_ip(host_ip) is None):
+        raise WakeOnLanError(f'host ip in `{name}` entry in {source} is malformed')
     
-    return HostRecord(mac, iface, ip, port)
+    return HostRecord(mac, iface, ip, port, transport, host_ip)
+
+def _check_name(name: str, source: Optional[str] = None) -> None:
+    if name.startswith('@'):
+        where = '' if source is None else f' in {source}'
+        raise WakeOnLanError(f'Name {name}{where} must not start with @, which marks a group')
 
 def get_name_record(name: str) -> Optional[HostRecord]:
     """Get stored record"""
-    config = _load_config()
-    names = _get_names_dict(config)
-    name_record = names.get(name)
-    if name_record is None:
-        return None
-    return _parse_name_record(name, name_record)
+    from .inventory import get_backend
+    return get_backend().get(name)
 
 def get_names() -> Dict[str, HostRecord] :
     """Retrieve all stored records"""
-    config = _load_config()
-    names = _get_names_dict(config)
-    ret: Dict[str, HostRecord] = {}
-    for name, name_record in names.items():
-        ret[name] = _parse_name_record(name, name_record)
-    return ret
-
+    from .inventory import get_backend
+    return get_backend().get_all()
 
-def save_name(name: str, host_record: HostRecord) -> None :
-    """Save record"""
-    config = _load_config()
-    names = _get_names_dict(config)
+def _make_name_record(host_record: HostRecord) -> Dict[str, Any]:
     record: Dict[str, Any] = {
         'mac': host_record.mac_str()
     }
@@ -336,72 +624,344 @@ def save_name(name: str, host_record: HostRecord) -> None :
         record['ip'] = host_record.address
     if host_record.port != DEFAULT_PORT:
         record['port'] = host_record.port
-    names[name] = record
-    _save_config(config)
+    if host_record.transport != TRANSPORT_UDP:
+        record['transport'] = host_record.transport
+    if host_record.host_ip is not None:
+        record['host_ip'] = host_record.host_ip
+    return record
+
+def save_name(name: str, host_record: HostRecord) -> None :
+    """Save record"""
+    from .inventory import get_backend
+    _check_name(name)
+    get_backend().save(name, host_record)
 
 def delete_name(name: str) -> None :
     """Delete saved record"""
-    config = _load_config()
-    names = _get_names_dict(config)
-    names.pop(name, None)
-    _save_config(config)
-
-
-def wake(record: HostRecord):
-    """wake the entry given by the record"""
-    mac, iface, ipaddr, port = record
-    ifaces = enum_interfaces()
-    if iface is not None:
-        src = ifaces.get(iface)
+    from .inventory import get_backend
+    get_backend().delete(name)
+
+def get_groups() -> Dict[str, List[str]] :
+    """Retrieve all stored groups as group name -> member names"""
+    from .inventory import get_backend
+    return get_backend().get_groups()
+
+def save_group(group: str, names: Iterable[str]) -> None :
+    """Save a group of saved names, replacing any group of the same name"""
+    from .inventory import get_backend
+    backend = get_backend()
+    members = list(dict.fromkeys(names))
+    if not members:
+        raise WakeOnLanError(f'Group {group} must have at least one member')
+    saved = backend.get_all()
+    missing = [name for name in members if name not in saved]
+    if missing:
+        raise WakeOnLanError(f'Name(s) not found: {", ".join(missing)}')
+    backend.save_group(group, members)
+
+def delete_group(group: str) -> None :
+    """Delete a saved group, keeping its members"""
+    from .inventory import get_backend
+    get_backend().delete_group(group)
+
+def save_names(records: Mapping[str, HostRecord]) -> None :
+    """Save many records with a single write"""
+    from .inventory import get_backend
+    for name in records:
+        _check_name(name)
+    get_backend().apply(records)
+
+def delete_names(names: Iterable[str]) -> None :
+    """Delete many saved records with a single write"""
+    from .inventory import get_backend
+    get_backend().apply(dict.fromkeys(names))
+
+def _uses_ether(record: HostRecord) -> bool:
+    """whether the record's packets go out as raw Ethernet frames"""
+    return record.transport != TRANSPORT_UDP and ether.available()
+
+def _wake_target(record: HostRecord) -> str:
+    """where a wake for the record goes, for display to the user"""
+    if record.interface is not None:
+        return record.interface
+    if record.address is not None:
+        return record.address
+    if record.host_ip is not None:
+        return f'subnet of {record.host_ip}'
+    return 'all valid interfaces'
+
+def wake(record: HostRecord, pool: Optional[SocketPool] = None, pacer: Optional[Pacer] = None,
+         repeat: Optional[Repeat] = None, affinity: Optional[AffinityCache] = None) -> WakeResult:
+    """wake the entry given by the record
+    
+    Returns a `WakeResult` with each interface or address the packet was
+    sent to or failed on, the bytes sent, the errors and how long each took.
+    Nothing is printed and send failures are recorded in the result rather
+    than raised. Raises `WakeOnLanError` if the record names an interface
+    that doesn't exist or has no usable address.
+
+    If a `SocketPool` is given, sockets are taken from it and left open for
+    subsequent calls instead of being created and closed on every call. If a
+    `Pacer` is given, packets are sent no faster than it allows. `repeat`
+    sets how many packets go out and how sends failing with a transient
+    error are retried; by default one packet is sent and retried up to 3
+    times. Without an interface or address, the packet is broadcast on the
+    interface on the subnet of the record's `host_ip` or, failing that, on
+    all interfaces at once. Given an `AffinityCache` that has learned an
+    interface for the MAC, the packet goes out only there, and on all
+    interfaces only if that send fails.
+
+    Records with an Ethernet `transport` are sent as raw frames where the
+    process may (see `wakeonlan.ether`) and as UDP packets otherwise.
+    """
+    from .bulk import _select_addresses, _send_with_fallback, _subnets
+    result = WakeResult(record, [], {}, {}, {})
+    subnets: List[Any] = []
+    if record.interface is not None and _uses_ether(record):
+        # frames name the interface directly; it doesn't need an address
+        selected = {}
+    elif record.interface is not None:
+        src = interface_cache.get().get(record.interface)
         if src is None:
-            raise WakeOnLanError(f'Interface `{iface}` not found or has no usable addresses')
+            raise WakeOnLanError(f'Interface `{record.interface}` not found or has no usable addresses')
         address = _select_address(src)
         if address is None:
-            raise WakeOnLanError(f'Interface `{iface}` has no usable IPv4 or IPv6 address')
-        print(f'wake: {record.mac_str()}, {iface}, {port}')
-        try:
-            _wake_on_interface(mac, address, port)
-        except OSError as ex:
-            print_error(f'sending failed: {ex}')
-    elif ipaddr is not None:
-        print(f'wake: {record.mac_str()}, {ipaddr}, {port}')
-        try:
-            _wake_with_dest(mac, (ipaddr, port))
-        except OSError as ex:
-            print_error(f'sending failed: {ex}')
+            raise WakeOnLanError(f'Interface `{record.interface}` has no usable IPv4 or IPv6 address')
+        selected = {record.interface: address}
+    elif record.address is None:
+        ifaces = interface_cache.get()
+        selected = _select_addresses(ifaces)
+        if record.host_ip is not None:
+            subnets = _subnets(ifaces)
     else:
-        print(f'wake: {record.mac_str()}, all valid interfaces, {port}')
-        errors = {}
-        for name, src in ifaces.items():
-            address = _select_address(src)
-            if address is None:
-                continue
-            try:
-                _wake_on_interface(mac, address, port)
-            except OSError as ex:
-                errors[name] = ex
-        for name, error in errors.items():
-            print_error(f'sending on {name} failed: {error}')
+        selected = {}
+    _send_with_fallback([result], selected, subnets, affinity, pool, pacer, repeat)
+    return result
+
+def _print_wake(record: HostRecord, errors: Mapping[str, Any]):
+    """print what a wake did, with errors given as exceptions or messages"""
+    print(f'wake: {record.mac_str()}, {_wake_target(record)}, {record.transport if _uses_ether(record) else record.port}')
+    for label, error in errors.items():
+        if record.interface is None and record.address is None:
+            print_error(f'sending on {label} failed: {error}')
+        else:
+            print_error(f'sending failed: {error}')
+
+def _forward_to_daemon(args) -> bool:
+    """run the command via a running daemon if there is one, return whether it was"""
+    from .client import request
+
+    if args.cmd in (WAKE_CMD, WAKE_BY_NAME_CMD):
+        if args.cmd == WAKE_CMD:
+            if args.ipaddr == DEFAULT_IP:
+                # saved-configuration format can't express an explicit default broadcast
+                return False
+            record = HostRecord(args.mac_or_name, args.interface, args.ipaddr, args.port, args.transport, args.host_ip)
+            req = {'cmd': 'wake', 'records': [_make_name_record(record)]}
+        else:
+            req = {'cmd': 'wake', 'names': [args.mac_or_name]}
+        response = request(req)
+        if response is None:
+            return False
+        result = response['results'][0]
+        if 'error' in result:
+            raise WakeOnLanError(result['error'])
+        record = _parse_name_record(args.mac_or_name, result['record'])
+        errors: Dict[str, Any] = result['errors']
+        for error in errors.values():
+            if error['fatal']:
+                raise WakeOnLanError(error['message'])
+        _print_wake(record, {label: error['message'] for label, error in errors.items()})
+        return True
+
+    response = request({'cmd': 'list'})
+    if response is None:
+        return False
+    for name, name_record in response['names'].items():
+        if args.cmd == LIST_CMD:
+            name_record = _parse_name_record(name, name_record)
+            print(f'{name} - {name_record.mac_str()}, {name_record.interface_name()}, {name_record.port}')
+        else:
+            print(name)
+    return True
+
+def _read_names_file(path: str) -> List[str]:
+    """names listed one per line, skipping blank lines and # comments"""
+    try:
+        if path == '-':
+            lines = sys.stdin.readlines()
+        else:
+            with open(path, 'rt', encoding='utf-8') as names_file:
+                lines = names_file.readlines()
+    except OSError as err:
+        raise WakeOnLanError(f'Unable to read {path}: {err.strerror}') from err
+    return [line.strip() for line in lines if line.strip() and not line.lstrip().startswith('#')]
+
+def _probe_host(name: str, record: HostRecord) -> str:
+    """what --wait probes for a saved record: the address in its host ip if set, else the name"""
+    if record.host_ip is not None:
+        return record.host_ip.split('/')[0]
+    return name
+
+def _wake_members(members: List[Tuple[str, HostRecord]], args, pacer: Optional[Pacer], repeat: Optional[Repeat],
+                  affinity: Optional[AffinityCache]) -> Tuple[Dict[str, WakeResult], Dict[str, Optional[float]]]:
+    """wake named records as one batch or, with --wave-size, in waves reported as they go
+
+    Returns the wake results and, with --wait, the seconds each host took to come up.
+    """
+    import time
+    wait_timeout = 120.0 if args.wait_timeout is None else args.wait_timeout
+    if args.wave_size is None:
+        if args.wait_port is None:
+            from .bulk import wake_many
+            results = wake_many((rec for _, rec in members), pacer=pacer, repeat=repeat, affinity=affinity)
+            return {name: result for (name, _), result in zip(members, results)}, {}
+        from .verify import Verify, wake_and_verify
+        verified = wake_and_verify(((rec, Verify(_probe_host(name, rec), args.wait_port, wait_timeout))
+                                    for name, rec in members),
+                                   pacer, repeat, affinity)
+        return ({name: res.result for (name, _), res in zip(members, verified)},
+                {name: res.up_after for (name, _), res in zip(members, verified)})
+
+    from .waves import wake_in_waves
+    from .affinity import route_interface
+    records = dict(members)
+    woken_at: Dict[str, float] = {}
+    ups: Dict[str, Optional[float]] = {}
+    def progress(event):
+        now = time.monotonic()
+        if event.kind == 'wave':
+            woken_at.update(dict.fromkeys(event.names, now))
+            print(f'wave {event.wave}: {len(event.names)} hosts woken, '
+                  f'{event.pending} pending, {event.booting} booting', flush=True)
+        elif event.kind == 'up':
+            ups.update((name, now - woken_at[name]) for name in event.names)
+            if affinity is not None:
+                for name in event.names:
+                    interface = route_interface(name)
+                    if interface is not None:
+                        affinity.learn(records[name].mac_str(), interface)
+    is_up = None
+    if args.wait_port is not None:
+        from .verify import probe_many
+        def is_up(booting):
+            answered = probe_many([(_probe_host(name, records[name]), args.wait_port) for name, _ in booting])
+            return [name for (name, _), ok in zip(booting, answered) if ok]
+    interval = 30.0 if args.wave_interval is None else args.wave_interval
+    results = wake_in_waves(members, args.wave_size, interval, args.max_booting,
+                            boot_time=wait_timeout if is_up is not None else None, is_up=is_up,
+                            on_progress=progress, pacer=pacer, repeat=repeat, affinity=affinity)
+    if affinity is not None:
+        affinity.save()
+    if is_up is not None:
+        ups = {name: ups.get(name) for name in results}
+    return results, ups
 
 def main() -> int:
     """script entry point"""
     args = _parse_args()
 
+    verify = None
+    if args.wait_port is not None and args.cmd in (WAKE_CMD, WAKE_BY_NAME_CMD):
+        from .verify import Verify
+        verify = Verify(args.probe_host if args.probe_host is not None else args.mac_or_name,
+                        args.wait_port, 120.0 if args.wait_timeout is None else args.wait_timeout)
+
+    pacer = None
+    if args.cmd in (WAKE_CMD, WAKE_BY_NAME_CMD, WAKE_GROUP_CMD, WAKE_NAMES_CMD) and \
+            (args.rate is not None or args.interface_rate is not None):
+        burst = 1 if args.burst is None else args.burst
+        pacer = Pacer(args.rate, burst, args.interface_rate, burst)
+
+    repeat = None
+    if args.repeat is not None:
+        repeat = Repeat(args.repeat, 0.1 if args.repeat_interval is None else args.repeat_interval)
+
+    affinity = AffinityCache() if args.affinity else None
+
     try:
 
-        if args.cmd == WAKE_CMD:
-            wake(HostRecord(args.mac_or_name, args.interface, args.ipaddr, args.port))
-        elif args.cmd == WAKE_BY_NAME_CMD:
-            name_record = get_name_record(args.mac_or_name)
-            if name_record is None:
-                raise WakeOnLanError(f'Name {args.mac_or_name} not found')
-            wake(name_record)
+        if args.metrics_file is not None:
+            metrics.enable()
+
+        if args.wake_ip is not None:
+            from .neighbors import _resolve_mac, _host_ip
+            args.mac_or_name, wake_ip = _resolve_mac(args.wake_ip, None)
+            if args.host_ip is None:
+                args.host_ip = _host_ip(wake_ip, args.interface, args.ipaddr)
+
+        # the daemon neither paces, repeats, waits, uses affinity nor reports metrics, so such wakes are always done here
+        if args.cmd in (WAKE_CMD, WAKE_BY_NAME_CMD, LIST_CMD, NAMES_CMD) and pacer is None and repeat is None and \
+                verify is None and affinity is None and args.metrics_file is None and _forward_to_daemon(args):
+            return 0
+
+        status = 0
+        up_after = None
+        if args.cmd in (WAKE_CMD, WAKE_BY_NAME_CMD):
+            if args.cmd == WAKE_CMD:
+                name_record = HostRecord(args.mac_or_name, args.interface, args.ipaddr, args.port, args.transport, args.host_ip)
+            else:
+                name_record = get_name_record(args.mac_or_name)
+                if name_record is None:
+                    raise WakeOnLanError(f'Name {args.mac_or_name} not found')
+                if verify is not None and args.probe_host is None:
+                    verify = verify._replace(host=_probe_host(args.mac_or_name, name_record))
+            if name_record.transport != TRANSPORT_UDP and not ether.available():
+                print_warning('raw Ethernet frames cannot be sent (this needs Linux and CAP_NET_RAW), sending UDP packets instead')
+            result = wake(name_record, pacer=pacer, repeat=repeat, affinity=affinity)
+            _print_wake(name_record, result.errors)
+            if verify is not None:
+                from .verify import wait_up
+                up_after = wait_up(name_record, verify, result, pacer, repeat, affinity).up_after
+        elif args.cmd in (WAKE_GROUP_CMD, WAKE_NAMES_CMD):
+            from .bulk import group_members, _saved_records
+            if args.cmd == WAKE_GROUP_CMD:
+                target = args.mac_or_name
+                members = group_members(target[1:])
+            else:
+                target = args.names_from
+                members = _saved_records(_read_names_file(args.names_from), 'Name(s) not found')
+            results, ups = _wake_members(members, args, pacer, repeat, affinity)
+            failed = [name for name, result in results.items() if not result.succeeded()]
+            print(f'wake: {target}, {len(results)} hosts, {len(results) - len(failed)} sent, {len(failed)} failed')
+            for name in failed:
+                for label, error in results[name].errors.items():
+                    print_error(f'sending to {name} via {label} failed: {error}')
+            if args.wait_port is not None:
+                down = [name for name, up in ups.items() if up is None]
+                print(f'up: {len(ups) - len(down)} of {len(ups)} hosts')
+                for name in down:
+                    print_error(f'{name} is not up after {120.0 if args.wait_timeout is None else args.wait_timeout:g}s')
+                if down:
+                    status = 1
         elif args.cmd == SAVE_CMD:
-            save_name(args.save_name, HostRecord(args.mac_or_name, args.interface, args.ipaddr, args.port))
+            save_name(args.save_name, HostRecord(args.mac_or_name, args.interface, args.ipaddr, args.port, args.transport, args.host_ip))
             print(f'Name {args.save_name} saved')
+        elif args.cmd == LEARN_CMD:
+            if isinstance(args.mac_or_name, tuple):
+                name_record = HostRecord(args.mac_or_name)
+            else:
+                name_record = get_name_record(args.mac_or_name)
+                if name_record is None:
+                    raise WakeOnLanError(f'Name {args.mac_or_name} not found')
+            if args.learn_interface not in interface_cache.get():
+                raise WakeOnLanError(f'Interface `{args.learn_interface}` not found or has no usable addresses')
+            learned = AffinityCache()
+            learned.learn(name_record.mac_str(), args.learn_interface)
+            learned.save()
+            print(f'{name_record.mac_str()} learned on {args.learn_interface}')
         elif args.cmd == DELETE_CMD:
             delete_name(args.delete_name)
             print(f'Name {args.delete_name} deleted')
+        elif args.cmd == SAVE_GROUP_CMD:
+            save_group(args.group_args[0], args.group_args[1:])
+            print(f'Group {args.group_args[0]} saved')
+        elif args.cmd == DELETE_GROUP_CMD:
+            delete_group(args.delete_group)
+            print(f'Group {args.delete_group} deleted')
+        elif args.cmd == GROUPS_CMD:
+            for group, members in get_groups().items():
+                print(f'{group} - {", ".join(members)}')
         elif args.cmd == LIST_CMD:
             names = get_names()
             for name, name_record in names.items():
@@ -414,12 +974,49 @@ def main() -> int:
             ifaces = enum_interfaces()
             for iface in ifaces:
                 print(iface)
+        elif args.cmd == SERVE_CMD:
+            from .daemon import serve
+            serve(args.metrics_port)
+        elif args.cmd == MIGRATE_CMD:
+            from .inventory import migrate
+            count = migrate(args.migrate_to)
+            print(f'Migrated {count} names to {args.migrate_to}')
+        elif args.cmd in (IMPORT_CMD, EXPORT_CMD):
+            import time
+            from .transfer import import_names, export_names
+            start = time.perf_counter()
+            if args.cmd == IMPORT_CMD:
+                count = import_names(args.import_path)
+                verb = 'Imported'
+            else:
+                count = export_names(args.export_path)
+                verb = 'Exported'
+            elapsed = time.perf_counter() - start
+            rate = count / elapsed if elapsed > 0 else 0.0
+            # keep stdout clean when it carries the exported data
+            out = sys.stderr if args.export_path == '-' else sys.stdout
+            print(f'{verb} {count} names in {elapsed:.2f}s ({rate:.0f} rows/sec)', file=out)
         elif args.cmd == AUTOC_SOURCE:
             if os.environ.get('PSMODULEPATH') is not None:
-                print(str(Path(__file__).parent / 'autocomplete.ps1'))
+                print(os.path.join(os.path.dirname(__file__), 'autocomplete.ps1'))
             else:
-                print(str(Path(__file__).parent / 'autocomplete.sh'))
-        return 0
+                print(os.path.join(os.path.dirname(__file__), 'autocomplete.sh'))
+        if verify is not None:
+            if up_after is None:
+                print_error(f'{verify.host} is not up after {verify.timeout:g}s')
+                status = 1
+            else:
+                print(f'up: {verify.host} after {up_after:.1f}s')
+        if pacer is not None:
+            stats = pacer.stats()
+            print(f'paced: {stats.packets} packets in {stats.elapsed:.2f}s '
+                  f'({stats.rate():.0f} packets/sec, {stats.retries} retries)')
+        if metrics.collector is not None and args.metrics_file is not None:
+            try:
+                metrics.collector.write(args.metrics_file)
+            except OSError as err:
+                raise WakeOnLanError(f'Unable to write {args.metrics_file}: {err.strerror}') from err
+        return status
     except WakeOnLanError as ex:
         print_error(str(ex))
         return 1
@@ -0,0 +1,134 @@
+# Copyright (c) 2018, Eugene Gershnik
+# Use of this source code is governed by a BSD-style
+# license that can be found in the LICENSE.txt file or at
+# https://opensource.org/licenses/BSD-3-Clause
+
+"""Staggered power-on of many hosts.
+
+`wake_in_waves` wakes hosts a wave at a time instead of all at once, so a
+floor of machines doesn't draw its inrush current or hit boot servers
+simultaneously. A new wave starts once `interval` seconds have passed since
+the previous one, or earlier if an `is_up` check confirms every host of the
+previous wave is up, and never while `max_booting` hosts are still booting.
+A host counts as booting from its wake until `is_up` confirms it (or, with
+no check, for `boot_time` seconds).
+
+`is_up` gets all the booting hosts at once so it can check them concurrently,
+e.g. with `verify.probe_many`.
+"""
+
+import time
+from typing import Any, Callable, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from .pool import SocketPool
+from .pacing import Pacer, Repeat
+from .affinity import AffinityCache
+from .wakeonlan import HostRecord, WakeResult
+from .bulk import wake_many
+
+
+class WaveEvent(NamedTuple):
+    """Progress report from `wake_in_waves`"""
+    kind: str
+    """``'wave'`` when a wave was sent, ``'up'`` when hosts were confirmed up,
+    ``'timeout'`` when hosts weren't confirmed within `boot_time`"""
+    wave: int
+    """Number of the latest wave, starting from 1"""
+    names: List[str]
+    """Hosts the event is about"""
+    pending: int
+    """Hosts not woken yet"""
+    booting: int
+    """Hosts woken but not yet up"""
+
+
+def wake_in_waves(hosts: Iterable[Tuple[str, HostRecord]], wave_size: int,
+                  interval: float = 30.0, max_booting: Optional[int] = None,
+                  boot_time: Optional[float] = None,
+                  is_up: Optional[Callable[[List[Tuple[str, HostRecord]]], Iterable[str]]] = None,
+                  on_progress: Optional[Callable[[WaveEvent], Any]] = None,
+                  poll_interval: float = 1.0, pool: Optional[SocketPool] = None,
+                  pacer: Optional[Pacer] = None, repeat: Optional[Repeat] = None,
+                  affinity: Optional[AffinityCache] = None,
+                  clock: Callable[[], float] = time.monotonic,
+                  sleep: Callable[[float], Any] = time.sleep) -> Dict[str, WakeResult]:
+    """Wake (name, record) pairs `wave_size` at a time.
+
+    `boot_time` defaults to `interval`. With `is_up`, booting hosts are polled
+    every `poll_interval` seconds: it is called with their (name, record)
+    pairs and returns the names that are up. The next wave can start as soon as the
+    whole previous wave is up, and hosts not up within `boot_time` are
+    reported as ``'timeout'`` and stop counting as booting. `on_progress` is
+    called with a `WaveEvent` for each step. `pool`, `pacer`, `repeat` and
+    `affinity` are passed on to `wake_many` for every wave.
+
+    Returns the `WakeResult` of every host keyed by name, so names must be
+    unique; `ValueError` is raised otherwise. A host whose wake failed
+    outright doesn't count as booting.
+    """
+    if wave_size < 1:
+        raise ValueError('wave_size must be at least 1')
+    if max_booting is not None and max_booting < 1:
+        raise ValueError('max_booting must be at least 1')
+    boot_time = interval if boot_time is None else boot_time
+
+    pending = list(hosts)
+    pending.reverse() # pop() from the end in original order
+    records = dict(pending)
+    if len(records) != len(pending):
+        from collections import Counter
+        duplicates = sorted(name for name, count in Counter(name for name, _ in pending).items() if count > 1)
+        raise ValueError(f'host names must be unique: {", ".join(duplicates)}')
+    results: Dict[str, WakeResult] = {}
+    booting: Dict[str, float] = {} # name -> when it was woken
+    last_wave: List[str] = []
+    wave = 0
+    next_wave_at = float('-inf')
+
+    def report(kind: str, names: List[str]):
+        if on_progress is not None and names:
+            on_progress(WaveEvent(kind, wave, names, len(pending), len(booting)))
+
+    while pending or (is_up is not None and booting):
+        now = clock()
+        if booting:
+            up: List[str] = []
+            if is_up is not None:
+                up_names = set(is_up([(name, records[name]) for name in booting]))
+                up = [name for name in booting if name in up_names]
+            for name in up:
+                del booting[name]
+            report('up', up)
+            expired = [name for name, woken in booting.items() if now - woken >= boot_time]
+            for name in expired:
+                del booting[name]
+            if is_up is not None:
+                report('timeout', expired)
+
+        if pending:
+            slots = wave_size if max_booting is None else min(wave_size, max_booting - len(booting))
+            previous_up = is_up is not None and wave > 0 and not any(name in booting for name in last_wave)
+            if slots > 0 and (now >= next_wave_at or previous_up):
+                batch = [pending.pop() for _ in range(min(slots, len(pending)))]
+                wave += 1
+                next_wave_at = now + interval
+                last_wave = [name for name, _ in batch]
+                for (name, _), result in zip(batch, wake_many((rec for _, rec in batch), pool,
+                                                              pacer=pacer, repeat=repeat,
+                                                              affinity=affinity)):
+                    results[name] = result
+                    if result.succeeded():
+                        booting[name] = now
+                report('wave', last_wave)
+                continue
+
+        if not pending and is_up is None:
+            break
+        wait = poll_interval if is_up is not None else float('inf')
+        if pending and next_wave_at > now:
+            wait = min(wait, next_wave_at - now)
+        if booting:
+            wait = min(wait, min(booting.values()) + boot_time - now)
+        sleep(max(wait, 0.0))
+
+    return results
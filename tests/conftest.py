@@ -4,6 +4,7 @@
 import json
 import os
 import shutil
+import socket
 import subprocess
 import sys
 import tempfile
@@ -60,3 +61,31 @@ def write_config():
         path.write_text(json.dumps(data), encoding='utf-8')
         return path
     return _write
+
+
+@pytest.fixture
+def sink():
+    """A UDP socket bound to a free loopback port, to receive what a wake sent."""
+    rx = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    rx.bind(('127.0.0.1', 0))
+    rx.settimeout(2)
+    yield rx
+    rx.close()
+
+
+class FakeClock:
+    """A clock that only moves when slept on, starting at 0."""
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, delay):
+        assert delay >= 0
+        self.now += delay
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
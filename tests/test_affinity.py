@@ -0,0 +1,193 @@
+# pylint: disable=missing-function-docstring,missing-module-docstring,redefined-outer-name
+
+"""Tests for the learned host-to-interface affinity cache.
+
+Interfaces are replaced with loopback, which can be sent on, and an address
+from a documentation range, which can't be bound so sends on it fail.
+"""
+
+import asyncio
+import json
+import os
+import socket
+
+import pytest
+
+import wakeonlan.interfaces
+from wakeonlan import AffinityCache, HostRecord, Verify, WakeOnLanError, async_wake_many, wait_up, wake, \
+    wake_many
+from wakeonlan.affinity import route_interface
+from wakeonlan.interfaces import InterfaceAddress
+
+
+MAC = (0x02, 0x11, 0x22, 0x33, 0x44, 0x55)
+MAC_STR = '02:11:22:33:44:55'
+
+
+@pytest.fixture
+def ifaces(monkeypatch):
+    ifaces = {'lo': [InterfaceAddress(1, socket.AF_INET, '127.0.0.1', 8)],
+              'down': [InterfaceAddress(2, socket.AF_INET, '198.51.100.1', 24)]}
+    monkeypatch.setattr(wakeonlan.interfaces.interface_cache, 'get', lambda: ifaces)
+    return ifaces
+
+
+@pytest.fixture
+def cache_path(test_home):
+    return os.path.join(test_home.name, '.wakeonlan.affinity')
+
+
+def test_learned_interface_is_persisted(cache_path):
+    cache = AffinityCache()
+    assert cache.path == cache_path
+    assert cache.get(MAC_STR) is None
+    cache.learn(MAC_STR.lower(), 'eth1')
+    assert cache.get(MAC_STR) == 'eth1'
+    cache.save()
+    assert AffinityCache().get(MAC_STR) == 'eth1'
+    with open(cache_path, encoding='utf-8') as f:
+        assert json.load(f)['hosts'][MAC_STR]['interface'] == 'eth1'
+
+
+def test_entries_expire(cache_path, clock):
+    cache = AffinityCache(cache_path, max_age=60, clock=clock)
+    cache.learn(MAC_STR, 'eth1')
+    clock.now += 59
+    assert cache.get(MAC_STR) == 'eth1'
+    clock.now += 1
+    assert cache.get(MAC_STR) is None
+    assert not cache.items()
+    cache.learn('02:00:00:00:00:01', 'eth0')
+    cache.save()
+    with open(cache_path, encoding='utf-8') as f:
+        assert list(json.load(f)['hosts']) == ['02:00:00:00:00:01']
+
+
+def test_oldest_entries_evicted(cache_path, clock):
+    cache = AffinityCache(cache_path, max_entries=3, clock=clock)
+    for i in range(5):
+        clock.now += 1
+        cache.learn(f'02:00:00:00:00:0{i}', f'eth{i}')
+    cache.save()
+    assert [mac for mac, _, _ in AffinityCache(cache_path, clock=clock).items()] == \
+        ['02:00:00:00:00:04', '02:00:00:00:00:03', '02:00:00:00:00:02']
+
+
+def test_save_merges_other_writers(cache_path, clock):
+    first = AffinityCache(cache_path, clock=clock)
+    second = AffinityCache(cache_path, clock=clock)
+    first.learn(MAC_STR, 'eth0')
+    first.learn('02:00:00:00:00:01', 'eth0')
+    first.save()
+    assert second.get(MAC_STR) == 'eth0'
+    clock.now += 1
+    second.learn('02:00:00:00:00:02', 'eth2')
+    second.forget(MAC_STR)
+    clock.now += 1
+    first.learn('02:00:00:00:00:01', 'eth1')
+    first.save()
+    second.save()
+    final = AffinityCache(cache_path, clock=clock)
+    assert final.get(MAC_STR) is None
+    assert final.get('02:00:00:00:00:01') == 'eth1'
+    assert final.get('02:00:00:00:00:02') == 'eth2'
+
+
+def test_malformed_file(cache_path):
+    with open(cache_path, 'wt', encoding='utf-8') as f:
+        f.write('[1, 2')
+    with pytest.raises(WakeOnLanError, match='malformed'):
+        AffinityCache().get(MAC_STR)
+
+
+def test_without_affinity_all_interfaces_are_tried(ifaces):
+    # pylint: disable=unused-argument
+    result = wake(HostRecord(MAC))
+    assert result.sent == ['lo']
+    assert set(result.errors) == {'down'}
+
+
+def test_learned_interface_used_alone(ifaces, cache_path):
+    # pylint: disable=unused-argument
+    cache = AffinityCache(cache_path)
+    cache.learn(MAC_STR, 'lo')
+    result = wake(HostRecord(MAC), affinity=cache)
+    assert result.sent == ['lo']
+    assert not result.errors
+    assert list(result.timings) == ['lo']
+
+
+def test_falls_back_when_learned_interface_fails(ifaces, cache_path):
+    # pylint: disable=unused-argument
+    cache = AffinityCache(cache_path)
+    cache.learn(MAC_STR, 'down')
+    [result] = wake_many([HostRecord(MAC)], affinity=cache)
+    assert result.sent == ['lo']
+    assert set(result.errors) == {'down'}
+    assert result.bytes_sent['lo'] == 102
+    [result] = asyncio.run(async_wake_many([HostRecord(MAC)], affinity=cache))
+    assert result.sent == ['lo']
+
+
+def test_learned_interface_gone(ifaces, cache_path):
+    cache = AffinityCache(cache_path)
+    cache.learn(MAC_STR, 'eth9')
+    result = wake(HostRecord(MAC), affinity=cache)
+    assert set(result.timings) == set(ifaces)
+
+
+def test_explicit_target_ignores_affinity(ifaces, cache_path):
+    # pylint: disable=unused-argument
+    cache = AffinityCache(cache_path)
+    cache.learn(MAC_STR, 'down')
+    assert wake(HostRecord(MAC, 'lo'), affinity=cache).sent == ['lo']
+
+
+def test_route_interface(ifaces):
+    # pylint: disable=unused-argument
+    assert route_interface('127.0.0.1') == 'lo'
+    assert route_interface('nohost.invalid') is None
+
+
+def test_verified_wake_learns_interface(ifaces, cache_path):
+    # pylint: disable=unused-argument
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as srv:
+        srv.bind(('127.0.0.1', 0))
+        srv.listen(1)
+        cache = AffinityCache(cache_path)
+        verified = wait_up(HostRecord(MAC), Verify('127.0.0.1', srv.getsockname()[1], timeout=5), affinity=cache)
+    assert verified.is_up()
+    assert AffinityCache(cache_path).get(MAC_STR) == 'lo'
+
+
+@pytest.fixture
+def real_iface():
+    names = list(wakeonlan.interfaces.interface_cache.get())
+    if not names:
+        pytest.skip('no usable interfaces')
+    return names[0]
+
+
+def test_cli_learn(run_cli, cache_path, real_iface):
+    run_cli('--save', 'box', MAC_STR, expect_success=True)
+    result = run_cli('--learn', real_iface, 'box', expect_success=True)
+    assert f'learned on {real_iface}' in result.stdout
+    assert AffinityCache(cache_path).get(MAC_STR) == real_iface
+    run_cli('--learn', 'nonesuch0', MAC_STR, expect_success=False)
+    run_cli('--learn', real_iface, 'missing', expect_success=False)
+
+
+@pytest.mark.parametrize('argv', [
+    ['--learn', 'lo'],
+    ['--learn', 'lo', '-i', 'lo', MAC_STR],
+    ['--learn', 'lo', '@group'],
+    ['--affinity', '--list'],
+])
+def test_cli_learn_rejected(run_cli, argv):
+    run_cli(*argv, expect_success=False)
+
+
+def test_cli_wake_with_affinity(run_cli, real_iface):
+    run_cli('--learn', real_iface, MAC_STR, expect_success=True)
+    result = run_cli(MAC_STR, '--affinity', expect_success=True)
+    assert result.stdout.startswith('wake: ')
@@ -0,0 +1,113 @@
+# pylint: disable=missing-function-docstring,missing-module-docstring
+
+"""Tests for the asyncio API.
+
+Driven with plain `asyncio.run` so no pytest plugin is needed. As with the
+bulk tests, records point at a loopback sink to observe what was sent.
+"""
+
+import asyncio
+import errno
+import socket
+import threading
+
+import wakeonlan.aio
+import wakeonlan.interfaces
+from wakeonlan import HostRecord, Pacer, Repeat, WakeOnLanError, async_wake, async_wake_many
+from wakeonlan.interfaces import InterfaceAddress
+
+
+def test_async_wake_transmits_correct_packet(sink):
+    mac = (0x01, 0x02, 0x03, 0x04, 0x05, 0x06)
+    port = sink.getsockname()[1]
+    result = asyncio.run(async_wake(HostRecord(mac, None, '127.0.0.1', port)))
+    assert result.succeeded()
+    assert result.sent == ['127.0.0.1']
+    assert sink.recvfrom(200)[0] == b'\xff' * 6 + bytes(mac) * 16
+
+
+def test_async_wake_many_concurrent_calls(sink):
+    port = sink.getsockname()[1]
+
+    async def run():
+        return await asyncio.gather(*(
+            async_wake(HostRecord((1, 2, 3, 4, 5, i), None, '127.0.0.1', port))
+            for i in range(100)))
+
+    results = asyncio.run(run())
+    assert all(res.succeeded() for res in results)
+    received = {sink.recvfrom(200)[0] for _ in range(100)}
+    assert len(received) == 100
+
+
+def test_async_wake_many_reports_errors_per_record(sink):
+    port = sink.getsockname()[1]
+    results = asyncio.run(async_wake_many([
+        HostRecord((1, 2, 3, 4, 5, 6), 'no-such-interface-xyz', None, port),
+        HostRecord((1, 2, 3, 4, 5, 7), None, '127.0.0.1', port),
+    ]))
+    assert isinstance(results[0].errors['no-such-interface-xyz'], WakeOnLanError)
+    assert results[1].succeeded()
+
+
+def test_async_wake_unresolvable_address():
+    result = asyncio.run(async_wake(HostRecord((1, 2, 3, 4, 5, 6), None, 'no-such-host.invalid', 9)))
+    assert not result.succeeded()
+    assert isinstance(result.errors['no-such-host.invalid'], OSError)
+
+
+def test_async_wake_many_paced(sink):
+    port = sink.getsockname()[1]
+    pacer = Pacer(rate=200)
+    results = asyncio.run(async_wake_many(
+        [HostRecord((1, 2, 3, 4, 5, i), None, '127.0.0.1', port) for i in range(10)], pacer))
+    assert all(res.succeeded() for res in results)
+    stats = pacer.stats()
+    assert stats.packets == 10
+    assert stats.elapsed >= 9 / 200 * 0.9
+    for _ in range(10):
+        sink.recvfrom(200)
+
+
+def test_async_wake_many_repeated(sink):
+    port = sink.getsockname()[1]
+    records = [HostRecord((1, 2, 3, 4, 5, i), None, '127.0.0.1', port) for i in range(5)]
+    results = asyncio.run(async_wake_many(records, repeat=Repeat(count=2, interval=0.02)))
+    assert all(res.succeeded() for res in results)
+    payloads = [sink.recvfrom(200)[0] for _ in range(10)]
+    # every host's first packet goes out before any repeat
+    assert payloads[:5] == payloads[5:]
+
+
+def test_async_send_errors_are_retried(sink, monkeypatch):
+    class FlakySocket(socket.socket):
+        failures = [errno.ENETUNREACH, errno.EHOSTUNREACH]
+
+        def sendto(self, *args):  # pylint: disable=arguments-differ
+            if self.failures:
+                raise OSError(self.failures.pop(0), 'fake failure')
+            return super().sendto(*args)
+
+    monkeypatch.setattr(wakeonlan.aio, '_open_socket', lambda key: FlakySocket(key[1], key[2], key[3]))
+    record = HostRecord((1, 2, 3, 4, 5, 6), None, '127.0.0.1', sink.getsockname()[1])
+    result = asyncio.run(async_wake(record, repeat=Repeat(backoff=0.01)))
+    assert result.succeeded()
+    assert sink.recvfrom(200)[0] == b'\xff' * 6 + bytes((1, 2, 3, 4, 5, 6)) * 16
+    FlakySocket.failures = [errno.EPERM]
+    result = asyncio.run(async_wake(record))
+    assert result.errnos() == {'127.0.0.1': errno.EPERM}
+
+
+def test_async_planning_runs_off_the_loop(monkeypatch):
+    ifaces = {'lo': [InterfaceAddress(1, socket.AF_INET, '127.0.0.1', 30)]}
+    monkeypatch.setattr(wakeonlan.interfaces.interface_cache, 'get', lambda: ifaces)
+    resolved_on = []
+    real_getaddrinfo = socket.getaddrinfo
+    def getaddrinfo(*args, **kwargs):
+        resolved_on.append(threading.current_thread())
+        return real_getaddrinfo(*args, **kwargs)
+    monkeypatch.setattr(socket, 'getaddrinfo', getaddrinfo)
+    # off every local subnet, so planning resolves the directed broadcast address
+    asyncio.run(async_wake(HostRecord((1, 2, 3, 4, 5, 6), host_ip='127.0.0.6/30')))
+    assert resolved_on
+    assert threading.main_thread() not in resolved_on
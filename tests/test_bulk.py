@@ -0,0 +1,228 @@
+# pylint: disable=missing-function-docstring,missing-module-docstring
+
+"""Tests for `wake_many` and `wake_group`.
+
+Records with an explicit loopback address let us receive what the batch
+actually sent, without depending on the runner's interface topology.
+"""
+
+import errno
+import socket
+import threading
+import time
+
+import pytest
+
+from wakeonlan import HostRecord, Repeat, WakeOnLanError, wake_many, wake_group, save_names, save_group
+import wakeonlan.bulk
+import wakeonlan.interfaces
+from wakeonlan.interfaces import InterfaceAddress
+
+
+def _receive(rx, count):
+    return [rx.recvfrom(200)[0] for _ in range(count)]
+
+
+def test_wake_many_sends_every_record(sink):
+    port = sink.getsockname()[1]
+    macs = [(1, 2, 3, 4, 5, i) for i in range(10)]
+    results = wake_many(HostRecord(mac, None, '127.0.0.1', port) for mac in macs)
+    assert [res.record.mac for res in results] == macs
+    for res in results:
+        assert res.succeeded()
+        assert res.sent == ['127.0.0.1']
+        assert res.errors == {}
+    received = _receive(sink, len(macs))
+    assert sorted(received) == sorted(b'\xff' * 6 + bytes(mac) * 16 for mac in macs)
+
+
+def test_wake_many_reuses_one_socket_per_destination_family(sink, monkeypatch):
+    opened = []
+    real_open = wakeonlan.bulk._open_socket
+    def counting_open(key):
+        opened.append(key)
+        return real_open(key)
+    monkeypatch.setattr(wakeonlan.bulk, '_open_socket', counting_open)
+
+    port = sink.getsockname()[1]
+    wake_many([HostRecord((1, 2, 3, 4, 5, i), None, '127.0.0.1', port) for i in range(50)])
+    _receive(sink, 50)
+    assert len(opened) == 1
+
+
+def test_wake_many_unknown_interface_does_not_abort_batch(sink):
+    port = sink.getsockname()[1]
+    results = wake_many([
+        HostRecord((1, 2, 3, 4, 5, 6), 'no-such-interface-xyz', None, port),
+        HostRecord((1, 2, 3, 4, 5, 7), None, '127.0.0.1', port),
+    ])
+    assert not results[0].succeeded()
+    assert isinstance(results[0].errors['no-such-interface-xyz'], WakeOnLanError)
+    assert results[1].succeeded()
+    assert _receive(sink, 1) == [b'\xff' * 6 + bytes((1, 2, 3, 4, 5, 7)) * 16]
+
+
+def test_wake_many_empty():
+    assert wake_many([]) == []
+
+
+def test_wake_many_records_timings(sink):
+    port = sink.getsockname()[1]
+    results = wake_many([HostRecord((1, 2, 3, 4, 5, i), None, '127.0.0.1', port) for i in range(3)] +
+                        [HostRecord((1, 2, 3, 4, 5, 9), 'no-such-interface-xyz', None, port)])
+    _receive(sink, 3)
+    assert all(list(res.timings) == ['127.0.0.1'] and res.timings['127.0.0.1'] >= 0 for res in results[:3])
+    # nothing was attempted for an unknown interface
+    assert results[3].timings == {}
+
+
+def test_wake_fans_out_to_all_interfaces(monkeypatch, capsys):
+    ifaces = {'lo': [(1, socket.AF_INET, '127.0.0.1')]}
+    ifaces.update((f'gone{i}', [(i + 2, socket.AF_INET, f'198.51.100.{i + 1}')]) for i in range(200))
+    monkeypatch.setattr(wakeonlan.interfaces.interface_cache, 'get', lambda: ifaces)
+    [result] = wake_many([HostRecord((1, 2, 3, 4, 5, 6))])
+    # addresses that aren't ours can't be bound, and errors come out in interface order
+    assert [name for name in result.errors if name != 'lo'] == [f'gone{i}' for i in range(200)]
+    assert list(result.timings) == list(ifaces)
+
+    result = wakeonlan.wake(HostRecord((1, 2, 3, 4, 5, 6)))
+    assert [name for name in result.errors if name != 'lo'] == [f'gone{i}' for i in range(200)]
+    assert all(result.errnos()[f'gone{i}'] == errno.EADDRNOTAVAIL for i in range(200))
+    assert result.bytes_sent['gone0'] == 0
+    assert capsys.readouterr() == ('', '')
+
+
+def test_wake_sets_up_and_sends_on_interfaces_concurrently(monkeypatch):
+    count = 4
+    ifaces = {f'eth{i}': [(i + 1, socket.AF_INET, f'198.51.100.{i + 1}')] for i in range(count)}
+    monkeypatch.setattr(wakeonlan.interfaces.interface_cache, 'get', lambda: ifaces)
+    # each setup and each send only gets past its barrier once all the others have started
+    opening, sending = threading.Barrier(count, timeout=2), threading.Barrier(count, timeout=2)
+
+    class SlowSocket:
+        def sendto(self, payload, dest):
+            sending.wait()
+            time.sleep(0.1)
+
+        def close(self):
+            pass
+
+    def slow_open(key):
+        opening.wait()
+        time.sleep(0.1)
+        return SlowSocket()
+    monkeypatch.setattr(wakeonlan.bulk, '_open_socket', slow_open)
+
+    start = time.monotonic()
+    result = wakeonlan.wake(HostRecord((1, 2, 3, 4, 5, 6)))
+    assert result.sent == list(ifaces)
+    assert time.monotonic() - start < count * 0.2
+
+
+def test_wakes_share_one_fanout_executor(sink, monkeypatch):
+    ifaces = {'lo': [InterfaceAddress(1, socket.AF_INET, '127.0.0.1', 8)],
+              'lo6': [InterfaceAddress(1, socket.AF_INET6, '::1', 128)]}
+    monkeypatch.setattr(wakeonlan.interfaces.interface_cache, 'get', lambda: ifaces)
+    wakeonlan.wake(HostRecord((1, 2, 3, 4, 5, 6)))
+    executor = wakeonlan.bulk._fanout_executor
+    assert executor is not None
+    wakeonlan.wake(HostRecord((1, 2, 3, 4, 5, 6)))
+    wake_many([HostRecord((1, 2, 3, 4, 5, 6), None, '127.0.0.1', sink.getsockname()[1])] * 2)
+    assert wakeonlan.bulk._fanout_executor is executor
+
+
+def test_wake_returns_result_and_prints_nothing(sink, capsys):
+    port = sink.getsockname()[1]
+    result = wakeonlan.wake(HostRecord((1, 2, 3, 4, 5, 6), None, '127.0.0.1', port),
+                            repeat=Repeat(count=2, interval=0.0))
+    assert result.succeeded()
+    assert result.sent == ['127.0.0.1']
+    assert result.bytes_sent == {'127.0.0.1': 204}
+    assert result.errnos() == {}
+    assert 0 <= result.elapsed() == result.timings['127.0.0.1']
+    _receive(sink, 2)
+
+    result = wakeonlan.wake(HostRecord((1, 2, 3, 4, 5, 6), None, 'nohost.invalid', port))
+    assert not result.succeeded()
+    assert isinstance(result.errnos()['nohost.invalid'], int)
+    assert capsys.readouterr() == ('', '')
+
+
+def test_wake_group(sink):
+    port = sink.getsockname()[1]
+    save_names({f'h{i}': HostRecord((1, 2, 3, 4, 5, i), None, '127.0.0.1', port) for i in range(3)})
+    save_group('rack', ['h2', 'h0'])
+    results = wake_group('rack')
+    assert list(results) == ['h2', 'h0']
+    assert all(res.succeeded() for res in results.values())
+    assert sorted(_receive(sink, 2)) == sorted(b'\xff' * 6 + bytes((1, 2, 3, 4, 5, i)) * 16 for i in (0, 2))
+    with pytest.raises(WakeOnLanError):
+        wake_group('nonesuch')
+
+
+def test_cli_wake_group_prints_summary(run_cli, sink):
+    port = sink.getsockname()[1]
+    for i in range(3):
+        run_cli('-s', f'h{i}', f'01:02:03:04:05:0{i}', '-a', '127.0.0.1', '-p', str(port), expect_success=True)
+    result = run_cli('--group', 'rack', 'h0', 'h1', 'h2', expect_success=True)
+    assert result.stdout.strip() == 'Group rack saved'
+    assert run_cli('--groups', expect_success=True).stdout.strip() == 'rack - h0, h1, h2'
+    result = run_cli('@rack', expect_success=True)
+    assert result.stdout.strip() == 'wake: @rack, 3 hosts, 3 sent, 0 failed'
+    _receive(sink, 3)
+    run_cli('--group', 'rack', expect_success=False)
+    run_cli('@nonesuch', expect_success=False)
+    assert run_cli('--delete-group', 'rack', expect_success=True).stdout.strip() == 'Group rack deleted'
+
+
+@pytest.fixture
+def subnet_ifaces(monkeypatch):
+    # 127.0.0.3 is the broadcast address of 127.0.0.0/30 and, being loopback, can be received on
+    ifaces = {'lo': [InterfaceAddress(1, socket.AF_INET, '127.0.0.1', 30)],
+              'other': [InterfaceAddress(2, socket.AF_INET, '198.51.100.1', 24)]}
+    monkeypatch.setattr(wakeonlan.interfaces.interface_cache, 'get', lambda: ifaces)
+    return ifaces
+
+
+def _bound(address):
+    rx = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    rx.bind((address, 0))
+    rx.settimeout(2)
+    return rx
+
+
+def test_host_ip_selects_subnet(subnet_ifaces):
+    # pylint: disable=unused-argument,redefined-outer-name
+    with _bound('127.0.0.3') as rx:
+        port = rx.getsockname()[1]
+        result = wakeonlan.wake(HostRecord((1, 2, 3, 4, 5, 6), port=port, host_ip='127.0.0.2'))
+        assert result.sent == ['lo']
+        assert list(result.timings) == ['lo']
+        [result] = wake_many([HostRecord((1, 2, 3, 4, 5, 7), port=port, host_ip='127.0.0.2/30')])
+        assert result.sent == ['lo']
+        assert _receive(rx, 2) == [b'\xff' * 6 + bytes((1, 2, 3, 4, 5, i)) * 16 for i in (6, 7)]
+
+
+def test_host_ip_off_subnet(subnet_ifaces):
+    # pylint: disable=unused-argument,redefined-outer-name
+    with _bound('127.0.0.7') as rx:
+        port = rx.getsockname()[1]
+        # with a prefix, a directed broadcast is sent to the host's subnet
+        [routed, unknown, malformed] = wake_many([
+            HostRecord((1, 2, 3, 4, 5, 6), port=port, host_ip='127.0.0.6/30'),
+            HostRecord((1, 2, 3, 4, 5, 6), port=port, host_ip='203.0.113.5'),
+            HostRecord((1, 2, 3, 4, 5, 6), port=port, host_ip='not-an-ip'),
+        ])
+        assert routed.sent == ['127.0.0.7']
+        assert _receive(rx, 1)
+    # without one, every interface is sent to as before
+    assert list(unknown.timings) == ['lo', 'other']
+    assert isinstance(malformed.errors['not-an-ip'], WakeOnLanError)
+
+
+def test_cli_host_ip(run_cli):
+    result = run_cli('01:02:03:04:05:06', '--host-ip', '127.0.0.6/30', '-p', '9', expect_success=True)
+    assert result.stdout.startswith('wake: 01:02:03:04:05:06, subnet of 127.0.0.6/30, 9')
+    run_cli('01:02:03:04:05:06', '--host-ip', '203.0.113.500', expect_success=False)
+    run_cli('--save', 'box', '01:02:03:04:05:06', '--host-ip', '203.0.113.5/24', expect_success=True)
+    assert wakeonlan.get_name_record('box').host_ip == '203.0.113.5/24'
@@ -0,0 +1,82 @@
+# pylint: disable=missing-function-docstring,missing-module-docstring,redefined-outer-name
+
+"""Tests for the resident daemon and CLI forwarding to it.
+
+The daemon runs on a thread of the test process so tests can inspect its
+state; the CLI is driven via subprocess as in test_cli.py.
+"""
+
+import socket
+import threading
+import time
+
+import pytest
+
+from wakeonlan import HostRecord, save_name
+from wakeonlan.daemon import WakeDaemon, request
+
+pytestmark = pytest.mark.skipif(not hasattr(socket, 'AF_UNIX'),
+                                reason='requires Unix-domain sockets')
+
+
+@pytest.fixture
+def daemon():
+    dmn = WakeDaemon()
+    thread = threading.Thread(target=dmn.serve_forever, daemon=True)
+    thread.start()
+    for _ in range(100):
+        if request({'cmd': 'list'}) is not None:
+            break
+        time.sleep(0.05)
+    yield dmn
+    dmn.shutdown()
+    thread.join(5)
+
+
+def test_request_without_daemon_returns_none():
+    assert request({'cmd': 'list'}) is None
+
+
+def test_daemon_lists_saved_names(daemon):
+    save_name('box', HostRecord((1, 2, 3, 4, 5, 6), 'eth0', None, 9))
+    response = request({'cmd': 'list'})
+    assert response['names'] == {'box': {'mac': '01:02:03:04:05:06', 'interface': 'eth0'}}
+
+
+def test_daemon_bulk_wake(daemon, sink):
+    port = sink.getsockname()[1]
+    save_name('box', HostRecord((1, 2, 3, 4, 5, 6), None, '127.0.0.1', port))
+    response = request({'cmd': 'wake', 'names': ['box', 'nonesuch'],
+                        'records': [{'mac': '01:02:03:04:05:07', 'ip': '127.0.0.1', 'port': port}]})
+    box, missing, record = response['results']
+    assert box['sent'] == ['127.0.0.1'] and box['errors'] == {}
+    assert missing == {'name': 'nonesuch', 'error': 'Name nonesuch not found'}
+    assert record['sent'] == ['127.0.0.1']
+    assert {sink.recvfrom(200)[0][-1] for _ in range(2)} == {6, 7}
+
+
+def test_daemon_rejects_unknown_command(daemon):
+    from wakeonlan import WakeOnLanError
+    with pytest.raises(WakeOnLanError):
+        request({'cmd': 'bogus'})
+
+
+def test_cli_forwards_wake_to_daemon(daemon, sink, run_cli):
+    port = sink.getsockname()[1]
+    result = run_cli('01:02:03:04:05:06', '-a', '127.0.0.1', '-p', str(port),
+                     expect_success=True)
+    assert result.stdout.strip() == f'wake: 01:02:03:04:05:06, 127.0.0.1, {port}'
+    assert sink.recvfrom(200)[0] == b'\xff' * 6 + bytes((1, 2, 3, 4, 5, 6)) * 16
+    # the daemon's pool kept the socket it sent through
+    assert len(daemon.pool) == 1
+
+
+def test_cli_forwards_list_to_daemon(daemon, run_cli):
+    daemon.names = lambda: {'only-in-daemon': HostRecord((1, 2, 3, 4, 5, 6), None, None, 9)}
+    result = run_cli('--names', expect_success=True)
+    assert result.stdout.split() == ['only-in-daemon']
+
+
+def test_cli_unknown_name_via_daemon(daemon, run_cli):
+    result = run_cli('nonesuch', expect_success=False)
+    assert 'not found' in result.stderr
@@ -0,0 +1,146 @@
+# pylint: disable=missing-function-docstring,missing-module-docstring
+
+"""Tests for sending wake packets as raw Ethernet frames and for falling back to UDP."""
+
+import asyncio
+import json
+import os
+import socket
+import sqlite3
+
+import pytest
+
+from wakeonlan import HostRecord, WakeOnLanError, async_wake, get_name_record, save_name, wake, wake_many
+from wakeonlan import ether
+from wakeonlan.inventory import _db_path
+
+
+MAC = (0x02, 0x11, 0x22, 0x33, 0x44, 0x55)
+PAYLOAD = b'\xff' * 6 + bytes(MAC) * 16
+
+needs_raw = pytest.mark.skipif(not ether.available() or not hasattr(socket, 'AF_PACKET'),
+                               reason='raw Ethernet frames cannot be sent here')
+
+
+@pytest.fixture
+def frames():
+    """AF_PACKET socket receiving Wake-On-Lan frames on the loopback interface"""
+    sock = socket.socket(socket.AF_PACKET, socket.SOCK_RAW, socket.htons(ether.ETH_P_WOL)) # pylint: disable=no-member
+    sock.bind(('lo', ether.ETH_P_WOL))
+    sock.settimeout(2)
+    yield sock
+    sock.close()
+
+
+@pytest.fixture
+def no_raw(monkeypatch):
+    monkeypatch.setattr(ether, '_usable', False)
+
+
+def _frame_to(frames):
+    """destination MAC and payload of the next frame, skipping other traffic"""
+    while True:
+        data = frames.recv(2048)
+        if data[12:14] == b'\x08\x42':
+            return data[:6], data[14:14 + len(PAYLOAD)]
+
+
+@needs_raw
+def test_frame_to_host_mac(frames):
+    result = wake(HostRecord(MAC, 'lo', transport='ethernet'))
+    assert result.sent == ['lo']
+    assert result.bytes_sent == {'lo': len(PAYLOAD)}
+    assert _frame_to(frames) == (bytes(MAC), PAYLOAD)
+
+
+@needs_raw
+def test_frame_to_broadcast(frames):
+    result = wake(HostRecord(MAC, 'lo', transport='ethernet-broadcast'))
+    assert result.succeeded()
+    assert _frame_to(frames) == (ether.BROADCAST, PAYLOAD)
+
+
+@needs_raw
+def test_frames_in_bulk_share_a_socket(frames):
+    macs = [(0x02, 0, 0, 0, 0, i) for i in range(5)]
+    results = wake_many(HostRecord(mac, 'lo', transport='ethernet') for mac in macs)
+    assert all(result.sent == ['lo'] for result in results)
+    assert sorted(_frame_to(frames)[0] for _ in macs) == sorted(bytes(mac) for mac in macs)
+
+
+@needs_raw
+def test_async_frame(frames):
+    result = asyncio.run(async_wake(HostRecord(MAC, 'lo', transport='ethernet')))
+    assert result.sent == ['lo']
+    assert _frame_to(frames) == (bytes(MAC), PAYLOAD)
+
+
+@needs_raw
+def test_unknown_interface_is_send_error():
+    result = wake(HostRecord(MAC, 'nonesuch0', transport='ethernet'))
+    assert not result.succeeded()
+    assert isinstance(result.errors['nonesuch0'], OSError)
+
+
+@needs_raw
+def test_address_rejected_for_frames():
+    result = wake(HostRecord(MAC, None, '127.0.0.1', 9, 'ethernet'))
+    assert isinstance(result.errors['127.0.0.1'], WakeOnLanError)
+
+
+def test_falls_back_to_udp(no_raw, sink):
+    # pylint: disable=unused-argument,redefined-outer-name
+    result = wake(HostRecord(MAC, None, '127.0.0.1', sink.getsockname()[1], 'ethernet'))
+    assert result.sent == ['127.0.0.1']
+    assert sink.recv(1024) == PAYLOAD
+
+
+def test_unavailable_without_af_packet(monkeypatch):
+    monkeypatch.setattr(ether, '_usable', None)
+    monkeypatch.delattr(socket, 'AF_PACKET', raising=False)
+    assert not ether.available()
+
+
+@pytest.mark.parametrize('store', ['json', 'sqlite'])
+def test_transport_saved(monkeypatch, store):
+    monkeypatch.setenv('WAKEONLAN_STORE', store)
+    record = HostRecord(MAC, 'eth0', transport='ethernet-broadcast')
+    save_name('raw', record)
+    save_name('udp', HostRecord(MAC))
+    assert get_name_record('raw') == record
+    assert get_name_record('udp').transport == 'udp'
+
+
+def test_bad_transport_in_config(write_config):
+    write_config({'names': {'bad': {'mac': '02:11:22:33:44:55', 'transport': 'carrier-pigeon'}}})
+    with pytest.raises(WakeOnLanError, match='transport'):
+        get_name_record('bad')
+
+
+def test_sqlite_database_without_transport_is_upgraded(monkeypatch):
+    monkeypatch.setenv('WAKEONLAN_STORE', 'sqlite')
+    with sqlite3.connect(_db_path()) as conn:
+        conn.execute('CREATE TABLE names (name TEXT PRIMARY KEY NOT NULL, mac TEXT NOT NULL, '
+                     'interface TEXT, ip TEXT, port INTEGER) WITHOUT ROWID')
+        conn.execute("INSERT INTO names VALUES ('old', '02:11:22:33:44:55', NULL, NULL, NULL)")
+    conn.close()
+    assert get_name_record('old') == HostRecord(MAC)
+    save_name('new', HostRecord(MAC, transport='ethernet'))
+    assert get_name_record('new').transport == 'ethernet'
+
+
+def test_cli_save_transport(run_cli, test_home):
+    run_cli('--save', 'raw', '02:11:22:33:44:55', '-i', 'eth0', '--transport', 'ethernet', expect_success=True)
+    with open(os.path.join(test_home.name, '.wakeonlan'), encoding='utf-8') as f:
+        assert json.load(f)['names']['raw'] == {'mac': '02:11:22:33:44:55', 'interface': 'eth0',
+                                               'transport': 'ethernet'}
+
+
+@pytest.mark.parametrize('argv', [
+    ['--transport', 'ethernet', '-a', '192.168.1.255', '02:11:22:33:44:55'],
+    ['--transport', 'ethernet', 'somename'],
+    ['--transport', 'ethernet', '--list'],
+    ['--transport', 'token-ring', '02:11:22:33:44:55'],
+])
+def test_cli_transport_rejected(run_cli, argv):
+    run_cli(*argv, expect_success=False)
@@ -10,13 +10,20 @@ and (b) a couple of weak sanity checks against the actual host the test runs on.
 
 import ipaddress
 import socket
+import struct
 import sys
 
 import pytest
 
+import wakeonlan.interfaces
 from wakeonlan.interfaces import (
+    InterfaceAddress,
+    InterfaceCache,
     _clean_v6_link_local,
     _is_v6_link_local,
+    _parse_netlink_addr,
+    _parse_netlink_link,
+    _prefix_length,
     enum_interfaces,
 )
 
@@ -111,3 +118,142 @@ def test_enum_interfaces_indices_match_if_nametoindex():
     for name, addrs in enum_interfaces().items():
         for idx, _family, _addr in addrs:
             assert idx == socket.if_nametoindex(name)
+
+
+# --------------------------------------------------------------------------- #
+# InterfaceCache
+# --------------------------------------------------------------------------- #
+
+@pytest.fixture
+def counted_enum(monkeypatch):
+    calls = []
+    def fake_enum():
+        calls.append(1)
+        return {'eth0': [(2, socket.AF_INET, '192.168.1.2')]}
+    monkeypatch.setattr(wakeonlan.interfaces, 'enum_interfaces', fake_enum)
+    return calls
+
+
+def test_interface_cache_reuses_snapshot_within_ttl(counted_enum):
+    cache = InterfaceCache(ttl=60)
+    first = cache.get()
+    assert cache.get() is first
+    assert len(counted_enum) == 1
+    assert cache.generation == 1
+
+
+def test_interface_cache_invalidate_forces_reload(counted_enum):
+    cache = InterfaceCache(ttl=60)
+    cache.get()
+    cache.invalidate()
+    assert cache.peek() is None
+    cache.get()
+    assert len(counted_enum) == 2
+    assert cache.generation == 2
+
+
+def test_interface_cache_zero_ttl_always_enumerates(counted_enum):
+    cache = InterfaceCache(ttl=0)
+    cache.get()
+    cache.get()
+    assert len(counted_enum) == 2
+
+
+# --------------------------------------------------------------------------- #
+# rtnetlink backend
+# --------------------------------------------------------------------------- #
+
+def _rtattr(attr_type, value):
+    length = 4 + len(value)
+    return struct.pack('=HH', length, attr_type) + value + b'\x00' * ((-length) % 4)
+
+
+def _link_msg(idx, flags, name):
+    return memoryview(struct.pack('=BxHiII', 0, 1, idx, flags, 0)
+                      + _rtattr(3, name.encode() + b'\x00')
+                      + _rtattr(4, struct.pack('=I', 1500)))
+
+
+def _addr_msg(fam, idx, *attrs):
+    return memoryview(struct.pack('=BBBBI', fam, 24, 0, 0, idx)
+                      + b''.join(_rtattr(t, v) for t, v in attrs))
+
+
+_UP_MULTICAST = 0x1 | 0x1000
+
+
+def test_parse_netlink_link_usable():
+    assert _parse_netlink_link(_link_msg(3, _UP_MULTICAST, 'eth0')) == (3, 'eth0')
+
+
+@pytest.mark.parametrize('flags', [
+    0x1000,                    # down
+    0x1 | 0x8 | 0x1000,        # loopback
+    0x1,                       # no multicast
+])
+def test_parse_netlink_link_filtered(flags):
+    assert _parse_netlink_link(_link_msg(3, flags, 'eth0')) is None
+
+
+def test_parse_netlink_addr_prefers_local_and_label():
+    # point-to-point: IFA_ADDRESS is the peer, IFA_LOCAL is ours
+    msg = _addr_msg(socket.AF_INET, 3,
+                    (1, socket.inet_aton('10.0.0.2')),
+                    (2, socket.inet_aton('10.0.0.1')),
+                    (3, b'eth0:1\x00'))
+    assert _parse_netlink_addr(msg, {3: 'eth0'}) == (
+        'eth0:1', (3, socket.AF_INET, '10.0.0.1'))
+
+
+def test_parse_netlink_addr_v6_link_local_only():
+    links = {3: 'eth0'}
+    global_v6 = _addr_msg(socket.AF_INET6, 3, (1, ipaddress.IPv6Address('2001:db8::1').packed))
+    link_local = _addr_msg(socket.AF_INET6, 3, (1, ipaddress.IPv6Address('fe80::1').packed))
+    assert _parse_netlink_addr(global_v6, links) is None
+    assert _parse_netlink_addr(link_local, links) == ('eth0', (3, socket.AF_INET6, 'fe80::1'))
+
+
+def test_parse_netlink_addr_prefix_length():
+    msg = _addr_msg(socket.AF_INET, 3, (1, socket.inet_aton('10.1.2.3')))
+    _, address = _parse_netlink_addr(msg, {3: 'eth0'})
+    assert address.prefixlen == 24
+    assert address.network() == ipaddress.IPv4Network('10.1.2.0/24')
+
+
+@pytest.mark.parametrize('mask,expected', [
+    ('255.255.255.0', 24),
+    ('255.255.255.255', 32),
+    ('0.0.0.0', 0),
+    ('255.255.240.0', 20),
+    ('ffff:ffff:ffff:ffff::', 64),
+])
+def test_prefix_length(mask, expected):
+    assert _prefix_length(ipaddress.ip_address(mask).packed) == expected
+
+
+def test_interface_address_is_a_plain_tuple_with_a_prefix():
+    address = InterfaceAddress(3, socket.AF_INET, '10.1.2.3', 24)
+    assert address == (3, socket.AF_INET, '10.1.2.3')
+    assert hash(address) == hash((3, socket.AF_INET, '10.1.2.3'))
+    idx, family, addr = address
+    assert (idx, family, addr) == (3, socket.AF_INET, '10.1.2.3')
+    assert InterfaceAddress(3, socket.AF_INET, '10.1.2.3').network() is None
+
+
+def test_parse_netlink_addr_unknown_link_skipped():
+    msg = _addr_msg(socket.AF_INET, 7, (1, socket.inet_aton('10.0.0.1')))
+    assert _parse_netlink_addr(msg, {3: 'eth0'}) is None
+
+
+@pytest.mark.skipif(not sys.platform.startswith('linux'), reason='rtnetlink is Linux only')
+def test_netlink_matches_getifaddrs():
+    from wakeonlan.interfaces import _enum_netlink
+    from wakeonlan.ifaddrs import _enum_unix
+    try:
+        via_netlink = _enum_netlink()
+    except OSError as ex:
+        pytest.skip(f'netlink unavailable: {ex}')
+    assert via_netlink == _enum_unix()
+    prefixes = {name: [address.prefixlen for address in addresses] for name, addresses in via_netlink.items()}
+    assert prefixes == {name: [address.prefixlen for address in addresses]
+                        for name, addresses in _enum_unix().items()}
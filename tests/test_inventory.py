@@ -0,0 +1,266 @@
+# pylint: disable=missing-function-docstring,missing-module-docstring
+
+"""Tests for the saved-name storage backends, migration between them, `ConfigStore`
+and batched edits."""
+
+import os
+import sqlite3
+
+import pytest
+
+from wakeonlan import HostRecord, WakeOnLanError, save_name, save_names, get_name_record, get_names, \
+    delete_name, delete_names, config_transaction, get_groups, save_group, delete_group
+from wakeonlan.inventory import ConfigStore, JsonBackend, SqliteBackend, get_backend, migrate, _db_path
+import wakeonlan.inventory
+
+
+RECORDS = {
+    'iface': HostRecord((1, 2, 3, 4, 5, 6), 'eth0', None, 9),
+    'addr': HostRecord((1, 2, 3, 4, 5, 7), None, '192.168.1.255', 7),
+    'plain': HostRecord((1, 2, 3, 4, 5, 8), None, None, 9),
+}
+
+
+def test_default_backend_is_json():
+    assert isinstance(get_backend(), JsonBackend)
+
+
+def test_env_selects_backend(monkeypatch):
+    monkeypatch.setenv('WAKEONLAN_STORE', 'sqlite')
+    assert isinstance(get_backend(), SqliteBackend)
+    monkeypatch.setenv('WAKEONLAN_STORE', 'xml')
+    with pytest.raises(WakeOnLanError):
+        get_backend()
+
+
+def test_sqlite_roundtrip(monkeypatch):
+    monkeypatch.setenv('WAKEONLAN_STORE', 'sqlite')
+    for name, record in RECORDS.items():
+        save_name(name, record)
+    assert os.path.exists(_db_path())
+    assert not os.path.exists(JsonBackend().path)
+    assert get_names() == RECORDS
+    assert get_name_record('addr') == RECORDS['addr']
+    assert get_name_record('nonesuch') is None
+    save_name('addr', RECORDS['plain'])
+    assert get_name_record('addr') == RECORDS['plain']
+    delete_name('addr')
+    delete_name('nonesuch')
+    assert set(get_names()) == {'iface', 'plain'}
+
+
+def test_sqlite_reopens_replaced_database(monkeypatch):
+    monkeypatch.setenv('WAKEONLAN_STORE', 'sqlite')
+    save_name('a', RECORDS['iface'])
+    assert set(get_names()) == {'a'}
+    os.unlink(_db_path())
+    assert get_names() == {}
+
+
+def test_sqlite_malformed_row_names_database(monkeypatch):
+    monkeypatch.setenv('WAKEONLAN_STORE', 'sqlite')
+    save_name('a', RECORDS['iface'])
+    with sqlite3.connect(_db_path()) as conn:
+        conn.execute("UPDATE names SET mac = 'bogus'")
+    conn.close()
+    with pytest.raises(WakeOnLanError, match='.wakeonlan.db'):
+        get_names()
+
+
+def test_migrate_roundtrip():
+    for name, record in RECORDS.items():
+        save_name(name, record)
+    assert migrate('sqlite') == len(RECORDS)
+    assert isinstance(get_backend(), SqliteBackend)
+    assert get_names() == RECORDS
+
+    save_name('new', RECORDS['plain'])
+    assert migrate('json') == len(RECORDS) + 1
+    assert not os.path.exists(_db_path())
+    assert isinstance(get_backend(), JsonBackend)
+    assert get_names() == dict(RECORDS, new=RECORDS['plain'])
+
+
+def test_migrate_to_json_without_database():
+    with pytest.raises(WakeOnLanError):
+        migrate('json')
+
+
+def test_config_home_reassigned_with_sqlite(monkeypatch, tmp_path):
+    import wakeonlan.wakeonlan as impl
+    from wakeonlan import AffinityCache
+    from wakeonlan.client import socket_path
+    save_name('old', RECORDS['iface'])
+    migrate('sqlite')
+    monkeypatch.setitem(impl.__dict__, 'CONFIG_HOME', tmp_path)
+    assert _db_path() == str(tmp_path / '.wakeonlan.db')
+    assert AffinityCache().path == str(tmp_path / '.wakeonlan.affinity')
+    assert socket_path() == str(tmp_path / '.wakeonlan.sock')
+    # the database left in the old home no longer takes over
+    assert get_names() == {}
+    monkeypatch.setenv('WAKEONLAN_STORE', 'sqlite')
+    save_name('new', RECORDS['plain'])
+    assert os.path.exists(tmp_path / '.wakeonlan.db')
+    assert get_names() == {'new': RECORDS['plain']}
+    monkeypatch.delitem(impl.__dict__, 'CONFIG_HOME')
+    assert get_names() == {'old': RECORDS['iface']}
+
+
+def test_cli_migrate(run_cli):
+    run_cli('-s', 'box', '01:02:03:04:05:06', '-i', 'eth0', expect_success=True)
+    result = run_cli('--migrate', 'sqlite', expect_success=True)
+    assert result.stdout.strip() == 'Migrated 1 names to sqlite'
+    assert os.path.exists(_db_path())
+    result = run_cli('--list', expect_success=True)
+    assert result.stdout.strip() == 'box - 01:02:03:04:05:06, eth0, 9'
+    run_cli('--migrate', 'sqlite', '-i', 'eth0', expect_success=False)
+
+
+@pytest.mark.parametrize('watch', [True, False])
+def test_config_store_caches_and_reloads(write_config, watch, monkeypatch):
+    write_config({'names': {'a': {'mac': '01:02:03:04:05:06'}}})
+    with ConfigStore(watch=watch) as store:
+        assert store.get('a') == HostRecord((1, 2, 3, 4, 5, 6), None, None, 9)
+
+        loads = []
+        real_load = wakeonlan.inventory._load_config
+        def counting_load():
+            loads.append(1)
+            return real_load()
+        monkeypatch.setattr(wakeonlan.inventory, '_load_config', counting_load)
+        for _ in range(10):
+            assert store.get('a') is not None
+        assert store.get('b') is None
+        assert loads == []
+
+        write_config({'names': {'b': {'mac': '01:02:03:04:05:07', 'port': 7}}})
+        assert store.get('a') is None
+        assert store.get('b') == HostRecord((1, 2, 3, 4, 5, 7), None, None, 7)
+        assert len(loads) == 1
+
+
+def test_config_store_warm_read_with_inotify_does_no_io(write_config, monkeypatch):
+    write_config({'names': {'a': {'mac': '01:02:03:04:05:06'}}})
+    with ConfigStore() as store:
+        if store._watch is None: # pylint: disable=protected-access
+            pytest.skip('inotify is not available')
+        store.get('a')
+        def no_io(*args):
+            raise AssertionError('unexpected stat')
+        monkeypatch.setattr(wakeonlan.inventory.os, 'stat', no_io)
+        assert store.get('a') is not None
+
+
+def test_config_store_writes_update_cache(monkeypatch):
+    with ConfigStore() as store:
+        store.save('a', RECORDS['iface'])
+        store.save('b', RECORDS['addr'])
+        store.delete('a')
+        monkeypatch.setattr(wakeonlan.inventory, '_load_config', lambda: pytest.fail('reloaded'))
+        assert store.get_all() == {'b': RECORDS['addr']}
+    monkeypatch.undo()
+    assert get_names() == {'b': RECORDS['addr']}
+
+
+def test_config_store_follows_migration():
+    save_name('a', RECORDS['iface'])
+    with ConfigStore() as store:
+        assert set(store.get_all()) == {'a'}
+        migrate('sqlite')
+        save_name('b', RECORDS['addr'])
+        assert set(store.get_all()) == {'a', 'b'}
+
+
+@pytest.fixture(params=['json', 'sqlite'])
+def store(request, monkeypatch):
+    monkeypatch.setenv('WAKEONLAN_STORE', request.param)
+    return request.param
+
+
+def test_save_and_delete_names_write_once(store, monkeypatch):
+    backend = get_backend()
+    applied = []
+    real_apply = backend.apply
+    def counting_apply(changes):
+        applied.append(len(changes))
+        real_apply(changes)
+    monkeypatch.setattr(backend, 'apply', counting_apply)
+
+    records = {f'host{i}': HostRecord((1, 2, 3, 4, 5, i), None, None, 9) for i in range(100)}
+    save_names(records)
+    assert get_names() == records
+    delete_names(f'host{i}' for i in range(50))
+    assert set(get_names()) == {f'host{i}' for i in range(50, 100)}
+    assert applied == [100, 50]
+
+
+def test_config_transaction_commits_once(store):
+    save_name('old', RECORDS['iface'])
+    with config_transaction() as txn:
+        for name, record in RECORDS.items():
+            txn.save(name, record)
+        txn.delete('old')
+        txn.delete('plain')
+        assert txn.get('old') is None
+        assert txn.get('addr') == RECORDS['addr']
+        assert set(txn.get_all()) == {'iface', 'addr'}
+        assert set(get_names()) == {'old'}
+    assert get_names() == {'iface': RECORDS['iface'], 'addr': RECORDS['addr']}
+
+
+def test_config_transaction_discarded_on_error(store):
+    save_name('old', RECORDS['iface'])
+    with pytest.raises(RuntimeError):
+        with config_transaction() as txn:
+            txn.save('new', RECORDS['addr'])
+            txn.delete('old')
+            raise RuntimeError()
+    assert get_names() == {'old': RECORDS['iface']}
+
+
+def test_groups_roundtrip(store):
+    save_names(RECORDS)
+    assert get_groups() == {}
+    save_group('rack', ['plain', 'iface', 'plain'])
+    save_group('other', ['addr'])
+    assert get_groups() == {'rack': ['plain', 'iface'], 'other': ['addr']}
+    save_group('rack', ['addr'])
+    delete_group('other')
+    delete_group('nonesuch')
+    assert get_groups() == {'rack': ['addr']}
+
+
+def test_save_group_requires_saved_members(store):
+    save_names(RECORDS)
+    with pytest.raises(WakeOnLanError, match='nonesuch'):
+        save_group('rack', ['plain', 'nonesuch'])
+    with pytest.raises(WakeOnLanError):
+        save_group('rack', [])
+    assert get_groups() == {}
+
+
+def test_deleted_names_leave_groups(store):
+    save_names(RECORDS)
+    save_group('rack', ['plain', 'iface', 'addr'])
+    save_group('other', ['addr'])
+    delete_name('iface')
+    assert get_groups() == {'rack': ['plain', 'addr'], 'other': ['addr']}
+    delete_names(['addr'])
+    assert get_groups() == {'rack': ['plain']}
+
+
+def test_names_cannot_start_with_at(store):
+    with pytest.raises(WakeOnLanError, match='@'):
+        save_name('@rack', RECORDS['plain'])
+    with pytest.raises(WakeOnLanError, match='@'):
+        save_names({'ok': RECORDS['plain'], '@rack': RECORDS['iface']})
+    assert get_names() == {}
+
+
+def test_migrate_keeps_groups():
+    save_names(RECORDS)
+    save_group('rack', ['iface', 'addr'])
+    migrate('sqlite')
+    assert get_groups() == {'rack': ['iface', 'addr']}
+    migrate('json')
+    assert get_groups() == {'rack': ['iface', 'addr']}
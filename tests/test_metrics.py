@@ -0,0 +1,118 @@
+# pylint: disable=missing-function-docstring,missing-module-docstring,redefined-outer-name
+
+"""Tests for the OpenMetrics registry and the metrics the wake functions report."""
+
+import os
+import socket
+import urllib.request
+
+import pytest
+
+from wakeonlan import HostRecord, get_names, save_name, wake, wake_many
+from wakeonlan import metrics
+from wakeonlan.interfaces import enum_interfaces
+
+
+@pytest.fixture
+def collector():
+    yield metrics.enable()
+    metrics.disable()
+
+
+def test_render():
+    registry = metrics.MetricsRegistry()
+    counter = registry.counter('test_events', 'Events "seen"', ('kind',))
+    counter.inc(labels=('a',))
+    counter.inc(2.5, ('b\n',))
+    histogram = registry.histogram('test_seconds', 'Durations', buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 3.0):
+        histogram.observe(value)
+    assert registry.render() == '\n'.join([
+        '# TYPE test_events counter',
+        '# HELP test_events Events \\"seen\\"',
+        'test_events_total{kind="a"} 1',
+        'test_events_total{kind="b\\n"} 2.5',
+        '# TYPE test_seconds histogram',
+        '# HELP test_seconds Durations',
+        'test_seconds_bucket{le="0.1"} 2',
+        'test_seconds_bucket{le="1.0"} 3',
+        'test_seconds_bucket{le="+Inf"} 4',
+        'test_seconds_count 4',
+        'test_seconds_sum 3.65',
+        '# EOF\n'])
+    with pytest.raises(ValueError):
+        counter.inc(-1)
+
+
+def test_disabled_by_default(sink):
+    assert metrics.collector is None
+    wake(HostRecord((1, 2, 3, 4, 5, 6), None, '127.0.0.1', sink.getsockname()[1]))
+    sink.recvfrom(200)
+    assert metrics.collector is None
+
+
+def test_wakes_are_counted(collector, sink):
+    port = sink.getsockname()[1]
+    wake(HostRecord((1, 2, 3, 4, 5, 6), None, '127.0.0.1', port))
+    wake_many([HostRecord((1, 2, 3, 4, 5, i), None, '127.0.0.1', port) for i in range(3)] +
+              [HostRecord((1, 2, 3, 4, 5, 9), None, 'nohost.invalid', port)])
+    for _ in range(4):
+        sink.recvfrom(200)
+    assert collector.packets_sent.value(('address', '')) == 4
+    assert collector.bytes_sent.value(('address', '')) == 4 * 102
+    assert collector.bulk_wake_hosts.value() == 4
+    assert collector.bulk_wake_seconds.count() == 1
+    # resolver errors have negative codes, so are counted by type
+    assert collector.send_failures.value(('gaierror',)) == 1
+
+
+def test_send_failures_by_errno(collector, monkeypatch):
+    import wakeonlan.interfaces
+    monkeypatch.setattr(wakeonlan.interfaces.interface_cache, 'get',
+                        lambda: {'gone': [(2, socket.AF_INET, '198.51.100.1')]})
+    wake(HostRecord((1, 2, 3, 4, 5, 6)))
+    assert collector.send_failures.value(('EADDRNOTAVAIL',)) == 1
+
+
+def test_planning_failures_are_counted(collector):
+    wake_many([HostRecord((1, 2, 3, 4, 5, 6), 'nonesuch'), HostRecord((1, 2, 3, 4, 5, 7), None, None, 9, 'udp', 'x')])
+    assert collector.send_failures.value(('EPLAN',)) == 2
+    assert collector.packets_sent.value(('interface', 'nonesuch')) == 0
+
+
+def test_durations_are_observed(collector):
+    enum_interfaces()
+    save_name('h', HostRecord((1, 2, 3, 4, 5, 6)))
+    get_names()
+    assert collector.enumeration_seconds.count() == 1
+    assert collector.config_load_seconds.count() >= 1
+
+
+def test_write_and_serve(collector, test_home):
+    collector.bulk_wake(10, 0.5)
+    path = os.path.join(test_home.name, 'wakeonlan.prom')
+    collector.write(path)
+    with open(path, encoding='utf-8') as f:
+        text = f.read()
+    assert 'wakeonlan_bulk_wake_hosts_total 10\n' in text
+    assert text.endswith('# EOF\n')
+
+    server = collector.serve(0)
+    try:
+        with urllib.request.urlopen(f'http://127.0.0.1:{server.server_address[1]}/metrics') as response:
+            assert response.headers['Content-Type'] == metrics.CONTENT_TYPE
+            assert response.read().decode('utf-8') == collector.render()
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_cli_metrics_file(run_cli, sink, test_home):
+    path = os.path.join(test_home.name, 'wake.prom')
+    run_cli('01:02:03:04:05:06', '-a', '127.0.0.1', '-p', str(sink.getsockname()[1]),
+            '--metrics-file', path, expect_success=True)
+    sink.recvfrom(200)
+    with open(path, encoding='utf-8') as f:
+        assert 'wakeonlan_packets_sent_total{kind="address",interface=""} 1\n' in f.read()
+    run_cli('--list', '--metrics-file', path, expect_success=False)
+    run_cli('01:02:03:04:05:06', '--metrics-port', '9100', expect_success=False)
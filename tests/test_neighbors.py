@@ -0,0 +1,178 @@
+# pylint: disable=missing-function-docstring,missing-module-docstring,redefined-outer-name
+
+"""Tests for finding MACs from IP addresses and waking by IP.
+
+The kernel's tables are replaced with fixed ones, except where parsing them
+is tested.
+"""
+
+import json
+import os
+import socket
+import struct
+
+import pytest
+
+import wakeonlan.interfaces
+from wakeonlan import HostRecord, MacCache, WakeOnLanError, get_name_record, resolve_macs, wake_by_ip
+from wakeonlan import neighbors
+from wakeonlan.interfaces import InterfaceAddress
+
+
+MAC = (0x02, 0x11, 0x22, 0x33, 0x44, 0x55)
+MAC_STR = '02:11:22:33:44:55'
+
+
+@pytest.fixture
+def tables(monkeypatch):
+    """replace the neighbor tables, counting how often each is read"""
+    arp = {'127.0.0.2': MAC_STR, '127.0.0.1': '02:00:00:00:00:01'}
+    ndp = {'fe80::1': '02:00:00:00:00:06'}
+    reads = {'arp': 0, 'ndp': 0}
+    def read_arp():
+        reads['arp'] += 1
+        return dict(arp)
+    def read_neighbors6():
+        reads['ndp'] += 1
+        return dict(ndp)
+    monkeypatch.setattr(neighbors, 'read_arp', read_arp)
+    monkeypatch.setattr(neighbors, 'read_neighbors6', read_neighbors6)
+    return arp, ndp, reads
+
+
+@pytest.fixture
+def cache(test_home):
+    return MacCache(os.path.join(test_home.name, 'macs'))
+
+
+def test_read_arp(tmp_path):
+    path = tmp_path / 'arp'
+    path.write_text(
+        'IP address       HW type     Flags       HW address            Mask     Device\n'
+        '192.168.1.1      0x1         0x2         aa:bb:cc:dd:ee:01     *        eth0\n'
+        '192.168.1.2      0x1         0x0         00:00:00:00:00:00     *        eth0\n'
+        '192.168.1.3      0x1         0x6         aa:bb:cc:dd:ee:03     *        eth1\n'
+        'garbage\n', encoding='ascii')
+    assert neighbors.read_arp(str(path)) == {'192.168.1.1': 'AA:BB:CC:DD:EE:01', '192.168.1.3': 'AA:BB:CC:DD:EE:03'}
+    assert neighbors.read_arp(str(tmp_path / 'missing')) == {}
+
+
+def _neighbor(address, lladdr, state):
+    body = neighbors._ndmsg.pack(socket.AF_INET6, 1, state, 0, 0)
+    for attr_type, value in ((neighbors._NDA_DST, socket.inet_pton(socket.AF_INET6, address)),
+                             (neighbors._NDA_LLADDR, lladdr)):
+        attr = struct.pack('=HH', 4 + len(value), attr_type) + value
+        body += attr + b'\x00' * (-len(attr) % 4)
+    return neighbors._RTM_NEWNEIGH, memoryview(body)
+
+
+@pytest.mark.skipif(not hasattr(socket, 'AF_NETLINK'), reason='needs rtnetlink')
+def test_read_neighbors6(monkeypatch):
+    replies = [_neighbor('fe80::1', bytes(MAC), 0x02),
+               _neighbor('fe80::2', bytes(MAC), 0x01),
+               _neighbor('ff02::1', b'\x33\x33\x00\x00\x00\x01', 0x40)]
+    monkeypatch.setattr(neighbors, '_nl_dump', lambda *args: iter(replies))
+    assert neighbors.read_neighbors6() == {'fe80::1': MAC_STR}
+
+
+def test_resolve_from_table_and_cache(tables, cache):
+    arp, _, _ = tables
+    assert resolve_macs(['127.0.0.2', '198.51.100.9'], cache) == {'127.0.0.2': MAC, '198.51.100.9': None}
+    assert MacCache(cache.path).get('127.0.0.2') == MAC_STR
+    # a sleeping host drops out of the table
+    arp.clear()
+    assert resolve_macs(['127.0.0.2'], cache) == {'127.0.0.2': MAC}
+    assert resolve_macs(['127.0.0.2']) == {'127.0.0.2': None}
+
+
+def test_unchanged_cache_not_rewritten(tables, cache):
+    # pylint: disable=unused-argument
+    resolve_macs(['127.0.0.2'], cache)
+    os.unlink(cache.path)
+    resolve_macs(['127.0.0.2'], cache)
+    assert not os.path.exists(cache.path)
+
+
+def test_host_ip_only_without_explicit_target():
+    assert neighbors._host_ip('198.51.100.7', None) == '198.51.100.7'
+    assert neighbors._host_ip('198.51.100.7', 'eth0') is None
+    assert neighbors._host_ip('198.51.100.7', None, '198.51.100.255') is None
+    assert neighbors._host_ip('fe80::1', None) is None
+
+
+def test_bulk_reads_table_once(tables, cache):
+    arp, _, reads = tables
+    arp.update({f'10.0.{i // 256}.{i % 256}': f'02:00:00:00:{i // 256:02X}:{i % 256:02X}' for i in range(5000)})
+    ips = [f'10.0.{i // 256}.{i % 256}' for i in range(5000)]
+    macs = resolve_macs(ips, cache)
+    assert reads == {'arp': 1, 'ndp': 0}
+    assert macs['10.0.19.135'] == (2, 0, 0, 0, 0x13, 0x87)
+    assert all(mac is not None for mac in macs.values())
+
+
+def test_ipv6_and_names(tables):
+    _, _, reads = tables
+    assert resolve_macs(['FE80:0::1', 'localhost']) == {'FE80:0::1': (2, 0, 0, 0, 0, 6),
+                                                        'localhost': (2, 0, 0, 0, 0, 1)}
+    assert reads['ndp'] == 1
+    assert resolve_macs(['nohost.invalid']) == {'nohost.invalid': None}
+
+
+def test_wake_by_ip_targets_subnet(tables, cache, monkeypatch):
+    # pylint: disable=unused-argument
+    ifaces = {'lo': [InterfaceAddress(1, socket.AF_INET, '127.0.0.1', 30)]}
+    monkeypatch.setattr(wakeonlan.interfaces.interface_cache, 'get', lambda: ifaces)
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as rx:
+        rx.bind(('127.0.0.3', 0))
+        rx.settimeout(2)
+        result = wake_by_ip('127.0.0.2', port=rx.getsockname()[1], cache=cache)
+        assert result.record == HostRecord(MAC, port=rx.getsockname()[1], host_ip='127.0.0.2')
+        assert result.sent == ['lo']
+        assert rx.recv(1024) == b'\xff' * 6 + bytes(MAC) * 16
+
+
+def test_wake_by_name_targets_subnet_of_address_found(tables, cache, monkeypatch):
+    # pylint: disable=unused-argument
+    ifaces = {'lo': [InterfaceAddress(1, socket.AF_INET, '127.0.0.1', 30)]}
+    monkeypatch.setattr(wakeonlan.interfaces.interface_cache, 'get', lambda: ifaces)
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as rx:
+        rx.bind(('127.0.0.3', 0))
+        rx.settimeout(2)
+        result = wake_by_ip('localhost', port=rx.getsockname()[1], cache=cache)
+        assert result.record.host_ip == '127.0.0.1'
+        assert result.sent == ['lo']
+
+
+def test_wake_by_ip_unknown(tables, cache):
+    # pylint: disable=unused-argument
+    with pytest.raises(WakeOnLanError, match='198.51.100.9'):
+        wake_by_ip('198.51.100.9', cache=cache)
+
+
+def _learn(test_home, ip, mac):
+    cache = MacCache(os.path.join(test_home.name, '.wakeonlan.macs'))
+    cache.learn(ip, mac)
+    cache.save()
+
+
+def test_cli_save_by_ip(run_cli, test_home):
+    _learn(test_home, '198.51.100.7', MAC_STR)
+    run_cli('--save', 'box', '--ip', '198.51.100.7', expect_success=True)
+    assert get_name_record('box') == HostRecord(MAC, host_ip='198.51.100.7')
+    run_cli('--save', 'eth', '--ip', '198.51.100.7', '-i', 'eth0', expect_success=True)
+    with open(os.path.join(test_home.name, '.wakeonlan'), encoding='utf-8') as f:
+        assert json.load(f)['names']['eth'] == {'mac': MAC_STR, 'interface': 'eth0'}
+
+
+def test_cli_unknown_ip(run_cli):
+    result = run_cli('--ip', '198.51.100.9', expect_success=False)
+    assert 'not found' in result.stderr
+
+
+@pytest.mark.parametrize('argv', [
+    ['--ip', '198.51.100.7', MAC_STR],
+    ['--ip', '198.51.100.7', '--list'],
+    ['--learn', 'lo', '--ip', '198.51.100.7'],
+])
+def test_cli_ip_rejected(run_cli, argv):
+    run_cli(*argv, expect_success=False)
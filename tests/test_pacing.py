@@ -0,0 +1,240 @@
+# pylint: disable=missing-function-docstring,missing-module-docstring
+
+"""Tests for `Pacer`, `SendScheduler` and paced or repeated sends.
+
+Most tests drive the scheduler and pacer with the `clock` fixture, whose
+`sleep` just advances time, so they check the schedule exactly and run
+instantly.
+"""
+
+import errno
+import time
+
+import pytest
+
+from wakeonlan import HostRecord, Pacer, Repeat, wake, wake_many
+from wakeonlan.pacing import TokenBucket, SendScheduler
+
+
+class FakeSocket:
+    def __init__(self, clock, failures=()):
+        self.clock = clock
+        self.failures = list(failures)
+        self.sent = []
+
+    def sendto(self, payload, dest):
+        failure = self.failures.pop(0) if self.failures else None
+        if failure is not None:
+            raise OSError(failure, 'fake failure')
+        self.sent.append(self.clock.now)
+
+
+def _scheduler(clock, repeat=None, pacer=None):
+    return SendScheduler(repeat, pacer, clock=clock, sleep=clock.sleep)
+
+
+def test_token_bucket_burst_then_rate():
+    bucket = TokenBucket(10, burst=3)
+    delays = [bucket.reserve(0.0) for _ in range(6)]
+    assert delays == pytest.approx([0, 0, 0, 0.1, 0.2, 0.3])
+    # idle time refills the bucket, but never beyond the burst
+    assert [bucket.reserve(10.0) for _ in range(4)] == pytest.approx([0, 0, 0, 0.1])
+
+
+def test_token_bucket_rejects_bad_limits():
+    with pytest.raises(ValueError):
+        TokenBucket(0)
+    with pytest.raises(ValueError):
+        TokenBucket(10, burst=0)
+
+
+def test_pacer_global_rate(clock):
+    pacer = Pacer(rate=100, clock=clock)
+    scheduler = _scheduler(clock, pacer=pacer)
+    sock = FakeSocket(clock)
+    for i in range(50):
+        scheduler.add(sock, b'', None, ('if', i % 3), lambda *_: None)
+    scheduler.run()
+    gaps = [b - a for a, b in zip(sock.sent, sock.sent[1:])]
+    assert gaps == pytest.approx([0.01] * 49)
+    stats = pacer.stats()
+    assert stats.packets == 50
+    assert stats.rate() == pytest.approx(100)
+
+
+def test_pacer_per_interface_rate(clock):
+    scheduler = _scheduler(clock, pacer=Pacer(interface_rate=10, clock=clock))
+    first, second = FakeSocket(clock), FakeSocket(clock)
+    for _ in range(3):
+        scheduler.add(first, b'', None, 'a', lambda *_: None)
+        scheduler.add(second, b'', None, 'b', lambda *_: None)
+    scheduler.run()
+    assert [b - a for a, b in zip(first.sent, first.sent[1:])] == pytest.approx([0.1, 0.1])
+    assert [b - a for a, b in zip(second.sent, second.sent[1:])] == pytest.approx([0.1, 0.1])
+
+
+def test_pacer_retries_on_backpressure(clock):
+    pacer = Pacer(rate=1000, clock=clock)
+    scheduler = _scheduler(clock, Repeat(backoff=0.1), pacer)
+    pushed_back = FakeSocket(clock, [errno.ENOBUFS, errno.EAGAIN])
+    other = FakeSocket(clock)
+    scheduler.add(pushed_back, b'', None, 'a', lambda *_: None)
+    scheduler.add(other, b'', None, 'b', lambda *_: None)
+    scheduler.run()
+    assert pushed_back.sent == pytest.approx([0.3])
+    assert pacer.stats().retries == 2
+    # other sends wait out both backoffs too
+    assert other.sent == pytest.approx([0.3])
+
+
+def test_backoff_holds_back_reserved_packets(clock):
+    pacer = Pacer(rate=10, clock=clock)
+    scheduler = _scheduler(clock, Repeat(backoff=0.5), pacer)
+    # the second packet is pushed back, after the last two already have their slots
+    sock = FakeSocket(clock, [None, errno.ENOBUFS])
+    for _ in range(4):
+        scheduler.add(sock, b'', None, 'a', lambda *_: None)
+    scheduler.run()
+    assert sock.sent == pytest.approx([0.0, 0.6, 0.6, 0.6])
+    assert pacer.stats().retries == 1
+
+
+def test_pacer_counts_only_sent_packets(clock):
+    pacer = Pacer(rate=1000, clock=clock)
+    scheduler = _scheduler(clock, Repeat(retries=2), pacer)
+    scheduler.add(FakeSocket(clock, [errno.ENOBUFS] * 3), b'', None, 'a', lambda *_: None)
+    scheduler.add(FakeSocket(clock, [errno.EPERM]), b'', None, 'b', lambda *_: None)
+    scheduler.run()
+    assert pacer.stats().packets == 0
+    assert pacer.stats().retries == 2
+
+
+def test_wake_many_paced(sink):
+    port = sink.getsockname()[1]
+    pacer = Pacer(rate=200, burst=1)
+    start = time.monotonic()
+    results = wake_many([HostRecord((1, 2, 3, 4, 5, i), None, '127.0.0.1', port) for i in range(20)],
+                        pacer=pacer)
+    elapsed = time.monotonic() - start
+    assert all(res.succeeded() for res in results)
+    assert elapsed >= 19 / 200 * 0.9
+    assert pacer.stats().packets == 20
+    assert pacer.stats().rate() <= 200 * 1.1
+    for _ in range(20):
+        sink.recvfrom(200)
+
+
+def test_wake_paced(sink):
+    pacer = Pacer(rate=1000)
+    wake(HostRecord((1, 2, 3, 4, 5, 6), None, '127.0.0.1', sink.getsockname()[1]), pacer=pacer)
+    assert pacer.stats().packets == 1
+    sink.recvfrom(200)
+
+
+def test_scheduler_spaces_repeats_from_first_packet(clock):
+    scheduler = _scheduler(clock, Repeat(count=3, interval=0.5))
+    sockets = [FakeSocket(clock), FakeSocket(clock)]
+    done = []
+    for sock in sockets:
+        scheduler.add(sock, b'', None, 'a', lambda *outcome: done.append(outcome))
+    scheduler.run()
+    # both targets are served by the one timer rather than one after the other
+    assert [sock.sent for sock in sockets] == [[0.0, 0.5, 1.0]] * 2
+    assert done == [(None, 3), (None, 3)]
+    assert clock.now == 1.0
+
+
+def test_scheduler_send_first(clock):
+    scheduler = _scheduler(clock, Repeat(count=2, interval=0.5))
+    sock = FakeSocket(clock)
+    done = []
+    scheduler.send_first(sock, b'', None, 'a', lambda *outcome: done.append(outcome))
+    assert sock.sent == [0.0]
+    assert not done
+    scheduler.run()
+    assert sock.sent == [0.0, 0.5]
+    assert done == [(None, 2)]
+
+
+def test_scheduler_retries_transient_errors_with_backoff(clock):
+    scheduler = _scheduler(clock, Repeat(count=2, interval=1.0, backoff=0.1))
+    flapping = FakeSocket(clock, [errno.ENETUNREACH, errno.ENETUNREACH])
+    healthy = FakeSocket(clock)
+    done = {}
+    scheduler.add(flapping, b'', None, 'a', lambda error, _: done.setdefault('flapping', error))
+    scheduler.add(healthy, b'', None, 'b', lambda error, _: done.setdefault('healthy', error))
+    scheduler.run()
+    assert flapping.sent == pytest.approx([0.3, 1.3])
+    assert healthy.sent == [0.0, 1.0]
+    assert done == {'flapping': None, 'healthy': None}
+
+
+def test_scheduler_gives_up(clock):
+    scheduler = _scheduler(clock, Repeat(count=3, retries=2))
+    fatal = FakeSocket(clock, [errno.EPERM])
+    exhausted = FakeSocket(clock, [errno.ENOBUFS] * 3)
+    done = []
+    scheduler.add(fatal, b'', None, 'a', lambda error, _: done.append(error))
+    scheduler.add(exhausted, b'', None, 'b', lambda error, _: done.append(error))
+    scheduler.run()
+    assert [error.errno for error in done] == [errno.EPERM, errno.ENOBUFS]
+    assert fatal.sent == exhausted.sent == []
+    assert clock.now == pytest.approx(0.15)
+
+
+def test_scheduler_paced(clock):
+    pacer = Pacer(interface_rate=10, clock=clock)
+    scheduler = _scheduler(clock, Repeat(count=2, interval=0.0), pacer)
+    first, second = FakeSocket(clock), FakeSocket(clock, [errno.ENOBUFS])
+    scheduler.add(first, b'', None, 'a', lambda *_: None)
+    scheduler.add(second, b'', None, 'b', lambda *_: None)
+    scheduler.run()
+    assert first.sent == pytest.approx([0.0, 0.1])
+    # the retry paused both sockets but didn't cost the second one its slot
+    assert second.sent == pytest.approx([0.05, 0.1])
+    assert pacer.stats() == (4, pytest.approx(0.1), 1)
+
+
+def test_scheduler_rejects_bad_repeat():
+    with pytest.raises(ValueError):
+        SendScheduler(Repeat(count=0))
+    with pytest.raises(ValueError):
+        SendScheduler(Repeat(retries=-1))
+
+
+def test_wake_many_repeated(sink):
+    port = sink.getsockname()[1]
+    start = time.monotonic()
+    results = wake_many([HostRecord((1, 2, 3, 4, 5, i), None, '127.0.0.1', port) for i in range(10)],
+                        repeat=Repeat(count=3, interval=0.05))
+    assert time.monotonic() - start < 0.5
+    assert all(res.succeeded() for res in results)
+    payloads = [sink.recvfrom(200)[0] for _ in range(30)]
+    assert all(payloads.count(payload) == 3 for payload in payloads)
+
+
+def test_wake_repeated(sink):
+    wake(HostRecord((1, 2, 3, 4, 5, 6), None, '127.0.0.1', sink.getsockname()[1]),
+         repeat=Repeat(count=2, interval=0.01))
+    assert sink.recvfrom(200)[0] == sink.recvfrom(200)[0]
+
+
+def test_cli_repeat(run_cli, sink):
+    port = sink.getsockname()[1]
+    run_cli('01:02:03:04:05:06', '-a', '127.0.0.1', '-p', str(port), '--repeat', '3',
+            '--repeat-interval', '0.01', expect_success=True)
+    for _ in range(3):
+        sink.recvfrom(200)
+    run_cli('01:02:03:04:05:06', '--repeat-interval', '1', expect_success=False)
+    run_cli('--list', '--repeat', '2', expect_success=False)
+    run_cli('01:02:03:04:05:06', '--repeat', '0', expect_success=False)
+
+
+def test_cli_rate(run_cli, sink):
+    port = sink.getsockname()[1]
+    result = run_cli('01:02:03:04:05:06', '-a', '127.0.0.1', '-p', str(port), '--rate', '50',
+                     expect_success=True)
+    assert 'paced: 1 packets' in result.stdout
+    run_cli('--list', '--rate', '50', expect_success=False)
+    run_cli('01:02:03:04:05:06', '--burst', '5', expect_success=False)
+    run_cli('01:02:03:04:05:06', '--rate', '0', expect_success=False)
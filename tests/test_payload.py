@@ -11,7 +11,8 @@ import socket
 
 import pytest
 
-from wakeonlan.wakeonlan import _payload, _wake_with_dest
+from wakeonlan import HostRecord, wake
+from wakeonlan.wakeonlan import _payload
 
 
 def test_payload_is_exactly_102_bytes():
@@ -42,6 +43,13 @@ def test_payload_byte_for_byte(mac):
     assert bytes(_payload(mac)) == expected
 
 
+def test_payload_is_immutable_and_cached():
+    mac = (0x01, 0x02, 0x03, 0x04, 0x05, 0x06)
+    payload = _payload(mac)
+    assert isinstance(payload, bytes)
+    assert _payload(mac) is payload
+
+
 # --------------------------------------------------------------------------- #
 # End-to-end: actually emit a packet and recv it on a local UDP socket.
 # This catches a class of bug a pure in-memory test would miss -- e.g. the
@@ -49,14 +57,14 @@ def test_payload_byte_for_byte(mac):
 # loopback under some kernels.
 # --------------------------------------------------------------------------- #
 
-def test_wake_with_dest_actually_transmits_correct_packet():
+def test_wake_with_address_actually_transmits_correct_packet():
     mac = (0x01, 0x02, 0x03, 0x04, 0x05, 0x06)
     rx = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
     try:
         rx.bind(('127.0.0.1', 0))
         rx.settimeout(2)
         port = rx.getsockname()[1]
-        _wake_with_dest(mac, ('127.0.0.1', port))
+        wake(HostRecord(mac, None, '127.0.0.1', port))
         data, _ = rx.recvfrom(200)
     finally:
         rx.close()
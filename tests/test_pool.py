@@ -0,0 +1,83 @@
+# pylint: disable=missing-function-docstring,missing-module-docstring
+
+"""Tests for `SocketPool` and the pooled send paths."""
+
+import socket
+
+import pytest
+
+import wakeonlan.pool
+from wakeonlan import HostRecord, SocketPool, wake, wake_many
+
+
+@pytest.fixture
+def opened(monkeypatch):
+    keys = []
+    real_open = wakeonlan.pool._open_socket
+    def counting_open(key):
+        keys.append(key)
+        return real_open(key)
+    monkeypatch.setattr(wakeonlan.pool, '_open_socket', counting_open)
+    return keys
+
+
+def test_wake_with_pool_reuses_socket(sink, opened):
+    port = sink.getsockname()[1]
+    with SocketPool() as pool:
+        for i in range(5):
+            wake(HostRecord((1, 2, 3, 4, 5, i), None, '127.0.0.1', port), pool=pool)
+        assert len(pool) == 1
+    assert len(opened) == 1
+    assert len({sink.recvfrom(200)[0] for _ in range(5)}) == 5
+
+
+def test_wake_many_with_pool_keeps_socket_open(sink, opened):
+    port = sink.getsockname()[1]
+    records = [HostRecord((1, 2, 3, 4, 5, i), None, '127.0.0.1', port) for i in range(5)]
+    with SocketPool() as pool:
+        assert all(res.succeeded() for res in wake_many(records, pool))
+        assert all(res.succeeded() for res in wake_many(records, pool))
+    assert len(opened) == 1
+
+
+def test_pool_closes_idle_sockets(opened):
+    pool = SocketPool(idle_timeout=0)
+    key = ('dest', socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+    sock = pool.get(key)
+    # not while it is in use
+    pool.close_idle()
+    assert len(pool) == 1
+    pool.release(key, sock)
+    pool.close_idle()
+    assert len(pool) == 0
+    assert sock.fileno() == -1
+
+
+def test_pool_discard_rebuilds(opened):
+    with SocketPool() as pool:
+        key = ('dest', socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+        first = pool.get(key)
+        assert pool.get(key) is first
+        pool.release(key, first)
+        pool.discard(key)
+        # still in use by one caller, so only closed once that releases it
+        assert first.fileno() != -1
+        assert pool.get(key) is not first
+        pool.release(key, first)
+        assert first.fileno() == -1
+    assert len(opened) == 2
+
+
+def test_pool_sweep_spares_sockets_in_use(opened):
+    pool = SocketPool(idle_timeout=0)
+    key4 = ('dest', socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+    key6 = ('dest', socket.AF_INET6, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+    busy = pool.get(key4)
+    # another caller's get sweeps while the first is still sending
+    other = pool.get(key6)
+    assert busy.fileno() != -1
+    pool.release(key4, busy)
+    pool.release(key6, other)
+    pool.close_idle()
+    assert busy.fileno() == -1
+    assert len(pool) == 0
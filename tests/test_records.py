@@ -87,6 +87,15 @@ def test_record_with_interface_and_ip_prefers_interface(write_config):
     assert rec.address is None
 
 
+def test_record_with_host_ip(write_config):
+    write_config({'names': {'box': {
+        'mac': '01:02:03:04:05:06', 'host_ip': '192.168.1.20/24'}}})
+    rec = get_name_record('box')
+    assert rec is not None
+    assert rec.host_ip == '192.168.1.20/24'
+    assert rec.interface is None and rec.address is None
+
+
 def test_record_with_explicit_port(write_config):
     write_config({'names': {'box': {
         'mac': '01:02:03:04:05:06', 'port': 7}}})
@@ -112,6 +121,9 @@ def test_record_with_explicit_port(write_config):
     ([1, 2, 3],                                     'record not a dict'),
     ({'mac': '01:02:03:04:05:06', 'interface': ''}, 'empty interface'),
     ({'mac': '01:02:03:04:05:06', 'interface': 7},  'non-string interface'),
+    ({'mac': '01:02:03:04:05:06', 'host_ip': '192.168.1.300'}, 'host ip malformed'),
+    ({'mac': '01:02:03:04:05:06', 'host_ip': '192.168.1.3/33'}, 'host prefix too long'),
+    ({'mac': '01:02:03:04:05:06', 'host_ip': 'fe80::1'}, 'host ip not IPv4'),
 ])
 def test_malformed_record_rejected(write_config, record, reason):
     write_config({'names': {'test': record}})
@@ -0,0 +1,113 @@
+# pylint: disable=missing-function-docstring,missing-module-docstring
+
+"""Tests for `--import` / `--export` of inventories."""
+
+import json
+import os
+
+import pytest
+
+from wakeonlan import HostRecord, WakeOnLanError, get_names, save_names, delete_names
+from wakeonlan.transfer import import_names, export_names
+import wakeonlan.transfer
+
+
+RECORDS = {
+    'iface': HostRecord((1, 2, 3, 4, 5, 6), 'eth0', None, 9),
+    'addr': HostRecord((1, 2, 3, 4, 5, 7), None, '192.168.1.255', 7),
+    'plain': HostRecord((1, 2, 3, 4, 5, 8), None, None, 9),
+    'subnet': HostRecord((1, 2, 3, 4, 5, 9), None, None, 9, 'ethernet', '192.168.1.20/24'),
+}
+
+
+@pytest.fixture(params=['json', 'sqlite'])
+def store(request, monkeypatch):
+    monkeypatch.setenv('WAKEONLAN_STORE', request.param)
+    return request.param
+
+
+@pytest.mark.parametrize('ext', ['csv', 'ndjson', 'jsonl', 'json'])
+def test_export_import_roundtrip(store, tmp_path, ext):
+    save_names(RECORDS)
+    path = str(tmp_path / f'inventory.{ext}')
+    assert export_names(path) == len(RECORDS)
+    save_names({'extra': RECORDS['plain']})
+    delete_names(RECORDS)
+    assert import_names(path) == len(RECORDS)
+    assert get_names() == dict(RECORDS, extra=RECORDS['plain'])
+
+
+def test_import_csv_with_optional_columns(tmp_path):
+    path = tmp_path / 'hosts.csv'
+    path.write_text('mac,name,port\n01:02:03:04:05:06,a,\n01:02:03:04:05:07,b,7\n', encoding='utf-8')
+    assert import_names(str(path)) == 2
+    assert get_names() == {'a': HostRecord((1, 2, 3, 4, 5, 6), None, None, 9),
+                           'b': HostRecord((1, 2, 3, 4, 5, 7), None, None, 7)}
+
+
+@pytest.mark.parametrize('content, message', [
+    ('name,mac\na,01:02:03:04:05:06\nb,bogus\n', 'line 3'),
+    ('name,port\na,7\n', '`name` and `mac` columns'),
+    ('name,mac,port\na,01:02:03:04:05:06,x\n', 'port'),
+    ('name,mac\na,01:02:03:04:05:06\n@rack,01:02:03:04:05:07\n', 'must not start with @'),
+])
+def test_import_bad_csv_writes_nothing(store, tmp_path, content, message):
+    path = tmp_path / 'hosts.csv'
+    path.write_text(content, encoding='utf-8')
+    with pytest.raises(WakeOnLanError, match=message):
+        import_names(str(path))
+    assert get_names() == {}
+
+
+def test_import_bad_ndjson_writes_nothing(store, tmp_path):
+    path = tmp_path / 'hosts.ndjson'
+    path.write_text('{"name": "a", "mac": "01:02:03:04:05:06"}\n\n{"mac": "01:02:03:04:05:07"}\n',
+                    encoding='utf-8')
+    with pytest.raises(WakeOnLanError, match='line 3'):
+        import_names(str(path))
+    assert get_names() == {}
+
+
+def test_import_save_failure_is_not_a_read_error(tmp_path, monkeypatch):
+    path = tmp_path / 'hosts.ndjson'
+    path.write_text('{"name": "a", "mac": "01:02:03:04:05:06"}\n', encoding='utf-8')
+    def failing_replace(src, dst):
+        raise PermissionError(13, 'Permission denied')
+    monkeypatch.setattr(os, 'replace', failing_replace)
+    with pytest.raises(WakeOnLanError, match='Unable to save') as info:
+        import_names(str(path))
+    assert str(path) not in str(info.value)
+    with pytest.raises(WakeOnLanError, match='Unable to read'):
+        import_names(str(tmp_path / 'missing.ndjson'))
+
+
+def test_export_failure_keeps_existing_file(store, tmp_path, monkeypatch):
+    save_names(RECORDS)
+    path = tmp_path / 'hosts.ndjson'
+    path.write_text('old\n', encoding='utf-8')
+    def failing_write(stream, records):
+        stream.write('partial\n')
+        raise OSError(28, 'No space left on device')
+    monkeypatch.setitem(wakeonlan.transfer._WRITERS, 'ndjson', failing_write)
+    with pytest.raises(WakeOnLanError, match='Unable to write'):
+        export_names(str(path))
+    assert path.read_text(encoding='utf-8') == 'old\n'
+    assert os.listdir(tmp_path) == ['hosts.ndjson']
+
+
+def test_import_unknown_extension(tmp_path):
+    with pytest.raises(WakeOnLanError):
+        import_names(str(tmp_path / 'hosts.txt'))
+
+
+def test_cli_import_export(run_cli, tmp_path):
+    path = tmp_path / 'hosts.ndjson'
+    path.write_text(''.join(json.dumps({'name': f'h{i}', 'mac': f'01:02:03:04:05:{i:02X}'}) + '\n'
+                            for i in range(20)), encoding='utf-8')
+    result = run_cli('--import', str(path), expect_success=True)
+    assert result.stdout.startswith('Imported 20 names in ')
+    assert 'rows/sec' in result.stdout
+    result = run_cli('--export', '-', expect_success=True)
+    assert {json.loads(line)['name'] for line in result.stdout.splitlines()} == {f'h{i}' for i in range(20)}
+    assert result.stderr.startswith('Exported 20 names')
+    run_cli('--import', str(path), 'box', expect_success=False)
@@ -0,0 +1,171 @@
+# pylint: disable=missing-function-docstring,missing-module-docstring,redefined-outer-name
+
+"""Tests for wake-and-verify.
+
+Packets go to a loopback sink. Real probes target loopback listeners (or
+closed loopback ports, which refuse and so count as up); hosts that come up
+later are simulated by replacing `probe`.
+"""
+
+import asyncio
+import socket
+import threading
+
+import pytest
+
+from wakeonlan import HostRecord, Verify, wake, wait_up, wake_and_verify, async_wake_and_verify
+import wakeonlan.verify
+from wakeonlan.verify import probe_many
+
+
+@pytest.fixture
+def listener():
+    srv = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    srv.bind(('127.0.0.1', 0))
+    srv.listen(16)
+    yield srv.getsockname()[1]
+    srv.close()
+
+
+def _count(sink):
+    count = 0
+    sink.settimeout(0.2)
+    try:
+        while True:
+            sink.recvfrom(200)
+            count += 1
+    except socket.timeout:
+        return count
+
+
+@pytest.fixture
+def fake_probe(monkeypatch):
+    """hosts come up after failing a given number of probes"""
+    failures = {}
+    calls = []
+    async def probe(host, port, timeout):
+        calls.append(host)
+        remaining = failures.get(host, 0)
+        if remaining == 0:
+            return True
+        failures[host] = remaining - 1
+        await asyncio.sleep(0)
+        return False
+    monkeypatch.setattr(wakeonlan.verify, 'probe', probe)
+    return failures, calls
+
+
+def test_probe_many(listener):
+    closed = socket.socket()
+    closed.bind(('127.0.0.1', 0))
+    closed_port = closed.getsockname()[1]
+    closed.close()
+    assert probe_many([('127.0.0.1', listener), ('127.0.0.1', closed_port)]) == [True, True]
+
+
+def test_wake_and_verify_up_immediately(sink, listener):
+    record = HostRecord((1, 2, 3, 4, 5, 6), None, '127.0.0.1', sink.getsockname()[1])
+    [res] = wake_and_verify([(record, Verify('127.0.0.1', listener))])
+    assert res.is_up()
+    assert res.wakes == 1
+    assert res.result.succeeded()
+    assert _count(sink) == 1
+
+
+def test_down_host_is_woken_again_with_backoff(sink, fake_probe):
+    failures, _ = fake_probe
+    failures['slow'] = 6
+    record = HostRecord((1, 2, 3, 4, 5, 6), None, '127.0.0.1', sink.getsockname()[1])
+    [res] = wake_and_verify([(record, Verify('slow', 22, timeout=5, probe_interval=0.02,
+                                             resend_after=0.01))])
+    assert res.is_up()
+    # resent after 0.01, 0.02, 0.04 ... while the probes fail every 0.02s
+    assert 2 <= res.wakes < 6
+    assert _count(sink) == res.wakes
+
+
+def test_host_never_up(sink, fake_probe):
+    failures, _ = fake_probe
+    failures['dead'] = 10 ** 6
+    record = HostRecord((1, 2, 3, 4, 5, 6), None, '127.0.0.1', sink.getsockname()[1])
+    [res] = wake_and_verify([(record, Verify('dead', 22, timeout=0.2, probe_interval=0.01,
+                                             resend_after=0.05))])
+    assert not res.is_up()
+    assert res.up_after is None
+    assert res.wakes >= 2
+    _count(sink)
+
+
+def test_resends_due_together_are_batched(sink, fake_probe, monkeypatch):
+    failures, _ = fake_probe
+    batches = []
+    real_wake_many = wakeonlan.verify.async_wake_many
+    async def async_wake_many(records, pacer=None, repeat=None, affinity=None):
+        records = list(records)
+        batches.append(len(records))
+        return await real_wake_many(records, pacer, repeat, affinity)
+    monkeypatch.setattr(wakeonlan.verify, 'async_wake_many', async_wake_many)
+    port = sink.getsockname()[1]
+    targets = []
+    for i in range(50):
+        failures[f'h{i}'] = 10 ** 6
+        targets.append((HostRecord((1, 2, 3, 4, 5, i), None, '127.0.0.1', port),
+                        Verify(f'h{i}', 22, timeout=0.3, probe_interval=0.05, resend_after=0.1)))
+    results = wake_and_verify(targets)
+    assert batches[0] == 50
+    # every host is resent to in the same rounds, so each resend batch has them all
+    assert batches[1:] and all(size == 50 for size in batches[1:])
+    assert all(res.wakes == len(batches) for res in results)
+    _count(sink)
+
+
+def test_thousands_in_flight_on_one_thread(sink, fake_probe):
+    failures, calls = fake_probe
+    port = sink.getsockname()[1]
+    targets = []
+    for i in range(2000):
+        failures[f'h{i}'] = i % 3
+        targets.append((HostRecord((1, 2, 3, 4, i // 256, i % 256), None, '127.0.0.1', port),
+                        Verify(f'h{i}', 22, timeout=10, probe_interval=0.01)))
+    threads = threading.active_count()
+    results = asyncio.run(async_wake_and_verify(targets))
+    assert threading.active_count() == threads
+    assert all(res.is_up() for res in results)
+    assert len(calls) == sum(1 + i % 3 for i in range(2000))
+
+
+def test_wait_up_after_wake(sink, listener):
+    record = HostRecord((1, 2, 3, 4, 5, 6), None, '127.0.0.1', sink.getsockname()[1])
+    first = wake(record)
+    res = wait_up(record, Verify('127.0.0.1', listener), first)
+    assert res.result is first
+    assert res.up_after is not None and res.up_after >= 0
+    assert res.wakes == 1
+    _count(sink)
+
+
+def test_cli_wait(run_cli, sink, listener):
+    port = str(sink.getsockname()[1])
+    result = run_cli('01:02:03:04:05:06', '-a', '127.0.0.1', '-p', port,
+                     '--wait', str(listener), '--probe-host', '127.0.0.1', expect_success=True)
+    assert result.stdout.splitlines()[-1].startswith('up: 127.0.0.1 after ')
+    run_cli('01:02:03:04:05:06', '--wait', '22', expect_success=False)
+    run_cli('01:02:03:04:05:06', '--probe-host', 'x', expect_success=False)
+    run_cli('--list', '--wait', '22', expect_success=False)
+    result = run_cli('01:02:03:04:05:06', '-a', '127.0.0.1', '-p', port, '--wait', '9',
+                     '--probe-host', 'nohost.invalid', '--wait-timeout', '0.3', expect_success=False)
+    assert 'not up after 0.3s' in result.stderr
+    _count(sink)
+
+
+def test_cli_wait_probes_saved_host_ip(run_cli, sink, listener):
+    port = str(sink.getsockname()[1])
+    run_cli('-s', 'box', '01:02:03:04:05:06', '-a', '127.0.0.1', '-p', port, '--host-ip', '127.0.0.1/8',
+            expect_success=True)
+    # `box` doesn't resolve, so only a probe of the saved host ip finds the listener
+    result = run_cli('box', '--wait', str(listener), '--wait-timeout', '5', expect_success=True)
+    assert result.stdout.splitlines()[-1].startswith('up: 127.0.0.1 after ')
+    result = run_cli('01:02:03:04:05:06', '-a', '127.0.0.1', '-p', port, '--host-ip', '127.0.0.1/8',
+                     '--wait', str(listener), expect_success=True)
+    assert result.stdout.splitlines()[-1].startswith('up: 127.0.0.1 after ')
+    assert _count(sink) >= 2
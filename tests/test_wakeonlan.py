@@ -35,3 +35,36 @@ def test_save():
     assert get_names() == {}
     assert get_name_record("test") is None
 
+
+
+def test_import_is_lazy():
+    import subprocess
+    import sys
+    code = ('import sys, wakeonlan; '
+            'print(" ".join(m for m in ("ctypes", "asyncio", "json", "tempfile", "pathlib") if m in sys.modules))')
+    result = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True)
+    assert result.stdout.strip() == ''
+
+
+def test_lazy_attributes_resolve():
+    import pathlib
+    import wakeonlan
+    import wakeonlan.wakeonlan as impl
+    assert callable(wakeonlan.wake_many)
+    assert callable(wakeonlan.async_wake)
+    assert isinstance(impl.CONFIG_PATH, pathlib.Path)
+    assert impl.MAC_PATTERN.fullmatch('01:02:03:04:05:06')
+    assert impl.IP_PATTERN.fullmatch('192.168.1.1')
+
+
+def test_config_path_can_be_reassigned(monkeypatch, tmp_path, test_home):
+    import os
+    import wakeonlan.wakeonlan as impl
+    monkeypatch.setitem(impl.__dict__, 'CONFIG_PATH', tmp_path / 'other.json')
+    save_name("test", HostRecord((1,1,1,1,1,1)))
+    assert impl.CONFIG_PATH == tmp_path / 'other.json'
+    assert os.path.exists(tmp_path / 'other.json')
+    assert not os.path.exists(os.path.join(test_home.name, '.wakeonlan'))
+    assert get_name_record("test") == HostRecord((1,1,1,1,1,1))
+    monkeypatch.undo()
+    assert get_name_record("test") is None
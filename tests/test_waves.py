@@ -0,0 +1,114 @@
+# pylint: disable=missing-function-docstring,missing-module-docstring
+
+"""Tests for `wake_in_waves`.
+
+The scheduler runs on a fake clock and sends to a loopback sink, so the
+tests check exactly when each wave went out without actually waiting.
+"""
+
+import pytest
+
+from wakeonlan import HostRecord, wake_in_waves, save_names, save_group
+
+
+def _hosts(sink, count):
+    port = sink.getsockname()[1]
+    return [(f'h{i}', HostRecord((1, 2, 3, 4, 5, i), None, '127.0.0.1', port)) for i in range(count)]
+
+
+def _drain(sink, count):
+    for _ in range(count):
+        sink.recvfrom(200)
+
+
+def test_waves_on_interval(sink, clock):
+    events = []
+    def progress(event):
+        events.append((clock.now, event))
+    results = wake_in_waves(_hosts(sink, 7), 3, interval=10, on_progress=progress,
+                            clock=clock, sleep=clock.sleep)
+    _drain(sink, 7)
+    assert list(results) == [f'h{i}' for i in range(7)]
+    assert all(res.succeeded() for res in results.values())
+    assert [(when, event.wave, event.names, event.pending) for when, event in events] == [
+        (0, 1, ['h0', 'h1', 'h2'], 4),
+        (10, 2, ['h3', 'h4', 'h5'], 1),
+        (20, 3, ['h6'], 0),
+    ]
+    assert all(event.kind == 'wave' for _, event in events)
+
+
+def test_max_booting_caps_wave(sink, clock):
+    waves = []
+    wake_in_waves(_hosts(sink, 5), 4, interval=1, max_booting=2, boot_time=5,
+                  on_progress=lambda event: waves.append((clock.now, event.names)),
+                  clock=clock, sleep=clock.sleep)
+    _drain(sink, 5)
+    assert waves == [(0, ['h0', 'h1']), (5, ['h2', 'h3']), (10, ['h4'])]
+
+
+def test_next_wave_starts_once_previous_is_up(sink, clock):
+    up_at = {f'h{i}': 3 * (i // 2 + 1) for i in range(4)}
+    events = []
+    wake_in_waves(_hosts(sink, 4), 2, interval=100, boot_time=100,
+                  is_up=lambda booting: [name for name, _ in booting if clock.now >= up_at[name]],
+                  on_progress=lambda event: events.append((clock.now, event.kind, event.names)),
+                  poll_interval=1, clock=clock, sleep=clock.sleep)
+    _drain(sink, 4)
+    assert events == [
+        (0, 'wave', ['h0', 'h1']),
+        (3, 'up', ['h0', 'h1']),
+        (3, 'wave', ['h2', 'h3']),
+        (6, 'up', ['h2', 'h3']),
+    ]
+
+
+def test_hosts_not_up_time_out(sink, clock):
+    events = []
+    results = wake_in_waves(_hosts(sink, 2), 1, interval=1, boot_time=4, is_up=lambda booting: [],
+                            on_progress=lambda event: events.append((clock.now, event.kind, event.names)),
+                            clock=clock, sleep=clock.sleep)
+    _drain(sink, 2)
+    assert len(results) == 2
+    assert events == [
+        (0, 'wave', ['h0']),
+        (1, 'wave', ['h1']),
+        (4, 'timeout', ['h0']),
+        (5, 'timeout', ['h1']),
+    ]
+
+
+def test_invalid_arguments():
+    with pytest.raises(ValueError):
+        wake_in_waves([], 0)
+    with pytest.raises(ValueError):
+        wake_in_waves([], 1, max_booting=0)
+    assert wake_in_waves([], 1) == {}
+
+
+def test_duplicate_names_rejected():
+    with pytest.raises(ValueError, match='h1'):
+        wake_in_waves([('h1', HostRecord((1, 2, 3, 4, 5, 6))), ('h1', HostRecord((1, 2, 3, 4, 5, 7)))], 2)
+
+
+def test_cli_waves(run_cli, sink, tmp_path):
+    save_names(dict(_hosts(sink, 3)))
+    save_group('rack', ['h0', 'h1', 'h2'])
+    result = run_cli('@rack', '--wave-size', '2', '--wave-interval', '0', expect_success=True)
+    assert result.stdout.splitlines() == [
+        'wave 1: 2 hosts woken, 1 pending, 2 booting',
+        'wave 2: 1 hosts woken, 0 pending, 1 booting',
+        'wake: @rack, 3 hosts, 3 sent, 0 failed',
+    ]
+    _drain(sink, 3)
+    names = tmp_path / 'names.txt'
+    names.write_text('# rack\nh2\n\nh0\n', encoding='utf-8')
+    result = run_cli('--names-from', str(names), expect_success=True)
+    assert result.stdout.strip() == f'wake: {names}, 2 hosts, 2 sent, 0 failed'
+    _drain(sink, 2)
+    names.write_text('h1\nh1\n', encoding='utf-8')
+    result = run_cli('--names-from', str(names), '--wave-size', '2', expect_success=True)
+    assert result.stdout.splitlines()[-1] == f'wake: {names}, 1 hosts, 1 sent, 0 failed'
+    _drain(sink, 1)
+    run_cli('h0', '--wave-size', '2', expect_success=False)
+    run_cli('@rack', '--max-booting', '2', expect_success=False)